@@ -1,3 +1,73 @@
-from django.test import TestCase
+import smtplib
+import tempfile
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import Document, DocumentHistory, DocumentType, Letterhead
+from .views import EXPORT_CHUNK_SIZE, PLACEHOLDER_PDF
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(), EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class AsyncDocumentViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpass123')
+        self.document = Document.objects.create(
+            title='Offer Letter',
+            document_type=DocumentType.objects.create(name='Letter'),
+            letterhead=Letterhead.objects.create(name='Main', company_name='BR', address='Street 1', header_html='<h1>BR</h1>'),
+            date='2024-01-01',
+            addressee_name='Jane',
+            addressee_address='Street 2',
+            body='Welcome aboard',
+            created_by=self.user,
+        )
+        self.async_client.force_login(self.user)
+
+    async def test_export_streams_stored_pdf(self):
+        content = b'%PDF' + b'x' * (EXPORT_CHUNK_SIZE * 2)
+        await sync_to_async(self.document.pdf_file.save)('offer.pdf', ContentFile(content))
+
+        response = await self.async_client.get(reverse('export_document', args=[self.document.pk]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Length'], str(len(content)))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), content)
+        self.assertEqual(await DocumentHistory.objects.filter(action='exported').acount(), 1)
+
+    async def test_export_without_pdf_and_of_others(self):
+        response = await self.async_client.get(reverse('export_document', args=[self.document.pk]))
+        self.assertEqual(response.content, PLACEHOLDER_PDF)
+
+        other = await User.objects.acreate(username='other')
+        await sync_to_async(self.async_client.force_login)(other)
+        response = await self.async_client.get(reverse('export_document', args=[self.document.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_email_sends_pdf(self):
+        url = reverse('email_document', args=[self.document.pk])
+        response = await self.async_client.post(url, {'email_to': 'jane@example.com', 'email_subject': 'Your offer'})
+        self.assertRedirects(response, reverse('document_detail', args=[self.document.pk]), fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments, [('Offer Letter.pdf', PLACEHOLDER_PDF, 'application/pdf')])
+        await self.document.arefresh_from_db()
+        self.assertEqual(self.document.status, 'sent')
+
+        # Failed sends leave the document as it was
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=smtplib.SMTPException), \
+                self.assertLogs('apps.documents.views', 'WARNING'):
+            response = await self.async_client.post(url, {'email_to': 'jane@example.com'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(await DocumentHistory.objects.filter(action='sent').acount(), 1)
+
+    def test_login_required(self):
+        response = self.client.get(reverse('export_document', args=[self.document.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('?next=', response['Location'])
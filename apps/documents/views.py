@@ -1,9 +1,11 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.mail import EmailMessage
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
@@ -11,9 +13,64 @@ from .models import (
     Document, DocumentTemplate, Letterhead, DocumentType, 
     Signatory, QRCode, DocumentHistory
 )
+from apps.web.events import request_user
+from apps.web.queries import query_budget
+from asgiref.sync import sync_to_async
+from functools import wraps
 import json
+import logging
+import smtplib
 
 
+logger = logging.getLogger(__name__)
+
+# Placeholder body of documents without a generated PDF
+PLACEHOLDER_PDF = b'PDF content would be generated here'
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def async_login_required(view):
+    """
+    login_required for async views, Django 4.2's decorator only wraps sync
+    ones. Loads request.user once, so templates don't query it from the loop.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request_user(request)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def get_user_document(request, pk):
+    """The request user's document, or 404, in one query"""
+    try:
+        return await Document.objects.select_related('document_type', 'letterhead').aget(
+            pk=pk, created_by=request.user
+        )
+    except Document.DoesNotExist:
+        raise Http404('No Document matches the given query.')
+
+
+async def export_chunks(document):
+    """
+    The PDF of a document in EXPORT_CHUNK_SIZE chunks. Storage reads run in
+    threads, so a worker keeps serving other requests while a large file is
+    read from disk or remote storage.
+    """
+    if not document.pdf_file:
+        yield PLACEHOLDER_PDF
+        return
+    file = await sync_to_async(document.pdf_file.open, thread_sensitive=False)('rb')
+    try:
+        while chunk := await sync_to_async(file.read, thread_sensitive=False)(EXPORT_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+@query_budget(7)
 @login_required
 def document_list(request):
     """List all documents for the current user"""
@@ -202,13 +259,13 @@ def delete_document(request, pk):
     return render(request, 'documents/delete_confirm.html', {'document': document})
 
 
-@login_required
-def export_document(request, pk):
+@async_login_required
+async def export_document(request, pk):
     """Export document as PDF"""
-    document = get_object_or_404(Document, pk=pk, created_by=request.user)
+    document = await get_user_document(request, pk)
     
     # Log export action
-    DocumentHistory.objects.create(
+    await DocumentHistory.objects.acreate(
         document=document,
         action='exported',
         description='Document exported as PDF',
@@ -216,27 +273,44 @@ def export_document(request, pk):
     )
     
     # TODO: Implement actual PDF generation
-    # For now, return a placeholder response
-    response = HttpResponse(content_type='application/pdf')
+    # Until then, documents without a stored PDF get a placeholder
+    if document.pdf_file:
+        response = StreamingHttpResponse(export_chunks(document), content_type='application/pdf')
+        storage = document.pdf_file.storage
+        response['Content-Length'] = await sync_to_async(storage.size, thread_sensitive=False)(document.pdf_file.name)
+    else:
+        response = HttpResponse(PLACEHOLDER_PDF, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{document.title}.pdf"'
-    response.write(b'PDF content would be generated here')
     
     return response
 
 
-@login_required
-def email_document(request, pk):
+@async_login_required
+async def email_document(request, pk):
     """Send document via email"""
-    document = get_object_or_404(Document, pk=pk, created_by=request.user)
+    document = await get_user_document(request, pk)
     
     if request.method == 'POST':
         email_to = request.POST.get('email_to')
-        email_subject = request.POST.get('email_subject')
-        email_message = request.POST.get('email_message')
+        email_subject = request.POST.get('email_subject') or f'Document: {document.title}'
+        email_message = request.POST.get('email_message', '')
+        if not email_to:
+            messages.error(request, 'Enter the address to send the document to.')
+            return redirect('email_document', pk=document.pk)
         
-        # TODO: Implement actual email sending
-        # For now, just log the action
-        DocumentHistory.objects.create(
+        email = EmailMessage(email_subject, email_message, to=[email_to])
+        email.attach(
+            f'{document.title}.pdf', b''.join([chunk async for chunk in export_chunks(document)]), 'application/pdf'
+        )
+        try:
+            # Outside the thread the ORM runs in, so waiting on SMTP doesn't hold up queries
+            await sync_to_async(email.send, thread_sensitive=False)()
+        except (smtplib.SMTPException, OSError):
+            logger.warning('Could not email document %s to %s', document.pk, email_to, exc_info=True)
+            messages.error(request, f'Could not send document "{document.title}" to {email_to}, please try again.')
+            return redirect('email_document', pk=document.pk)
+        
+        await DocumentHistory.objects.acreate(
             document=document,
             action='sent',
             description=f'Document sent via email to {email_to}',
@@ -244,7 +318,7 @@ def email_document(request, pk):
         )
         
         document.status = 'sent'
-        document.save()
+        await document.asave(update_fields=['status', 'updated_at'])
         
         messages.success(request, f'Document "{document.title}" sent to {email_to}.')
         return redirect('document_detail', pk=document.pk)
@@ -254,13 +328,17 @@ def email_document(request, pk):
         'default_subject': f'Document: {document.title}',
         'default_message': f'Please find attached the document "{document.title}".',
     }
-    return render(request, 'documents/email.html', context)
+    # Context processors and the template may touch the database
+    return await sync_to_async(render)(request, 'documents/email.html', context)
 
 
+@query_budget(5)
 @login_required
 def document_history(request):
     """View document history"""
-    history = DocumentHistory.objects.filter(document__created_by=request.user)
+    history = DocumentHistory.objects.filter(
+        document__created_by=request.user
+    ).select_related('document', 'user')
     
     # Filter by action
     action = request.GET.get('action')
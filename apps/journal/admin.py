@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Department, WeeklyJournal, JournalComment, TopManagementReport, TopManagementTag
+from .tagging import resync_tags
+from .models import Department, WeeklyJournal, JournalComment, TopManagementReport, TopManagementTag, WeeklyStatusRollup, JournalItemChange
 
 
 @admin.register(Department)
@@ -23,7 +24,7 @@ class WeeklyJournalAdmin(admin.ModelAdmin):
     search_fields = ('author__username', 'author__first_name', 'author__last_name', 
                      'department__name', 'highlights', 'challenges')
     date_hierarchy = 'date_from'
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'version')
     
     fieldsets = (
         ('Basic Information', {
@@ -34,13 +35,18 @@ class WeeklyJournalAdmin(admin.ModelAdmin):
             'classes': ('wide',)
         }),
         ('Metadata', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'version'),
             'classes': ('collapse',)
         })
     )
     
     inlines = [JournalCommentInline]
 
+    def save_model(self, request, obj, form, change):
+        # Attributes the item changes to the admin (see history.py)
+        obj._changed_by = request.user
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(JournalComment)
 class JournalCommentAdmin(admin.ModelAdmin):
@@ -63,7 +69,7 @@ class TopManagementReportAdmin(admin.ModelAdmin):
     list_filter = ('week_start', 'created_by', 'created_at')
     search_fields = ('title', 'executive_summary', 'created_by__username')
     date_hierarchy = 'week_start'
-    readonly_fields = ('created_by', 'created_at', 'updated_at', 'tagged_items_count')
+    readonly_fields = ('created_by', 'created_at', 'updated_at', 'version', 'tagged_items_count')
     
     fieldsets = (
         ('Report Information', {
@@ -79,12 +85,13 @@ class TopManagementReportAdmin(admin.ModelAdmin):
             'description': 'Additional items added directly by admin for top management attention'
         }),
         ('Metadata', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'version'),
             'classes': ('collapse',)
         })
     )
     
     inlines = [TopManagementTagInline]
+    actions = ['refresh_tags']
     
     def save_model(self, request, obj, form, change):
         if not change:  # New object
@@ -97,6 +104,11 @@ class TopManagementReportAdmin(admin.ModelAdmin):
         return format_html('<span class="badge" style="background-color: #007bff; color: white;">{}</span>', count)
     tagged_items_count.short_description = 'Tagged Items'
     
+    @admin.action(description='Refresh the text and status of tagged items')
+    def refresh_tags(self, request, queryset):
+        updated = resync_tags(TopManagementTag.objects.filter(report__in=queryset))
+        self.message_user(request, f'{updated} tagged items updated.')
+    
     def has_add_permission(self, request):
         """Only superusers and staff can add top management reports"""
         return request.user.is_superuser or request.user.is_staff
@@ -115,11 +127,11 @@ class TopManagementTagAdmin(admin.ModelAdmin):
     list_display = ('journal_entry_info', 'section', 'item_text_short', 'priority', 'tagged_by', 'report', 'tagged_at')
     list_filter = ('section', 'priority', 'tagged_by', 'report__week_start', 'tagged_at')
     search_fields = ('item_text', 'admin_note', 'journal_entry__author__username', 'tagged_by__username')
-    readonly_fields = ('tagged_by', 'tagged_at', 'journal_entry', 'section', 'item_index', 'item_text', 'item_status')
+    readonly_fields = ('tagged_by', 'tagged_at', 'journal_entry', 'section', 'item_id', 'item_index', 'item_text', 'item_status')
     
     fieldsets = (
         ('Tagged Item Information', {
-            'fields': ('journal_entry', 'section', 'item_index', 'item_text', 'item_status')
+            'fields': ('journal_entry', 'section', 'item_id', 'item_index', 'item_text', 'item_status')
         }),
         ('Tagging Information', {
             'fields': ('report', 'priority', 'admin_note', 'tagged_by', 'tagged_at')
@@ -159,3 +171,34 @@ class TopManagementTagAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """Only superusers and staff can delete tags"""
         return request.user.is_superuser or request.user.is_staff
+
+
+@admin.register(WeeklyStatusRollup)
+class WeeklyStatusRollupAdmin(admin.ModelAdmin):
+    list_display = ('week_start', 'department', 'section', 'status', 'count')
+    list_filter = ('department', 'section', 'status')
+    date_hierarchy = 'week_start'
+    readonly_fields = [field.name for field in WeeklyStatusRollup._meta.fields]
+
+    def has_add_permission(self, request):
+        """Rollups are maintained from the journals (rebuild_rollups recomputes them)"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(JournalItemChange)
+class JournalItemChangeAdmin(admin.ModelAdmin):
+    list_display = ('journal', 'section', 'position', 'change', 'old_status', 'new_status', 'changed_by', 'changed_at')
+    list_filter = ('change', 'section', 'new_status')
+    date_hierarchy = 'changed_at'
+    list_select_related = ('journal__author', 'journal__department', 'changed_by')
+    readonly_fields = [field.name for field in JournalItemChange._meta.fields]
+
+    def has_add_permission(self, request):
+        """Changes are recorded when journals are saved"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,274 @@
+"""
+Department analytics: weekly submission rates and status mix over time.
+
+Every metric is one set-based query: submission rates come from a single
+windowed SQL statement over the (department, date_from) index, the status
+mix from the weekly rollups, missing members from compliance.py. Long ranges are computed by a Celery task
+(tasks.py) and served from the cache, keyed on the rollup version so rebuilds
+and imports start over.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.contrib.auth.models import User
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .compliance import ROSTER_LOOKBACK_WEEKS
+from .models import Department, WeeklyJournal
+from .rollups import get_rollup_version, status_trends, week_start
+
+
+logger = logging.getLogger(__name__)
+
+WEEK_CHOICES = (4, 12, 26, 52, 104, 156)
+DEFAULT_WEEKS = 12
+MOVING_AVERAGE_WEEKS = 4
+
+# The members of a department in a week are its authors that week plus the
+# users compliance.py counts as missing it: active users whose latest journal
+# in the ROSTER_LOOKBACK_WEEKS before went to the department. calendar numbers
+# the weeks of the range and of the lookback before it, so that the roster
+# entry of an author week covers the next weeks up to the author's next journal
+SUBMISSION_RATES_SQL = """
+WITH calendar (week, n) AS (VALUES {calendar}),
+offsets (k) AS (VALUES {offsets}),
+journals AS ({journals}),
+journal_weeks AS (
+    SELECT j.author_id, j.department_id, c.week, c.n,
+           ROW_NUMBER() OVER (PARTITION BY j.author_id, c.n ORDER BY j.date_from DESC, j.id DESC) AS latest
+    FROM journals j
+    JOIN calendar c ON c.week = j.week
+),
+weekly AS (
+    SELECT department_id, week, COUNT(DISTINCT author_id) AS submitted
+    FROM journal_weeks
+    WHERE n >= {lookback}
+    GROUP BY department_id, week
+),
+roster AS (
+    SELECT jw.department_id, jw.n, LEAD(jw.n) OVER (PARTITION BY jw.author_id ORDER BY jw.n) AS next_n
+    FROM journal_weeks jw
+    JOIN {users} u ON u.id = jw.author_id
+    WHERE jw.latest = 1 AND u.is_active
+),
+missing AS (
+    SELECT r.department_id, c.week, COUNT(*) AS missing
+    FROM roster r
+    CROSS JOIN offsets o
+    JOIN calendar c ON c.n = r.n + o.k
+    WHERE c.n >= {lookback} AND (r.next_n IS NULL OR c.n < r.next_n)
+    GROUP BY r.department_id, c.week
+),
+departments AS (
+    SELECT department_id FROM weekly
+    UNION
+    SELECT department_id FROM missing
+),
+weeks AS (SELECT DISTINCT week FROM weekly),
+counts AS (
+    SELECT d.department_id, weeks.week, COALESCE(w.submitted, 0) AS submitted,
+           COALESCE(w.submitted, 0) + COALESCE(m.missing, 0) AS members
+    FROM departments d
+    CROSS JOIN weeks
+    LEFT JOIN weekly w ON w.department_id = d.department_id AND w.week = weeks.week
+    LEFT JOIN missing m ON m.department_id = d.department_id AND m.week = weeks.week
+    {department_filter}
+),
+rates AS (
+    SELECT department_id, week, members, submitted,
+           CASE WHEN members > 0 THEN CAST(submitted AS FLOAT) / members ELSE 0 END AS rate
+    FROM counts
+),
+windowed AS (
+    SELECT department_id, week, members, submitted, rate,
+           AVG(rate) OVER (
+               PARTITION BY department_id ORDER BY week ROWS BETWEEN {preceding} PRECEDING AND CURRENT ROW
+           ) AS moving_rate,
+           AVG(rate) OVER (PARTITION BY department_id) AS average_rate,
+           RANK() OVER (PARTITION BY week ORDER BY rate DESC) AS week_rank
+    FROM rates
+)
+SELECT department_id, week, members, submitted, rate, moving_rate, average_rate, week_rank,
+       DENSE_RANK() OVER (ORDER BY average_rate DESC) AS overall_rank
+FROM windowed
+ORDER BY department_id, week
+"""
+
+
+def analytics_range(weeks, today=None):
+    """(first Monday, last Monday) of the last `weeks` complete weeks"""
+    until = week_start(today or date.today()) - timedelta(weeks=1)
+    return until - timedelta(weeks=weeks - 1), until
+
+
+def submission_rates(since, until, department_ids=None):
+    """
+    Per department and week: members, submitters, submission rate, moving
+    average of the rate, the department's rank that week and over the range.
+
+    Members are the week's submitters plus the users missing it on the
+    compliance roster (see compliance.py), so the rates match the missing
+    submissions pages. Weeks without any journal at all are left out.
+    """
+    first = week_start(since) - timedelta(weeks=ROSTER_LOOKBACK_WEEKS)
+    weeks = []
+    while first + timedelta(weeks=len(weeks)) <= until:
+        weeks.append(first + timedelta(weeks=len(weeks)))
+    journals = WeeklyJournal.objects.order_by().filter(
+        date_from__gte=first, date_from__lt=until + timedelta(weeks=1)
+    ).annotate(week=TruncWeek('date_from')).values('id', 'author_id', 'department_id', 'date_from', 'week')
+    journals_sql, journals_params = journals.query.sql_with_params()
+
+    connection = connections[router.db_for_read(WeeklyJournal)]
+    calendar_params = [value for n, week in enumerate(weeks) for value in (week, n)]
+    department_filter, department_params = '', []
+    if department_ids is not None:
+        department_ids = list(department_ids) or [None]
+        department_filter = f'WHERE d.department_id IN ({", ".join(["%s"] * len(department_ids))})'
+        department_params = department_ids
+    sql = SUBMISSION_RATES_SQL.format(
+        calendar=', '.join(['(%s, %s)'] * len(weeks)),
+        offsets=', '.join(f'({k})' for k in range(1, ROSTER_LOOKBACK_WEEKS + 1)),
+        journals=journals_sql,
+        users=connection.ops.quote_name(User._meta.db_table),
+        lookback=ROSTER_LOOKBACK_WEEKS,
+        department_filter=department_filter,
+        preceding=MOVING_AVERAGE_WEEKS - 1,
+    )
+    # Raw SQL bypasses the router, so pick the database the querysets would read from
+    with connection.cursor() as cursor:
+        cursor.execute(sql, calendar_params + list(journals_params) + department_params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    for row in rows:
+        # SQLite returns the truncated week as text
+        row['week'] = row['week'] if isinstance(row['week'], date) else date.fromisoformat(str(row['week'])[:10])
+        for key in ('rate', 'moving_rate', 'average_rate'):
+            row[key] = float(row[key])
+    return rows
+
+
+def status_mix(since, until, department=None):
+    """Item status shares per month, from the weekly rollups"""
+    months = {}
+    rows = status_trends('month', since, until, departments=[department] if department else None)
+    for row in rows:
+        month = months.setdefault(row['period'], {'period': row['period'], 'total': 0, 'statuses': {}})
+        month['statuses'][row['status']] = month['statuses'].get(row['status'], 0) + row['count']
+        month['total'] += row['count']
+    result = []
+    for month in months.values():
+        month['shares'] = [
+            (status, label, color, round(month['statuses'].get(status, 0) * 100 / month['total'], 1))
+            for status, label, color in WeeklyJournal.get_status_choices()
+        ]
+        result.append(month)
+    return result
+
+
+def sparkline_points(values, width=120, height=24):
+    """SVG polyline points for rates between 0 and 1"""
+    if len(values) < 2:
+        return ''
+    step = width / (len(values) - 1)
+    return ' '.join(f'{i * step:.1f},{height - value * height:.1f}' for i, value in enumerate(values))
+
+
+def compute_department_analytics(since, until):
+    """Build and cache the analytics of all departments for a range of weeks"""
+    rows = submission_rates(since, until)
+    weeks = sorted({row['week'] for row in rows})
+    names = dict(Department.objects.filter(id__in={row['department_id'] for row in rows}).values_list('id', 'name'))
+
+    departments = {}
+    for row in rows:
+        department = departments.get(row['department_id'])
+        if department is None:
+            department = departments[row['department_id']] = {
+                'id': row['department_id'],
+                'name': names.get(row['department_id'], ''),
+                'average_rate': row['average_rate'],
+                'rank': row['overall_rank'],
+                'weeks': [],
+            }
+        # Members of the latest week, the rows are in week order
+        department['members'] = row['members']
+        department['weeks'].append({
+            'week': row['week'],
+            'submitted': row['submitted'],
+            'members': row['members'],
+            'rate': row['rate'],
+            'moving_rate': row['moving_rate'],
+            'rank': row['week_rank'],
+        })
+    # The weekly rows are cached per department, so the overview stays small to load
+    department_weeks = {}
+    for department in departments.values():
+        weekly_rows = department.pop('weeks')
+        department_weeks[department_cache_key(since, until, department['id'])] = weekly_rows
+        department['last_rate'] = weekly_rows[-1]['rate']
+        department['moving_rate'] = weekly_rows[-1]['moving_rate']
+        department['sparkline'] = sparkline_points([week['rate'] for week in weekly_rows])
+
+    payload = {
+        'since': since,
+        'until': until,
+        'weeks': weeks,
+        'departments': sorted(departments.values(), key=lambda department: (department['rank'], department['name'])),
+        'status_mix': status_mix(since, until),
+        'computed_at': timezone.now(),
+    }
+    cache.set_many(department_weeks, settings.ANALYTICS_CACHE_TIMEOUT)
+    cache.set(analytics_cache_key(since, until), payload, settings.ANALYTICS_CACHE_TIMEOUT)
+    return payload
+
+
+def analytics_cache_key(since, until):
+    return f'journal:analytics:{get_rollup_version()}:{since}:{until}'
+
+
+def department_cache_key(since, until, department_id):
+    return f'{analytics_cache_key(since, until)}:department:{department_id}'
+
+
+def get_department_weeks(since, until, department_id):
+    """Weekly rows of one department from the cached analytics, recomputing them if they were evicted"""
+    key = department_cache_key(since, until, department_id)
+    weeks = cache.get(key)
+    if weeks is None:
+        compute_department_analytics(since, until)
+        weeks = cache.get(key, [])
+    return weeks
+
+
+def get_department_analytics(since, until, background=False):
+    """
+    Return the cached analytics for the range, computing them on a miss.
+
+    With background set, a miss queues the Celery task instead and returns
+    None; the page then shows that the numbers are being prepared. Without a
+    reachable broker the analytics are computed in the request after all.
+    Only set it with a cache shared with the Celery workers (ANALYTICS_BACKGROUND),
+    or the results never reach the web processes.
+    """
+    key = analytics_cache_key(since, until)
+    payload = cache.get(key)
+    if payload is not None or not background:
+        return payload or compute_department_analytics(since, until)
+
+    from kombu.exceptions import OperationalError
+    from .tasks import precompute_department_analytics
+
+    # Queue the task once, not on every reload of the waiting page
+    if cache.add(f'{key}:pending', True, settings.ANALYTICS_PENDING_TIMEOUT):
+        try:
+            precompute_department_analytics.apply_async(args=[since.isoformat(), until.isoformat()], retry=False)
+        except OperationalError:
+            logger.warning('Could not queue the analytics precompute, computing them in the request', exc_info=True)
+            cache.delete(f'{key}:pending')
+            return compute_department_analytics(since, until)
+    return None
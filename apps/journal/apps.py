@@ -5,3 +5,6 @@ class JournalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.journal'
     verbose_name = 'Journal'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
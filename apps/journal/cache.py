@@ -0,0 +1,235 @@
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.crypto import md5
+from apps.web.events import read_sequences
+from apps.web.routers import pin_to_primary
+from .models import WeeklyJournal, Department
+
+
+DASHBOARD_GENERATION_KEY = 'journal:dashboard:generation'
+FRAGMENT_GENERATION_KEY = 'journal:fragment:generation'
+# Event channels of the dashboard counters (see live.py)
+DASHBOARD_CHANNEL = 'dashboard'
+
+
+def user_channel(user_id):
+    return f'dashboard:user:{user_id}'
+
+
+def get_dashboard_timeout():
+    """Return how long (in seconds) dashboard snapshots may live in the cache"""
+    return getattr(settings, 'JOURNAL_DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def empty_status_summary():
+    """Return a zeroed status summary"""
+    return {
+        'completed': 0,
+        'in_progress': 0,
+        'on_hold': 0,
+        'not_started': 0,
+        'cancelled': 0,
+        'total_items': 0
+    }
+
+
+def build_status_summary(journals):
+    """Count item statuses across all sections of the given journal entries"""
+    status_summary = empty_status_summary()
+
+    for journal in journals:
+        all_items = []
+        all_items.extend(journal.get_highlights_list())
+        all_items.extend(journal.get_pendings_list())
+        all_items.extend(journal.get_challenges_list())
+        all_items.extend(journal.get_personal_updates_list())
+        all_items.extend(journal.get_strategies_list())
+
+        for item in all_items:
+            status = item.get('status', 'not_started')
+            if status in status_summary:
+                status_summary[status] += 1
+            status_summary['total_items'] += 1
+
+    return status_summary
+
+
+def _content_only(queryset):
+    """Restrict a journal queryset to the columns needed for status counting"""
+    return queryset.only(
+        'id', 'highlights', 'pendings', 'challenges', 'personal_updates', 'strategies'
+    ).order_by().iterator()
+
+
+def get_dashboard_generation():
+    """Return the current dashboard cache generation, used to invalidate every snapshot at once"""
+    generation = cache.get(DASHBOARD_GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(DASHBOARD_GENERATION_KEY, generation, None)
+    return generation
+
+
+def global_dashboard_key(generation):
+    return f'journal:dashboard:{generation}:global'
+
+
+def user_dashboard_key(generation, user_id):
+    return f'journal:dashboard:{generation}:user:{user_id}'
+
+
+# Columns of the journals listed on the dashboard. Snapshots hold plain values,
+# not model instances, so they stay small and unpickling them runs no model code
+DASHBOARD_JOURNAL_FIELDS = (
+    'pk', 'date_from', 'date_to', 'highlights', 'created_at', 'department__name',
+    'author__username', 'author__first_name', 'author__last_name',
+)
+
+
+def dashboard_journals(queryset):
+    """The dashboard listing of some journals, as dicts"""
+    journals = list(queryset.values(*DASHBOARD_JOURNAL_FIELDS))
+    for journal in journals:
+        full_name = f"{journal['author__first_name']} {journal['author__last_name']}".strip()
+        journal['author_name'] = full_name or journal['author__username']
+    return journals
+
+
+def build_global_dashboard_snapshot():
+    """Compute the part of the dashboard that is the same for every user"""
+    return {
+        'recent_journals': dashboard_journals(WeeklyJournal.objects.order_by('-created_at')[:10]),
+        'total_journals': WeeklyJournal.objects.count(),
+        'departments': list(Department.objects.values('pk', 'name')),
+        'status_summary': build_status_summary(_content_only(WeeklyJournal.objects.all())),
+    }
+
+
+def build_user_dashboard_snapshot(user_id):
+    """Compute the part of the dashboard that belongs to a single user"""
+    user_entries = WeeklyJournal.objects.filter(author_id=user_id)
+    return {
+        'user_journals': dashboard_journals(user_entries.order_by('-date_from')[:5]),
+        'user_journal_count': user_entries.count(),
+        'user_status_summary': build_status_summary(_content_only(user_entries)),
+    }
+
+
+def get_dashboard_snapshot(user):
+    """Return the cached global and per-user dashboard data, rebuilding whichever part is missing"""
+    generation = get_dashboard_generation()
+    global_key = global_dashboard_key(generation)
+    user_key = user_dashboard_key(generation, user.pk)
+
+    cached = cache.get_many([global_key, user_key])
+    timeout = get_dashboard_timeout()
+
+    # Snapshots are cached until the next change, so build them from the primary:
+    # a lagging replica would keep serving the data from before that change
+    with pin_to_primary():
+        global_snapshot = cached.get(global_key)
+        if global_snapshot is None:
+            # Live counters skip the changes numbered up to this, so it is read before counting (see live.py)
+            seq = read_sequences([DASHBOARD_CHANNEL])[DASHBOARD_CHANNEL]
+            global_snapshot = {**build_global_dashboard_snapshot(), 'global_seq': seq}
+            cache.set(global_key, global_snapshot, timeout)
+
+        user_snapshot = cached.get(user_key)
+        if user_snapshot is None:
+            seq = read_sequences([user_channel(user.pk)])[user_channel(user.pk)]
+            user_snapshot = {**build_user_dashboard_snapshot(user.pk), 'user_seq': seq}
+            cache.set(user_key, user_snapshot, timeout)
+
+    snapshot = {}
+    snapshot.update(global_snapshot)
+    snapshot.update(user_snapshot)
+    return snapshot
+
+
+def invalidate_global_dashboard():
+    """Drop the shared dashboard snapshot"""
+    cache.delete(global_dashboard_key(get_dashboard_generation()))
+
+
+def invalidate_user_dashboard(user_id):
+    """Drop a single user's dashboard snapshot"""
+    cache.delete(user_dashboard_key(get_dashboard_generation(), user_id))
+
+
+def invalidate_all_dashboards():
+    """Start a new generation so that every global and per-user snapshot is rebuilt"""
+    try:
+        cache.incr(DASHBOARD_GENERATION_KEY)
+    except ValueError:
+        cache.set(DASHBOARD_GENERATION_KEY, 2, None)
+
+
+# Version of the cached journal markup in each template. Bump a template's
+# version whenever the markup inside its journal_fragment blocks changes.
+JOURNAL_FRAGMENT_VERSIONS = {
+    'journal_list': 1,
+    'summary_report': 1,
+    'tagging_interface': 2,
+}
+
+
+def get_fragment_timeout():
+    """Return how long (in seconds) rendered journal fragments may live in the cache"""
+    return getattr(settings, 'JOURNAL_FRAGMENT_CACHE_TIMEOUT', 86400)
+
+
+def get_fragment_generation():
+    """
+    Return the current fragment cache generation. Fragments show author and
+    department names, which change without touching the journal's updated_at
+    """
+    generation = cache.get(FRAGMENT_GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(FRAGMENT_GENERATION_KEY, generation, None)
+    return generation
+
+
+def invalidate_all_fragments():
+    """Start a new generation so that every journal fragment is rendered again"""
+    try:
+        cache.incr(FRAGMENT_GENERATION_KEY)
+    except ValueError:
+        cache.set(FRAGMENT_GENERATION_KEY, 2, None)
+
+
+def journal_fragment_key(fragment_name, journal, vary_on=(), generation=1):
+    """Build the cache key for a rendered fragment of a single journal entry"""
+    version = JOURNAL_FRAGMENT_VERSIONS.get(fragment_name, 1)
+    updated = journal.updated_at.timestamp() if journal.updated_at else 0
+    key = f'journal:fragment:{generation}:{fragment_name}:v{version}:{journal.pk}:{updated}'
+    if vary_on:
+        vary_hash = md5(':'.join(str(value) for value in vary_on).encode(), usedforsecurity=False)
+        key = f'{key}:{vary_hash.hexdigest()}'
+    return key
+
+
+# Part of every page ETag. Bump it when the markup of the conditional pages
+# changes, so browsers holding an old copy get the new one.
+PAGE_ETAG_VERSION = 1
+
+
+def make_page_etag(request, *parts):
+    """
+    Build an ETag for a rendered page from the values it depends on.
+
+    The user and their CSRF cookie are always included, since the page shows
+    user-specific links and embeds a CSRF token. Returns None (no conditional
+    handling) for anonymous users and when messages are waiting to be shown.
+    """
+    if not request.user.is_authenticated or len(get_messages(request)):
+        return None
+    values = [
+        PAGE_ETAG_VERSION,
+        request.user.pk,
+        request.user.is_staff or request.user.is_superuser,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    values.extend(parts)
+    return md5(repr(values).encode(), usedforsecurity=False).hexdigest()
@@ -0,0 +1,156 @@
+"""
+Carry-forward of unfinished items into the next journal.
+
+A new journal is pre-filled with the pendings and strategies of the
+author's latest earlier journal that aren't completed or cancelled. Each
+carried item keeps an "origin" ({"journal": id, "item": item id}) in the
+JSON, and CarriedItem mirrors those links in an indexed table, so the
+lineage of an item across weeks is an index lookup on root_item_id.
+"""
+from .models import CarriedItem, WeeklyJournal
+
+
+CARRY_SECTIONS = ('pendings', 'strategies')
+CLOSED_STATUSES = {'completed', 'cancelled'}
+
+
+def previous_journal(author, before):
+    """The author's latest journal starting before `before`, one lookup on the (author, date_from) index"""
+    return (
+        WeeklyJournal.objects.filter(author=author, date_from__lt=before)
+        .order_by('-date_from')
+        .only('pk', 'date_from', 'date_to', *CARRY_SECTIONS)
+        .first()
+    )
+
+
+def carry_forward_items(journal):
+    """{section: [{"text", "status", "origin"}, ...]} of the journal's open pendings and strategies"""
+    result = {}
+    for section in CARRY_SECTIONS:
+        items = WeeklyJournal.normalize_items(getattr(journal, section), WeeklyJournal.SECTION_DEFAULT_STATUS[section])
+        result[section] = [
+            {
+                'text': item['text'],
+                'status': item.get('status') or WeeklyJournal.SECTION_DEFAULT_STATUS[section],
+                'origin': {'journal': journal.pk, 'item': item['id']},
+            }
+            for item in items
+            if item.get('id') and item.get('status') not in CLOSED_STATUSES
+        ]
+    return result
+
+
+def parse_origin(value):
+    """Origin of a form value "journal id:item id", or None"""
+    journal_id, _, item_id = str(value or '').partition(':')
+    item_id = WeeklyJournal.clean_item_id(item_id)
+    if not journal_id.isdigit() or item_id is None:
+        return None
+    return {'journal': int(journal_id), 'item': item_id}
+
+
+def item_origins(values):
+    """{item id: (origin journal id, origin item id)} of the carried items in {section: stored JSON}"""
+    origins = {}
+    for section, default_status in WeeklyJournal.SECTION_DEFAULT_STATUS.items():
+        for item in WeeklyJournal.normalize_items(values.get(section), default_status):
+            origin = item.get('origin')
+            if item.get('id') and isinstance(origin, dict):
+                origin_item = WeeklyJournal.clean_item_id(origin.get('item') or '')
+                if origin_item and str(origin.get('journal', '')).isdigit():
+                    origins[item['id']] = (int(origin['journal']), origin_item)
+    return origins
+
+
+def drop_rejected_origins(journal):
+    """
+    Remove the origins that can't be linked, to anything but an earlier
+    journal of the same author, from the items of a journal about to be
+    saved. The JSON then never claims a link CarriedItem doesn't have, e.g.
+    after a late entry for an earlier week. Only queries with carried items.
+    """
+    links = item_origins({section: getattr(journal, section) for section in WeeklyJournal.SECTION_DEFAULT_STATUS})
+    if not links:
+        return
+    date_from = WeeklyJournal._meta.get_field('date_from').to_python(journal.date_from)
+    valid = set(
+        WeeklyJournal.objects.filter(
+            pk__in={origin_journal for origin_journal, _ in links.values()},
+            author_id=journal.author_id,
+            date_from__lt=date_from,
+        ).values_list('pk', flat=True)
+    )
+    rejected = {item_id for item_id, (origin_journal, _) in links.items() if origin_journal not in valid}
+    if not rejected:
+        return
+    for section in WeeklyJournal.SECTION_DEFAULT_STATUS:
+        value = getattr(journal, section)
+        if isinstance(value, list):
+            setattr(journal, section, [
+                {key: field for key, field in item.items() if key != 'origin'}
+                if isinstance(item, dict) and item.get('id') in rejected else item
+                for item in value
+            ])
+
+
+def sync_carried_items(journal, stored_values):
+    """
+    Mirror the origins of the journal's items to CarriedItem rows, given the
+    items stored before the save. Saves without any carried items on either
+    side don't query at all.
+    """
+    links = item_origins({section: getattr(journal, section) for section in WeeklyJournal.SECTION_DEFAULT_STATUS})
+    if not links and not item_origins(stored_values):
+        return
+    existing = {row.item_id.hex: row for row in journal.carried_items.all()}
+    stale = [
+        row.pk for item_id, row in existing.items()
+        if links.get(item_id) != (row.origin_journal_id, row.origin_item_id.hex)
+    ]
+    if stale:
+        CarriedItem.objects.filter(pk__in=stale).delete()
+    new = {item_id: origin for item_id, origin in links.items() if item_id not in existing or existing[item_id].pk in stale}
+    if not new:
+        return
+
+    # Only earlier journals of the same author can be an origin
+    journal_ids = set(
+        WeeklyJournal.objects.filter(
+            pk__in={origin_journal for origin_journal, _ in new.values()},
+            author_id=journal.author_id,
+            date_from__lt=journal.date_from,
+        ).values_list('pk', flat=True)
+    )
+    roots = {
+        carried.hex: root for carried, root in
+        CarriedItem.objects.filter(item_id__in=[origin_item for _, origin_item in new.values()])
+        .values_list('item_id', 'root_item_id')
+    }
+    CarriedItem.objects.bulk_create([
+        CarriedItem(
+            journal=journal,
+            item_id=item_id,
+            origin_journal_id=origin_journal,
+            origin_item_id=origin_item,
+            root_item_id=roots.get(origin_item, origin_item),
+        )
+        for item_id, (origin_journal, origin_item) in new.items()
+        if origin_journal in journal_ids
+    ])
+
+
+def item_lineage(item_id):
+    """
+    The links of an item's lineage, oldest first: every CarriedItem of the
+    chain the item belongs to, with both journals selected.
+    """
+    item_id = WeeklyJournal.clean_item_id(item_id)
+    if item_id is None:
+        return []
+    root = CarriedItem.objects.filter(item_id=item_id).values_list('root_item_id', flat=True).first()
+    return list(
+        CarriedItem.objects.filter(root_item_id=root or item_id)
+        .select_related('journal', 'origin_journal')
+        .order_by('journal__date_from', 'id')
+    )
@@ -0,0 +1,24 @@
+"""
+System checks for journal features that need a cache shared between processes.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+from apps.web.checks import cache_is_shared
+
+
+@register()
+def check_analytics_background(app_configs, **kwargs):
+    if settings.ANALYTICS_BACKGROUND and not cache_is_shared():
+        return [
+            Error(
+                'ANALYTICS_BACKGROUND is on, but the default cache is local to each process.',
+                hint=(
+                    'The Celery task would cache the analytics where the web processes never see them, '
+                    'so long ranges would stay pending. Set DJANGO_CACHE_REDIS=True, or '
+                    'DJANGO_ANALYTICS_BACKGROUND=False to compute them in the request.'
+                ),
+                id='journal.E001',
+            )
+        ]
+    return []
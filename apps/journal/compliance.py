@@ -0,0 +1,158 @@
+"""
+Missing journal submissions per week.
+
+The roster of a week is every active user who submitted a journal in the
+ROSTER_LOOKBACK_WEEKS weeks before it, assigned to the department of their
+latest journal. The users missing a week are the roster minus that week's
+authors, computed with one NOT EXISTS anti-join and cached per week.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef, Subquery
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .models import SubmissionReminder, WeeklyJournal
+from .rollups import week_start
+
+
+ROSTER_LOOKBACK_WEEKS = 8
+
+
+def missing_submissions_queryset(week, department=None):
+    """Users on the roster of the week starting on `week` without a journal that week"""
+    week = week_start(week)
+    roster_journals = WeeklyJournal.objects.filter(
+        author=OuterRef('pk'),
+        date_from__gte=week - timedelta(weeks=ROSTER_LOOKBACK_WEEKS),
+        date_from__lt=week,
+    )
+    latest = roster_journals.order_by('-date_from')
+    submitted = WeeklyJournal.objects.filter(
+        author=OuterRef('pk'), date_from__gte=week, date_from__lt=week + timedelta(weeks=1)
+    )
+    users = (
+        User.objects.filter(is_active=True)
+        .filter(Exists(roster_journals))
+        .exclude(Exists(submitted))
+        .annotate(
+            department_id=Subquery(latest.values('department_id')[:1]),
+            department_name=Subquery(latest.values('department__name')[:1]),
+            last_submitted=Subquery(latest.values('date_from')[:1]),
+        )
+    )
+    if department is not None:
+        users = users.filter(department_id=getattr(department, 'pk', department))
+    return users.order_by('department_name', 'last_name', 'first_name', 'username')
+
+
+def compliance_cache_key(week):
+    return f'journal:compliance:{week_start(week)}'
+
+
+def missing_submissions(week):
+    """
+    Rows (id, username, name, email, department_id, department_name,
+    last_submitted) of the users missing the week, cached per week.
+    """
+    key = compliance_cache_key(week)
+    rows = cache.get(key)
+    if rows is None:
+        rows = compute_missing_submissions(week)
+    return rows
+
+
+def compute_missing_submissions(week):
+    """Run the anti-join for the week and cache the result"""
+    rows = [
+        {
+            'id': user['id'],
+            'username': user['username'],
+            'name': f"{user['first_name']} {user['last_name']}".strip() or user['username'],
+            'email': user['email'],
+            'department_id': user['department_id'],
+            'department_name': user['department_name'],
+            'last_submitted': user['last_submitted'],
+        }
+        for user in missing_submissions_queryset(week).values(
+            'id', 'username', 'first_name', 'last_name', 'email',
+            'department_id', 'department_name', 'last_submitted',
+        )
+    ]
+    cache.set(compliance_cache_key(week), rows, settings.COMPLIANCE_CACHE_TIMEOUT)
+    return rows
+
+
+def missing_submissions_range(since, until, department=None):
+    """{week start: rows} for every week from since to until"""
+    department_id = getattr(department, 'pk', department)
+    result = {}
+    week = week_start(since)
+    while week <= until:
+        rows = missing_submissions(week)
+        if department_id is not None:
+            rows = [row for row in rows if row['department_id'] == department_id]
+        result[week] = rows
+        week += timedelta(weeks=1)
+    return result
+
+
+def invalidate_journal_weeks(journal):
+    """
+    Drop the cached results a journal changes: its own week, and the
+    following weeks whose roster it puts its author on.
+    """
+    invalidate_weeks([WeeklyJournal._meta.get_field('date_from').to_python(journal.date_from)])
+
+
+def invalidate_weeks(days):
+    """Drop the cached results of the weeks of the days and the rosters they feed"""
+    weeks = {week_start(day) for day in days}
+    cache.delete_many([
+        compliance_cache_key(week + timedelta(weeks=n)) for week in weeks for n in range(ROSTER_LOOKBACK_WEEKS + 1)
+    ])
+
+
+def send_reminders(week, rows, base_url=''):
+    """
+    Email a reminder to every user in rows that has an address and wasn't
+    reminded about the week yet. All messages go over one SMTP connection,
+    in batches of COMPLIANCE_REMINDER_BATCH_SIZE. Returns the number sent.
+    """
+    week = week_start(week)
+    reminded = set(
+        SubmissionReminder.objects.filter(week_start=week, user_id__in=[row['id'] for row in rows])
+        .values_list('user_id', flat=True)
+    )
+    recipients = [row for row in rows if row['email'] and row['id'] not in reminded]
+    if not recipients:
+        return 0
+
+    subject = f'Reminder: weekly journal for the week of {week:%b %d, %Y}'
+    create_url = base_url + reverse('journal:create')
+    batch_size = settings.COMPLIANCE_REMINDER_BATCH_SIZE
+    sent = 0
+    with get_connection() as connection:
+        for start in range(0, len(recipients), batch_size):
+            batch = recipients[start:start + batch_size]
+            messages = [
+                EmailMessage(
+                    subject,
+                    render_to_string('journal/email/submission_reminder.txt', {
+                        'row': row, 'week': week, 'week_end': week + timedelta(days=6), 'create_url': create_url,
+                    }),
+                    settings.DEFAULT_FROM_EMAIL,
+                    [row['email']],
+                )
+                for row in batch
+            ]
+            sent += connection.send_messages(messages) or 0
+            # Recorded per batch, so a failure halfway doesn't remind the first batches twice
+            SubmissionReminder.objects.bulk_create(
+                [SubmissionReminder(user_id=row['id'], week_start=week) for row in batch], ignore_conflicts=True
+            )
+    return sent
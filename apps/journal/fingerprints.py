@@ -0,0 +1,269 @@
+"""
+Near-duplicate open items across weeks.
+
+Every in-progress or on-hold item gets an ItemFingerprint with a MinHash
+signature of its normalized words, and one ItemBucket per LSH band (BANDS
+bands of ROWS signature values). Items of the same author that share a
+bucket are candidates; the share of equal signature values estimates how
+similar they are. So "has this item been open before?" is a lookup on the
+(author, band, bucket, week_start) index instead of comparing text across
+every journal.
+
+Saving a journal re-indexes its items (see signals.py); bulk inserts are
+indexed by rebuild_fingerprints() and the rebuild_fingerprints command.
+"""
+import hashlib
+import re
+import struct
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+from random import Random
+
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import ItemBucket, ItemFingerprint, WeeklyJournal
+from .rollups import week_start
+
+
+OPEN_STATUSES = ('in_progress', 'on_hold')
+
+NUM_PERM = 16
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+# Estimated word overlap (Jaccard) for two items to count as the same item
+SIMILARITY_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_random = Random(20240101)
+PERMUTATIONS = tuple(
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)
+)
+
+WORD_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or the this that to was were will with'.split()
+)
+SUFFIXES = ('ing', 'ed', 'es', 's', 'e')
+# Columns of the ItemBucket rows written by insert_buckets()
+BUCKET_FIELDS = ('fingerprint', 'author', 'week_start', 'band', 'bucket')
+
+
+def stem(word):
+    """Crude suffix stripping, enough for "migrate", "migrating" and "migrated" to match"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def normalize_text(text):
+    """Lowercased, stemmed words of an item, without stop words"""
+    return ' '.join(stem(word) for word in WORD_RE.findall(str(text).lower()) if word not in STOP_WORDS)
+
+
+# Items are often repeated from week to week, so rebuilds hash each text once
+@lru_cache(maxsize=1 << 16)
+def minhash(text):
+    """MinHash signature of the words of text, None when it has no words"""
+    words = set(normalize_text(text).split())
+    if not words:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), 'little') for word in words]
+    return tuple(min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in PERMUTATIONS)
+
+
+@lru_cache(maxsize=1 << 16)
+def band_buckets(signature):
+    """The bucket of each LSH band of a signature, as signed 64-bit integers"""
+    return tuple(
+        int.from_bytes(
+            hashlib.blake2b(struct.pack(f'<{ROWS}I', *signature[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest(),
+            'little',
+            signed=True,
+        )
+        for band in range(BANDS)
+    )
+
+
+def pack_signature(signature):
+    return struct.pack(f'<{NUM_PERM}I', *signature)
+
+
+def unpack_signature(value):
+    return struct.unpack(f'<{NUM_PERM}I', bytes(value))
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(a == b for a, b in zip(first, second)) / NUM_PERM
+
+
+def open_items(values):
+    """(section, item) of the open items with an id in {section: stored JSON}"""
+    for section, default_status in WeeklyJournal.SECTION_DEFAULT_STATUS.items():
+        for item in WeeklyJournal.normalize_items(values.get(section), default_status):
+            if item.get('id') and item.get('status', default_status) in OPEN_STATUSES:
+                yield section, item
+
+
+def build_fingerprints(journal_id, author_id, date_from, values):
+    """Unsaved (fingerprint, buckets) pairs of a journal's open items"""
+    monday = week_start(date_from)
+    result = []
+    for section, item in open_items(values):
+        signature = minhash(item['text'])
+        if signature is None:
+            continue
+        fingerprint = ItemFingerprint(
+            journal_id=journal_id,
+            author_id=author_id,
+            week_start=monday,
+            section=section,
+            item_id=item['id'],
+            status=item['status'],
+            text=item['text'],
+            signature=pack_signature(signature),
+        )
+        result.append((fingerprint, band_buckets(signature)))
+    return result
+
+
+def save_fingerprints(pairs, batch_size=2000):
+    """Insert (fingerprint, buckets) pairs, fingerprints first so the buckets get their ids"""
+    fingerprints = ItemFingerprint.objects.bulk_create([fingerprint for fingerprint, _ in pairs], batch_size=batch_size)
+    insert_buckets(zip(fingerprints, (buckets for _, buckets in pairs)), batch_size)
+
+
+def insert_buckets(fingerprint_buckets, batch_size=2000):
+    """
+    Insert the ItemBuckets of saved (fingerprint, buckets) pairs as plain
+    multi-row INSERTs: there are BANDS of them per fingerprint, and building
+    model instances for bulk_create() took most of a rebuild.
+    """
+    connection = connections[router.db_for_write(ItemBucket)]
+    rows = []
+    for fingerprint, buckets in fingerprint_buckets:
+        week = connection.ops.adapt_datefield_value(fingerprint.week_start)
+        rows.extend((fingerprint.pk, fingerprint.author_id, week, band, bucket) for band, bucket in enumerate(buckets))
+    if not rows:
+        return
+
+    fields = [ItemBucket._meta.get_field(name) for name in BUCKET_FIELDS]
+    batch_size = max(min(batch_size, connection.ops.bulk_batch_size(fields, rows)), 1)
+    quote = connection.ops.quote_name
+    insert = f'INSERT INTO {quote(ItemBucket._meta.db_table)} ({", ".join(quote(field.column) for field in fields)}) VALUES '
+    placeholder = f'({", ".join(["%s"] * len(fields))})'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(insert + ', '.join([placeholder] * len(batch)), [value for row in batch for value in row])
+
+
+def delete_fingerprints(journal_ids):
+    # Buckets go first in one statement, so deleting the fingerprints doesn't collect them
+    ItemBucket.objects.filter(fingerprint__journal_id__in=journal_ids).delete()
+    ItemFingerprint.objects.filter(journal_id__in=journal_ids).only('pk').delete()
+
+
+def index_journal(journal, stored_values):
+    """
+    Re-index the open items of a saved journal, given the values stored
+    before the save. Journals without open items before or after are skipped.
+    """
+    values = {section: getattr(journal, section) for section in WeeklyJournal.SECTION_DEFAULT_STATUS}
+    if not any(open_items(values)) and not any(open_items(stored_values)):
+        return
+    date_from = WeeklyJournal._meta.get_field('date_from').to_python(journal.date_from)
+    with transaction.atomic():
+        delete_fingerprints([journal.pk])
+        save_fingerprints(build_fingerprints(journal.pk, journal.author_id, date_from, values))
+
+
+def rebuild_fingerprints(since=None, until=None, batch_size=2000):
+    """
+    Re-index the open items of the journals starting between since and until
+    (all journals by default). Returns the number of fingerprints written.
+    """
+    journals = WeeklyJournal.objects.order_by('pk')
+    if since is not None:
+        journals = journals.filter(date_from__gte=week_start(since))
+    if until is not None:
+        journals = journals.filter(date_from__lt=week_start(until) + timedelta(weeks=1))
+    sections = tuple(WeeklyJournal.SECTION_DEFAULT_STATUS)
+
+    written = 0
+    last_pk = 0
+    while True:
+        rows = list(journals.filter(pk__gt=last_pk).values_list('pk', 'author_id', 'date_from', *sections)[:batch_size])
+        if not rows:
+            return written
+        last_pk = rows[-1][0]
+        pairs = []
+        for pk, author_id, date_from, *values in rows:
+            pairs.extend(build_fingerprints(pk, author_id, date_from, dict(zip(sections, values))))
+        with transaction.atomic():
+            delete_fingerprints([row[0] for row in rows])
+            save_fingerprints(pairs, batch_size)
+        written += len(pairs)
+
+
+def long_running_items(week, lookback_weeks=26, min_weeks=3, department=None):
+    """
+    Open items of the week that were open in at least min_weeks - 1 earlier
+    weeks of the lookback, by the same author, as dicts sorted by the number
+    of weeks open. Four queries however many journals there are.
+    """
+    week = week_start(week)
+    since = week - timedelta(weeks=lookback_weeks)
+    current = ItemBucket.objects.filter(week_start=week)
+    if department is not None:
+        current = current.filter(fingerprint__journal__department=department)
+    current_rows = list(current.values_list('fingerprint_id', 'author_id', 'band', 'bucket'))
+
+    earlier_rows = ItemBucket.objects.filter(
+        Exists(current.filter(author=OuterRef('author'), band=OuterRef('band'), bucket=OuterRef('bucket'))),
+        week_start__gte=since,
+        week_start__lt=week,
+    ).values_list('fingerprint_id', 'author_id', 'band', 'bucket')
+    earlier_buckets = defaultdict(set)
+    for fingerprint_id, *key in earlier_rows:
+        earlier_buckets[tuple(key)].add(fingerprint_id)
+
+    candidates = defaultdict(set)
+    for fingerprint_id, *key in current_rows:
+        candidates[fingerprint_id].update(earlier_buckets.get(tuple(key), ()))
+    candidates = {fingerprint_id: ids for fingerprint_id, ids in candidates.items() if len(ids) >= min_weeks - 1}
+    if not candidates:
+        return []
+
+    earlier = {
+        fingerprint.pk: fingerprint for fingerprint in ItemFingerprint.objects.filter(
+            pk__in=set().union(*candidates.values())
+        ).only('pk', 'journal_id', 'week_start', 'signature')
+    }
+    items = []
+    for fingerprint in ItemFingerprint.objects.filter(pk__in=candidates).select_related(
+        'journal__department', 'author'
+    ):
+        signature = unpack_signature(fingerprint.signature)
+        matches = [
+            earlier[pk] for pk in candidates[fingerprint.pk]
+            if similarity(signature, unpack_signature(earlier[pk].signature)) >= SIMILARITY_THRESHOLD
+        ]
+        weeks = {match.week_start for match in matches}
+        if len(weeks) + 1 < min_weeks:
+            continue
+        first = min(matches, key=lambda match: match.week_start)
+        items.append({
+            'fingerprint': fingerprint,
+            'journal': fingerprint.journal,
+            'author': fingerprint.author,
+            'weeks_open': len(weeks) + 1,
+            'first_seen': first.week_start,
+            'first_journal_id': first.journal_id,
+        })
+    items.sort(key=lambda item: (-item['weeks_open'], item['first_seen'], item['fingerprint'].pk))
+    return items
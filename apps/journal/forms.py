@@ -1,10 +1,38 @@
 from django import forms
 from django.forms.widgets import DateInput
 from .models import WeeklyJournal, JournalComment, Department
+from .carry import parse_origin
 import json
 
 
-class WeeklyJournalForm(forms.ModelForm):
+class VersionedFormMixin:
+    """
+    Posts back the version of the instance the form was rendered from, so
+    saving it raises VersionConflict when someone else saved it in between.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['version'] = forms.IntegerField(
+            widget=forms.HiddenInput, required=False, min_value=1, initial=self.instance.version
+        )
+    
+    def save(self, commit=True):
+        if self.cleaned_data.get('version') and self.instance.pk:
+            self.instance.version = self.cleaned_data['version']
+        return super().save(commit)
+    
+    def add_conflict_error(self, conflict):
+        """Report a VersionConflict; posting the form again saves over the other change"""
+        self.add_error(None, (
+            f"Someone else saved this {self.instance._meta.verbose_name.lower()} while you were editing it. "
+            "Your changes are below: save again to replace theirs, or reload the page to see them."
+        ))
+        self.data = self.data.copy()
+        self.data['version'] = conflict.current_version
+
+
+class WeeklyJournalForm(VersionedFormMixin, forms.ModelForm):
     """Form for creating and editing weekly journal entries with dynamic fields"""
     
     class Meta:
@@ -66,66 +94,32 @@ class WeeklyJournalForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
         
-        # Process dynamic fields from POST data with status
+        # Process dynamic fields from POST data with status. Edited items post
+        # back their id, new ones get an id when the journal is saved.
         if hasattr(self, 'data'):
-            # Extract highlights
-            highlights = []
-            i = 0
-            while f'highlights_{i}' in self.data:
-                text = self.data[f'highlights_{i}'].strip()
-                status = self.data.get(f'highlights_status_{i}', 'completed')
-                if text:
-                    highlights.append({"text": text, "status": status})
-                i += 1
-            instance.highlights = highlights
-            
-            # Extract pendings
-            pendings = []
-            i = 0
-            while f'pendings_{i}' in self.data:
-                text = self.data[f'pendings_{i}'].strip()
-                status = self.data.get(f'pendings_status_{i}', 'in_progress')
-                if text:
-                    pendings.append({"text": text, "status": status})
-                i += 1
-            instance.pendings = pendings
-            
-            # Extract challenges
-            challenges = []
-            i = 0
-            while f'challenges_{i}' in self.data:
-                text = self.data[f'challenges_{i}'].strip()
-                status = self.data.get(f'challenges_status_{i}', 'on_hold')
-                if text:
-                    challenges.append({"text": text, "status": status})
-                i += 1
-            instance.challenges = challenges
-            
-            # Extract personal_updates
-            personal_updates = []
-            i = 0
-            while f'personal_updates_{i}' in self.data:
-                text = self.data[f'personal_updates_{i}'].strip()
-                status = self.data.get(f'personal_updates_status_{i}', 'completed')
-                if text:
-                    personal_updates.append({"text": text, "status": status})
-                i += 1
-            instance.personal_updates = personal_updates
-            
-            # Extract strategies
-            strategies = []
-            i = 0
-            while f'strategies_{i}' in self.data:
-                text = self.data[f'strategies_{i}'].strip()
-                status = self.data.get(f'strategies_status_{i}', 'not_started')
-                if text:
-                    strategies.append({"text": text, "status": status})
-                i += 1
-            instance.strategies = strategies
+            for section, default_status in WeeklyJournal.SECTION_DEFAULT_STATUS.items():
+                setattr(instance, section, self.items_from_data(section, default_status))
         
         if commit:
             instance.save()
         return instance
+    
+    def items_from_data(self, section, default_status):
+        """Items of a section posted as {section}_{i}, {section}_status_{i}, {section}_id_{i} and {section}_origin_{i}"""
+        items = []
+        i = 0
+        while f'{section}_{i}' in self.data:
+            text = self.data[f'{section}_{i}'].strip()
+            status = self.data.get(f'{section}_status_{i}', default_status)
+            if text:
+                item = {"text": text, "status": status, "id": self.data.get(f'{section}_id_{i}', '')}
+                # Items carried forward from an earlier week link to the item they came from
+                origin = parse_origin(self.data.get(f'{section}_origin_{i}'))
+                if origin:
+                    item["origin"] = origin
+                items.append(item)
+            i += 1
+        return items
 
 
 class JournalCommentForm(forms.ModelForm):
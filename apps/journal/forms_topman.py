@@ -1,11 +1,12 @@
 from django import forms
 from django.forms.widgets import DateInput, Textarea
 from .models import TopManagementReport, TopManagementTag, WeeklyJournal
+from .forms import VersionedFormMixin
 import json
 from datetime import date, timedelta
 
 
-class TopManagementReportForm(forms.ModelForm):
+class TopManagementReportForm(VersionedFormMixin, forms.ModelForm):
     """Form for creating and editing Top Management reports"""
     
     class Meta:
@@ -0,0 +1,115 @@
+"""
+Item-level change log of journal entries.
+
+On every save the normalized item lists are compared with the stored ones,
+and only the items that differ are written as JournalItemChange rows, with a
+single bulk_create per save. Items are paired by their stable id, so
+reordering or deleting items doesn't show up as edits of the items after
+them; stored items from before ids existed are paired by position.
+"""
+import hashlib
+
+from .models import JournalItemChange, WeeklyJournal
+
+
+SECTIONS = tuple(WeeklyJournal.SECTION_DEFAULT_STATUS)
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.strip().encode(), digest_size=8).hexdigest()
+
+
+def normalized_sections(values):
+    """{section: [(text hash, status, item id or None), ...]} for a {section: raw JSON value} mapping"""
+    result = {}
+    for section in SECTIONS:
+        default_status = WeeklyJournal.SECTION_DEFAULT_STATUS[section]
+        result[section] = [
+            (
+                text_hash(str(item.get('text', ''))),
+                str(item.get('status') or default_status)[:20],
+                WeeklyJournal.clean_item_id(item.get('id') or ''),
+            )
+            for item in WeeklyJournal.normalize_items(values.get(section), default_status)
+        ]
+    return result
+
+
+def pair_items(old_items, new_items):
+    """
+    Yield (position, old item, new item) pairs of a section, by item id, then
+    by position for the old items without one. Unpaired items come with None,
+    removed ones at their old position.
+    """
+    old_by_id = {item[2]: position for position, item in enumerate(old_items) if item[2]}
+    paired = set()
+    for position, new_item in enumerate(new_items):
+        old_position = old_by_id.get(new_item[2])
+        if old_position is None and position < len(old_items) and not old_items[position][2]:
+            old_position = position
+        if old_position is None or old_position in paired:
+            yield position, None, new_item
+            continue
+        paired.add(old_position)
+        yield position, old_items[old_position], new_item
+    for position, old_item in enumerate(old_items):
+        if position not in paired:
+            yield position, old_item, None
+
+
+def diff_sections(old, new):
+    """Yield (section, position, change, old item, new item) for every item that differs"""
+    for section in SECTIONS:
+        for position, old_item, new_item in pair_items(old.get(section, []), new.get(section, [])):
+            if old_item is not None and new_item is not None and old_item[:2] == new_item[:2]:
+                continue
+            if old_item is None:
+                change = 'added'
+            elif new_item is None:
+                change = 'removed'
+            elif old_item[0] == new_item[0]:
+                change = 'status'
+            elif old_item[1] == new_item[1]:
+                change = 'text'
+            else:
+                change = 'both'
+            yield section, position, change, old_item, new_item
+
+
+def record_changes(journal, old_values, user=None):
+    """
+    Store the item changes between old_values ({section: stored JSON}, empty
+    for a new journal) and the journal as saved. Returns the created rows.
+    """
+    old = normalized_sections(old_values)
+    new = normalized_sections({section: getattr(journal, section) for section in SECTIONS})
+    changes = [
+        JournalItemChange(
+            journal=journal,
+            section=section,
+            position=position,
+            item_id=(new_item or old_item)[2],
+            change=change,
+            old_status=old_item[1] if old_item else '',
+            new_status=new_item[1] if new_item else '',
+            old_text_hash=old_item[0] if old_item else '',
+            new_text_hash=new_item[0] if new_item else '',
+            changed_by=user,
+        )
+        for section, position, change, old_item, new_item in diff_sections(old, new)
+    ]
+    if changes:
+        JournalItemChange.objects.bulk_create(changes)
+    return changes
+
+
+def status_timeline(journal, section=None, position=None, item_id=None):
+    """Status transitions of a journal's items, oldest first"""
+    changes = journal.item_changes.filter(change__in=('added', 'status', 'both')).select_related('changed_by')
+    if section is not None:
+        changes = changes.filter(section=section)
+    if position is not None:
+        changes = changes.filter(position=position)
+    if item_id is not None:
+        changes = changes.filter(item_id=item_id)
+    return changes
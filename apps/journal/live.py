@@ -0,0 +1,177 @@
+"""
+Live updates of open pages, pushed through apps.web.events.
+
+Changes are published after the transaction commits, so clients never see
+a change that was rolled back, and carry only what the pages patch in
+place: tag events the tagged item's key and the tag's priority, 'counts'
+events the difference a journal save or delete made to the counters of the
+dashboard and the weekly summary, keyed like the page's data-counter
+attributes. Streams start with a 'snapshot' of the same counters and the
+number of the last event of each channel, read before counting, and
+clients skip the deltas numbered at or below it (see apps.web.events).
+"""
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count
+
+from apps.web.events import publish, read_sequences
+from .cache import DASHBOARD_CHANNEL, build_status_summary, empty_status_summary, get_dashboard_snapshot, user_channel
+from .models import TopManagementTag, WeeklyJournal
+from .rollups import week_start
+
+
+# Journals spanning more weeks than this only update the summaries of their first weeks
+MAX_JOURNAL_WEEKS = 8
+
+
+def report_channel(report_id):
+    return f'report:{report_id}:tags'
+
+
+def week_channel(monday):
+    return f'week:{monday.isoformat()}'
+
+
+def publish_tag_change(tag, event_type):
+    """Publish a 'tag', 'priority' or 'untag' event for the tag's report on commit"""
+    if tag.item_id is None:
+        return
+    event = {
+        'type': event_type,
+        'journal': tag.journal_entry_id,
+        # item_id is still the posted string on instances that were just created
+        'item': WeeklyJournal.clean_item_id(tag.item_id),
+        'priority': tag.priority,
+    }
+    transaction.on_commit(partial(publish, report_channel(tag.report_id), event))
+
+
+async def tag_snapshot(report_id):
+    """The 'snapshot' event of a report's tags, sent first on every stream, in one query"""
+    rows = [
+        row async for row in TopManagementTag.objects.filter(report_id=report_id).values_list(
+            'journal_entry_id', 'item_id', 'priority'
+        )
+    ]
+    return {
+        'type': 'snapshot',
+        'count': len(rows),
+        'tags': [
+            {'journal': journal_id, 'item': item_id.hex, 'priority': priority}
+            for journal_id, item_id, priority in rows
+            if item_id is not None
+        ],
+    }
+
+
+def journal_values(journal):
+    """The dates and sections of a journal instance, like rollups.stored_journal_values()"""
+    values = {section: getattr(journal, section) for section in WeeklyJournal.SECTION_DEFAULT_STATUS}
+    for field in ('date_from', 'date_to'):
+        # Dates may still be the strings they were assigned as
+        values[field] = WeeklyJournal._meta.get_field(field).to_python(getattr(journal, field))
+    return values
+
+
+def status_counts(values):
+    """The status summary of a {section: stored JSON} mapping, counted like cache.build_status_summary()"""
+    summary = empty_status_summary()
+    for section, default_status in WeeklyJournal.SECTION_DEFAULT_STATUS.items():
+        for item in WeeklyJournal.normalize_items(values.get(section), default_status):
+            status = item.get('status', 'not_started')
+            if status in summary:
+                summary[status] += 1
+            summary['total_items'] += 1
+    return summary
+
+
+def journal_weeks(values):
+    """Mondays of the weeks a journal's dates overlap, the weekly summaries it is counted in"""
+    if not values:
+        return set()
+    monday, last = week_start(values['date_from']), week_start(values['date_to'])
+    weeks = set()
+    while monday <= last and len(weeks) < MAX_JOURNAL_WEEKS:
+        weeks.add(monday)
+        monday += timedelta(weeks=1)
+    return weeks
+
+
+def prefixed(prefix, counts):
+    return {f'{prefix}.{key}': value for key, value in counts.items()}
+
+
+def publish_journal_counts(author_id, old_values, new_values):
+    """
+    Publish the counter deltas of a journal save or delete on commit, given
+    the values before ({} for a new journal) and after ({} once deleted).
+    """
+    old_counts = status_counts(old_values) if old_values else empty_status_summary()
+    new_counts = status_counts(new_values) if new_values else empty_status_summary()
+    status_delta = {key: new_counts[key] - old_counts[key] for key in new_counts}
+    entries = bool(new_values) - bool(old_values)
+
+    deltas = {
+        DASHBOARD_CHANNEL: {'total_journals': entries, **prefixed('status_summary', status_delta)},
+        user_channel(author_id): {'user_journal_count': entries, **prefixed('user_status_summary', status_delta)},
+    }
+    old_weeks, new_weeks = journal_weeks(old_values), journal_weeks(new_values)
+    for monday in old_weeks | new_weeks:
+        before = old_counts if monday in old_weeks else empty_status_summary()
+        after = new_counts if monday in new_weeks else empty_status_summary()
+        deltas[week_channel(monday)] = {
+            'stats.total_entries': (monday in new_weeks) - (monday in old_weeks),
+            **prefixed('status_summary', {key: after[key] - before[key] for key in after}),
+        }
+
+    for channel, counts in deltas.items():
+        counts = {key: value for key, value in counts.items() if value}
+        if counts:
+            transaction.on_commit(partial(publish, channel, {'type': 'counts', 'counts': counts}))
+
+
+async def dashboard_snapshot(user):
+    """The dashboard counters, from the cached snapshot the page itself is rendered from"""
+    snapshot = await sync_to_async(get_dashboard_snapshot)(user)
+    shared = {'total_journals': snapshot['total_journals'], **prefixed('status_summary', snapshot['status_summary'])}
+    own = {
+        'user_journal_count': snapshot['user_journal_count'],
+        **prefixed('user_status_summary', snapshot['user_status_summary']),
+    }
+    return {
+        'type': 'snapshot',
+        'counts': {**shared, **own},
+        'seq': {DASHBOARD_CHANNEL: snapshot['global_seq'], user_channel(user.pk): snapshot['user_seq']},
+    }
+
+
+def weekly_summary_counts(monday, report_id=None):
+    """The 'snapshot' event of the weekly summary counters of a week, and of its report's tagged items counter"""
+    channels = [week_channel(monday)] if report_id is None else [week_channel(monday), report_channel(report_id)]
+    sequences = read_sequences(channels)
+    return {'type': 'snapshot', 'seq': sequences, 'counts': summary_counts(monday)}
+
+
+def summary_counts(monday):
+    """The weekly summary counters of a week, in three queries"""
+    sunday = monday + timedelta(days=6)
+    journals = WeeklyJournal.objects.filter(date_from__lte=sunday, date_to__gte=monday)
+    stats = journals.aggregate(
+        total_entries=Count('id'),
+        total_departments=Count('department', distinct=True),
+        total_team_members=Count('author', distinct=True),
+    )
+    stats['tagged_items_count'] = TopManagementTag.objects.filter(
+        report__week_start=monday, report__week_end=sunday
+    ).count()
+    status_summary = build_status_summary(
+        journals.only('id', *WeeklyJournal.SECTION_DEFAULT_STATUS).order_by().iterator()
+    )
+    return {**prefixed('stats', stats), **prefixed('status_summary', status_summary)}
+
+
+async def weekly_summary_snapshot(monday, report_id=None):
+    return await sync_to_async(weekly_summary_counts)(monday, report_id)
@@ -0,0 +1,79 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the JSON API against the HTML views that show the same journal data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=str, required=True, help='Start of the range (YYYY-MM-DD)')
+        parser.add_argument('--date-to', type=str, required=True, help='End of the range (YYYY-MM-DD)')
+        parser.add_argument('--username', type=str, help='User to run as (defaults to the first superuser)')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of runs per case')
+        parser.add_argument('--page-size', type=int, default=500, help='API page size')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        client = Client()
+        client.force_login(user)
+
+        date_range = f"date_from={options['date_from']}&date_to={options['date_to']}"
+        api_url = f"{reverse('journal:api_journal_list')}?{date_range}&page_size={options['page_size']}"
+        cases = [
+            ('API (all fields)', api_url, True),
+            ('API (sparse fields)', api_url + '&fields=id,author_username,department_name,date_from,highlights', True),
+            ('Summary report HTML', f"{reverse('journal:summary_report')}?{date_range}", False),
+            ('Summary export CSV', f"{reverse('journal:export_summary')}?{date_range}&format=csv", False),
+            ('Summary export print HTML', f"{reverse('journal:export_summary')}?{date_range}&format=html", False),
+        ]
+
+        self.stdout.write(f'{"Case":<28} {"mean ms":>10} {"p50 ms":>10} {"queries":>8} {"bytes":>12} {"rows":>7}')
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            for label, url, paginated in cases:
+                durations = []
+                for _ in range(max(options['repeat'], 1)):
+                    start = time.perf_counter()
+                    with CaptureQueriesContext(connection) as queries:
+                        size, rows = self.fetch(client, url, paginated)
+                    durations.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f'{label:<28} {statistics.mean(durations) * 1000:>10.1f} '
+                    f'{statistics.median(durations) * 1000:>10.1f} {len(queries):>8} {size:>12} '
+                    f'{rows if rows is not None else "-":>7}'
+                )
+
+    def fetch(self, client, url, paginated):
+        """Fetch a URL, following API cursors; returns (total bytes, API rows or None)"""
+        size = 0
+        rows = 0 if paginated else None
+        while url:
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            content = b''.join(response) if response.streaming else response.content
+            size += len(content)
+            if not paginated:
+                break
+            data = response.json()
+            rows += len(data['results'])
+            url = data['next']
+        return size, rows
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist.')
+        user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No superuser found, pass --username.')
+        return user
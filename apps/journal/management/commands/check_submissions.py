@@ -0,0 +1,54 @@
+"""
+Management command to find the users missing a weekly journal and optionally remind them
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.journal.compliance import compute_missing_submissions, send_reminders
+from apps.journal.models import Department
+from apps.journal.rollups import week_start
+
+
+class Command(BaseCommand):
+    help = 'Compute (and cache) the users missing a weekly journal, for the current week by default'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', type=str, help='Any day of the week to check (YYYY-MM-DD)')
+        parser.add_argument('--weeks', type=int, default=1, help='Number of weeks to check, ending with --week')
+        parser.add_argument('--department', type=str, help='Only list the members of this department')
+        parser.add_argument('--send-reminders', action='store_true',
+                            help='Email the users missing the last checked week')
+
+    def handle(self, *args, **options):
+        try:
+            last = week_start(date.fromisoformat(options['week']) if options['week'] else date.today())
+        except ValueError:
+            raise CommandError('--week must be a date in YYYY-MM-DD format.')
+        if options['weeks'] < 1:
+            raise CommandError('--weeks must be at least 1.')
+
+        department = None
+        if options['department']:
+            department = Department.objects.filter(name=options['department']).first()
+            if department is None:
+                raise CommandError(f'Unknown department "{options["department"]}".')
+
+        rows = []
+        for n in range(options['weeks'] - 1, -1, -1):
+            week = last - timedelta(weeks=n)
+            rows = compute_missing_submissions(week)
+            if department is not None:
+                rows = [row for row in rows if row['department_id'] == department.pk]
+            self.stdout.write(f'Week of {week}: {len(rows)} missing')
+            if options['verbosity'] > 1:
+                for row in rows:
+                    self.stdout.write(f'  {row["username"]} ({row["department_name"]}, last {row["last_submitted"]})')
+
+        if options['send_reminders']:
+            scheme = 'https' if settings.USE_HTTPS_IN_ABSOLUTE_URLS else 'http'
+            base_url = f'{scheme}://{Site.objects.get_current().domain}'
+            sent = send_reminders(last, rows, base_url)
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} reminders for the week of {last}'))
@@ -0,0 +1,306 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.documents.models import Document, DocumentHistory, DocumentTemplate, DocumentType, Letterhead
+from apps.journal.cache import invalidate_all_dashboards
+from apps.journal.compliance import invalidate_weeks
+from apps.journal.models import Department, JournalComment, TopManagementReport, TopManagementTag, WeeklyJournal
+from apps.journal.fingerprints import rebuild_fingerprints
+from apps.journal.rollups import rebuild_rollups
+from apps.journal.signals import signals_suspended
+
+
+# Row counts at --scale 1, everything grows linearly with the scale factor.
+# Scale 25 gives roughly 25k users and 1M journal entries.
+BASE_USERS = 1000
+BASE_DEPARTMENTS = 20
+WEEKS = 52
+
+# Share of users that submit a journal in a given week
+PARTICIPATION = 0.8
+COMMENTS_PER_JOURNAL = 0.3
+TAGS_PER_REPORT_PER_SCALE = 25
+DOCUMENTS_PER_USER = 0.5
+
+# (min, max) number of items per section
+SECTION_ITEM_COUNTS = {
+    'highlights': (1, 5),
+    'pendings': (0, 4),
+    'challenges': (0, 3),
+    'personal_updates': (0, 2),
+    'strategies': (0, 3),
+}
+
+# Status weights per section, roughly what we see in production
+SECTION_STATUS_WEIGHTS = {
+    'highlights': {'completed': 70, 'in_progress': 20, 'on_hold': 5, 'not_started': 3, 'cancelled': 2},
+    'pendings': {'in_progress': 50, 'not_started': 25, 'on_hold': 15, 'completed': 5, 'cancelled': 5},
+    'challenges': {'on_hold': 40, 'in_progress': 35, 'not_started': 10, 'completed': 10, 'cancelled': 5},
+    'personal_updates': {'completed': 60, 'in_progress': 30, 'not_started': 10},
+    'strategies': {'not_started': 50, 'in_progress': 35, 'on_hold': 10, 'cancelled': 5},
+}
+
+WORDS = (
+    'client', 'release', 'review', 'budget', 'migration', 'onboarding', 'audit', 'report', 'vendor',
+    'deployment', 'campaign', 'pipeline', 'hiring', 'training', 'roadmap', 'invoice', 'contract',
+    'dashboard', 'integration', 'support', 'ticket', 'forecast', 'workshop', 'policy', 'survey',
+    'completed', 'started', 'blocked', 'delayed', 'planned', 'finalized', 'updated', 'scheduled',
+    'quarterly', 'weekly', 'internal', 'external', 'new', 'pending', 'critical', 'minor',
+)
+FIRST_NAMES = ('Ana', 'Ben', 'Carla', 'Dan', 'Elena', 'Felix', 'Grace', 'Hugo', 'Ines', 'Jon', 'Kim', 'Luis')
+LAST_NAMES = ('Reyes', 'Santos', 'Cruz', 'Garcia', 'Lim', 'Tan', 'Torres', 'Flores', 'Ramos', 'Mendoza')
+PRIORITIES = ('high', 'medium', 'low')
+DOCUMENT_ACTIONS = ('updated', 'viewed', 'exported', 'sent')
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset for load and performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Scale factor, 1 is {BASE_USERS} users over {WEEKS} weeks')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed gives the same data')
+        parser.add_argument('--weeks', type=int, default=WEEKS, help='Number of weeks of journals to generate')
+        parser.add_argument('--prefix', type=str, default='load', help='Prefix for generated usernames and names')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--reset', action='store_true', help='Delete previously generated data with this prefix first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = max(options['batch_size'], 1)
+        scale = options['scale']
+        if scale <= 0:
+            raise CommandError('--scale must be positive.')
+
+        if options['reset']:
+            self.reset()
+        elif User.objects.filter(username__startswith=f'{self.prefix}_user').exists():
+            raise CommandError(f'Data with prefix "{self.prefix}" already exists, pass --reset or another --prefix.')
+
+        self.status_choices = {
+            section: (list(weights), list(weights.values()))
+            for section, weights in SECTION_STATUS_WEIGHTS.items()
+        }
+
+        start = time.perf_counter()
+        # One transaction per step keeps SQLite fast without holding a single huge transaction
+        with transaction.atomic():
+            admin = self.create_admin()
+            departments = self.create_departments(max(int(BASE_DEPARTMENTS * scale ** 0.5), 1))
+            users = self.create_users(max(int(BASE_USERS * scale), 1))
+        # Every user reports to one department, like in production
+        user_departments = [(user_id, self.rng.choice(departments)) for user_id in users]
+
+        last_monday = date.today() - timedelta(days=date.today().weekday() + 7)
+        weeks = [last_monday - timedelta(weeks=n) for n in range(options['weeks'])][::-1]
+        with transaction.atomic():
+            reports = self.create_reports(admin, weeks)
+        tags_per_report = max(int(TAGS_PER_REPORT_PER_SCALE * scale), 1)
+
+        journal_count = comment_count = tag_count = 0
+        for week_start in weeks:
+            with transaction.atomic():
+                journals, comments, tags = self.create_week(
+                    week_start, user_departments, reports[week_start], admin, tags_per_report
+                )
+            journal_count += journals
+            comment_count += comments
+            tag_count += tags
+            self.stdout.write(
+                f'Week {week_start}: {journal_count} journals so far '
+                f'({journal_count / (time.perf_counter() - start):.0f} journals/sec)'
+            )
+
+        with transaction.atomic():
+            document_count, history_count = self.create_documents(
+                admin, users, int(len(users) * DOCUMENTS_PER_USER)
+            )
+
+        invalidate_all_dashboards()
+        if weeks:
+            rebuild_rollups(weeks[0], weeks[-1])
+            rebuild_fingerprints(weeks[0], weeks[-1], batch_size=self.batch_size)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(departments)} departments, {len(users)} users, {journal_count} journals, '
+            f'{comment_count} comments, {len(reports)} reports, {tag_count} tags, {document_count} documents '
+            f'and {history_count} history rows in {elapsed:.1f}s'
+        ))
+
+    def reset(self):
+        # Deleting the users cascades to their journals, comments, tags and documents.
+        # The journal receivers would update the rollups, drop caches and push live
+        # events per deleted row, so they are skipped and the rollups rebuilt and
+        # the caches dropped once afterwards
+        users = User.objects.filter(username__startswith=f'{self.prefix}_')
+        days = list(WeeklyJournal.objects.filter(author__in=users).dates('date_from', 'week'))
+        with transaction.atomic(), signals_suspended():
+            users.delete()
+            Department.objects.filter(name__startswith=f'{self.prefix.title()} ').delete()
+            Letterhead.objects.filter(name__startswith=f'{self.prefix.title()} ').delete()
+            DocumentType.objects.filter(name__startswith=f'{self.prefix.title()} ').delete()
+            rebuild_rollups()
+        invalidate_all_dashboards()
+        invalidate_weeks(days)
+        self.stdout.write(f'Removed existing data with prefix "{self.prefix}"')
+
+    def bulk_create(self, model, objs):
+        """Insert objects in batches, returning them with their primary keys set"""
+        created = []
+        for i in range(0, len(objs), self.batch_size):
+            created.extend(model.objects.bulk_create(objs[i:i + self.batch_size]))
+        return created
+
+    def sentence(self, min_words=4, max_words=12):
+        words = self.rng.choices(WORDS, k=self.rng.randint(min_words, max_words))
+        return ' '.join(words).capitalize()
+
+    def create_admin(self):
+        admin, _ = User.objects.get_or_create(
+            username=f'{self.prefix}_admin',
+            defaults={'is_staff': True, 'is_superuser': True, 'password': make_password(None)},
+        )
+        return admin
+
+    def create_departments(self, count):
+        objs = [
+            Department(name=f'{self.prefix.title()} Department {n:03d}', description=self.sentence())
+            for n in range(1, count + 1)
+        ]
+        return [department.pk for department in self.bulk_create(Department, objs)]
+
+    def create_users(self, count):
+        # Hashing is slow, so every generated user shares one unusable password hash
+        password = make_password(None)
+        objs = [
+            User(
+                username=f'{self.prefix}_user{n:06d}',
+                email=f'{self.prefix}_user{n:06d}@example.com',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for n in range(1, count + 1)
+        ]
+        return [user.pk for user in self.bulk_create(User, objs)]
+
+    def create_reports(self, admin, weeks):
+        existing = set(TopManagementReport.objects.filter(week_start__in=weeks).values_list('week_start', flat=True))
+        objs = [
+            TopManagementReport(
+                title=f'Top Management Weekly Report {week_start:%Y-W%V}',
+                week_start=week_start,
+                week_end=week_start + timedelta(days=6),
+                created_by=admin,
+                executive_summary=self.sentence(20, 60),
+            )
+            for week_start in weeks if week_start not in existing
+        ]
+        self.bulk_create(TopManagementReport, objs)
+        return dict(TopManagementReport.objects.filter(week_start__in=weeks).values_list('week_start', 'id'))
+
+    def make_items(self, section):
+        low, high = SECTION_ITEM_COUNTS[section]
+        statuses, weights = self.status_choices[section]
+        # Item ids come from the seeded generator too, so reruns produce the same data
+        return [
+            {'text': self.sentence(), 'status': status, 'id': '%032x' % self.rng.getrandbits(128)}
+            for status in self.rng.choices(statuses, weights, k=self.rng.randint(low, high))
+        ]
+
+    def create_week(self, week_start, user_departments, report_id, admin, tags_per_report):
+        """Create one week of journals with their comments and tags, returns the row counts"""
+        journals = [
+            WeeklyJournal(
+                author_id=user_id,
+                department_id=department_id,
+                date_from=week_start,
+                date_to=week_start + timedelta(days=6),
+                **{section: self.make_items(section) for section in SECTION_ITEM_COUNTS}
+            )
+            for user_id, department_id in user_departments
+            if self.rng.random() < PARTICIPATION
+        ]
+        journals = self.bulk_create(WeeklyJournal, journals)
+
+        comments = [
+            JournalComment(
+                journal_id=journal.pk,
+                author_id=self.rng.choice(user_departments)[0],
+                content=self.sentence(6, 30),
+            )
+            for journal in self.rng.sample(journals, int(len(journals) * COMMENTS_PER_JOURNAL))
+        ]
+        self.bulk_create(JournalComment, comments)
+
+        tags = []
+        for journal in self.rng.sample(journals, min(tags_per_report, len(journals))):
+            section = self.rng.choice([name for name in SECTION_ITEM_COUNTS if getattr(journal, name)])
+            index = self.rng.randrange(len(getattr(journal, section)))
+            item = getattr(journal, section)[index]
+            tags.append(TopManagementTag(
+                journal_entry_id=journal.pk,
+                report_id=report_id,
+                section=section,
+                item_id=item['id'],
+                item_index=index,
+                item_text=item['text'],
+                item_status=item['status'],
+                tagged_by=admin,
+                priority=self.rng.choice(PRIORITIES),
+                admin_note=self.sentence() if self.rng.random() < 0.3 else '',
+            ))
+        self.bulk_create(TopManagementTag, tags)
+        return len(journals), len(comments), len(tags)
+
+    def create_documents(self, admin, users, count):
+        """Create documents with a created entry and a few later actions in their history"""
+        template = DocumentTemplate.objects.create(
+            name=f'{self.prefix.title()} Template', template_content='<p>{{ body }}</p>', created_by=admin
+        )
+        letterhead = Letterhead.objects.create(
+            name=f'{self.prefix.title()} Letterhead', company_name='Load Test Inc.',
+            address='1 Benchmark Street', header_html='<h1>Load Test Inc.</h1>',
+        )
+        document_types = self.bulk_create(DocumentType, [
+            DocumentType(name=f'{self.prefix.title()} {name}', default_template=template)
+            for name in ('Memo', 'Letter', 'Notice')
+        ])
+
+        statuses = [choice for choice, _ in Document.STATUS_CHOICES]
+        documents = self.bulk_create(Document, [
+            Document(
+                title=self.sentence(3, 8),
+                document_type=self.rng.choice(document_types),
+                letterhead=letterhead,
+                template=template,
+                date=date.today() - timedelta(days=self.rng.randrange(365)),
+                addressee_name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                addressee_address='1 Benchmark Street',
+                body=self.sentence(40, 200),
+                status=self.rng.choice(statuses),
+                created_by_id=self.rng.choice(users),
+            )
+            for _ in range(count)
+        ])
+
+        history = []
+        for document in documents:
+            history.append(DocumentHistory(
+                document_id=document.pk, action='created', description='Document created',
+                user_id=document.created_by_id,
+            ))
+            for action in self.rng.choices(DOCUMENT_ACTIONS, k=self.rng.randint(0, 4)):
+                history.append(DocumentHistory(
+                    document_id=document.pk, action=action, description=f'Document {action}',
+                    user_id=document.created_by_id,
+                ))
+        self.bulk_create(DocumentHistory, history)
+        return len(documents), len(history)
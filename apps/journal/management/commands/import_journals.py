@@ -0,0 +1,272 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.journal.cache import invalidate_all_dashboards
+from apps.journal.models import Department, WeeklyJournal
+from apps.journal.fingerprints import build_fingerprints, save_fingerprints
+from apps.journal.rollups import apply_counts, bump_rollup_version, journal_counts
+
+
+SECTIONS = tuple(WeeklyJournal.SECTION_DEFAULT_STATUS)
+VALID_STATUSES = {choice for choice, _ in WeeklyJournal.STATUS_CHOICES}
+FORMATS = ('csv', 'ndjson', 'jsonl')
+
+
+class RowError(ValueError):
+    """Raised for a row that can't be imported"""
+
+
+class Command(BaseCommand):
+    help = 'Bulk import historical journal entries from a CSV or NDJSON/JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='File to import, or - to read from stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Input format (defaults to the file extension)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows validated and inserted per batch')
+        parser.add_argument('--create-departments', action='store_true',
+                            help='Create departments that do not exist yet instead of rejecting their rows')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without writing anything')
+        parser.add_argument('--max-errors', type=int, default=20, help='Number of row errors to print')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or self.guess_format(options['path'])
+        batch_size = max(options['batch_size'], 1)
+        self.dry_run = options['dry_run']
+        self.create_departments = options['create_departments']
+        self.max_errors = options['max_errors']
+
+        # Resolve authors and departments in memory instead of one query per row
+        self.authors = dict(User.objects.values_list('username', 'id'))
+        self.departments = dict(Department.objects.values_list('name', 'id'))
+
+        self.errors = 0
+        self.skipped = 0
+        self.inserted = 0
+        # Rollup counts of the inserted journals, applied once at the end
+        self.counts = Counter()
+        # Time spent indexing, reported apart from the insert rate
+        self.index_time = 0
+        total = 0
+        start = time.perf_counter()
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            rows = self.read_csv(stream) if input_format == 'csv' else self.read_json_lines(stream)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                total += len(batch)
+                self.import_batch(batch)
+                elapsed = time.perf_counter() - start - self.index_time
+                self.stdout.write(f'{total} rows read, {self.inserted} inserted ({total / elapsed:.0f} rows/sec)')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if self.inserted and not self.dry_run:
+            # bulk_create doesn't send post_save, so add the inserted journals
+            # to the rollups and drop the dashboard snapshots here
+            index_start = time.perf_counter()
+            apply_counts(self.counts)
+            bump_rollup_version()
+            invalidate_all_dashboards()
+            self.index_time += time.perf_counter() - index_start
+
+        elapsed = time.perf_counter() - start - self.index_time
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Validated" if self.dry_run else "Imported"} {total} rows in {elapsed:.1f}s ({rate:.0f} rows/sec): '
+            f'{self.inserted} {"valid" if self.dry_run else "inserted"}, {self.skipped} duplicates, '
+            f'{self.errors} rejected'
+        ))
+        if self.inserted and not self.dry_run:
+            self.stdout.write(f'Updated the rollups and fingerprints of the inserted journals in {self.index_time:.1f}s')
+
+    def guess_format(self, path):
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension not in FORMATS:
+            raise CommandError('Cannot infer the input format, pass --format.')
+        return extension
+
+    def read_csv(self, stream):
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+
+    def read_json_lines(self, stream):
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = e
+            yield line_number, row
+
+    def import_batch(self, batch):
+        """Validate a batch of (line number, row) pairs and insert the valid ones with a single bulk_create"""
+        if self.create_departments:
+            self.add_missing_departments(batch)
+
+        journals = []
+        seen = set()
+        for line_number, row in batch:
+            try:
+                journal = self.build_journal(row)
+            except RowError as e:
+                self.report_error(line_number, e)
+                continue
+            key = (journal.author_id, journal.date_from, journal.date_to)
+            if key in seen:
+                self.skipped += 1
+                continue
+            seen.add(key)
+            journals.append(journal)
+
+        if not journals:
+            return
+        if self.dry_run:
+            self.inserted += len(journals)
+            return
+
+        existing = self.stored_keys(seen)
+        new_journals = [
+            journal for journal in journals
+            if (journal.author_id, journal.date_from, journal.date_to) not in existing
+        ]
+        with transaction.atomic():
+            WeeklyJournal.objects.bulk_create(journals, batch_size=len(journals), ignore_conflicts=True)
+            index_start = time.perf_counter()
+            self.index_journals(new_journals)
+            self.index_time += time.perf_counter() - index_start
+        self.inserted += len(new_journals)
+        self.skipped += len(journals) - len(new_journals)
+
+    def stored_keys(self, keys):
+        """{batch key: journal id} of the batch keys in the database, ignore_conflicts doesn't report them"""
+        author_ids = {author_id for author_id, _, _ in keys}
+        dates_from = {date_from for _, date_from, _ in keys}
+        rows = WeeklyJournal.objects.filter(
+            author_id__in=author_ids, date_from__in=dates_from
+        ).values_list('author_id', 'date_from', 'date_to', 'pk')
+        return {tuple(row[:3]): row[3] for row in rows.iterator() if tuple(row[:3]) in keys}
+
+    def index_journals(self, journals):
+        """
+        Count and fingerprint the journals this batch inserted, instead of
+        rebuilding every journal of the imported weeks at the end
+        """
+        if not journals:
+            return
+        # bulk_create with ignore_conflicts doesn't set the ids
+        ids = self.stored_keys({(journal.author_id, journal.date_from, journal.date_to) for journal in journals})
+        pairs = []
+        for journal in journals:
+            self.counts.update(journal_counts(journal))
+            journal_id = ids[(journal.author_id, journal.date_from, journal.date_to)]
+            values = {section: getattr(journal, section) for section in SECTIONS}
+            pairs.extend(build_fingerprints(journal_id, journal.author_id, journal.date_from, values))
+        save_fingerprints(pairs)
+
+    def add_missing_departments(self, batch):
+        names = {
+            str(row.get('department') or '').strip()
+            for _, row in batch if isinstance(row, dict)
+        }
+        missing = [name for name in names if name and name not in self.departments]
+        if not missing:
+            return
+        if not self.dry_run:
+            Department.objects.bulk_create([Department(name=name) for name in missing], ignore_conflicts=True)
+            self.departments.update(Department.objects.filter(name__in=missing).values_list('name', 'id'))
+        else:
+            self.departments.update((name, None) for name in missing)
+
+    def build_journal(self, row):
+        if not isinstance(row, dict):
+            raise RowError(f'invalid JSON ({row})' if isinstance(row, Exception) else 'expected an object')
+
+        username = str(row.get('author') or '').strip()
+        if username not in self.authors:
+            raise RowError(f'unknown author "{username}"')
+        department = str(row.get('department') or '').strip()
+        if department not in self.departments:
+            raise RowError(f'unknown department "{department}"')
+
+        date_from = self.parse_date(row, 'date_from')
+        date_to = self.parse_date(row, 'date_to')
+        if date_from > date_to:
+            raise RowError('date_from is after date_to')
+
+        sections = {section: self.parse_items(row.get(section), section) for section in SECTIONS}
+        if not any(sections.values()):
+            raise RowError('entry has no items')
+
+        journal = WeeklyJournal(
+            author_id=self.authors[username],
+            department_id=self.departments[department],
+            date_from=date_from,
+            date_to=date_to,
+            **sections
+        )
+        # bulk_create doesn't call save(), which gives the items their ids
+        journal.assign_item_ids()
+        return journal
+
+    def parse_date(self, row, field):
+        value = row.get(field)
+        if isinstance(value, date):
+            return value
+        try:
+            return date.fromisoformat(str(value or '').strip())
+        except ValueError:
+            raise RowError(f'{field} must be a YYYY-MM-DD date')
+
+    def parse_items(self, value, section):
+        """
+        Parse a section into the {"text", "status"} list format.
+
+        CSV cells may hold a JSON list or plain text with one item per line.
+        """
+        if value is None or value == '':
+            return []
+        if isinstance(value, str):
+            stripped = value.strip()
+            if stripped.startswith('['):
+                try:
+                    value = json.loads(stripped)
+                except ValueError:
+                    raise RowError(f'{section} is not valid JSON')
+            else:
+                value = stripped.splitlines()
+        if not isinstance(value, list):
+            raise RowError(f'{section} must be a list')
+        if any(isinstance(item, dict) and not isinstance(item.get('text', ''), str) for item in value):
+            raise RowError('item text must be a string')
+
+        default_status = WeeklyJournal.SECTION_DEFAULT_STATUS[section]
+        items = []
+        for item in WeeklyJournal.normalize_items(value, default_status):
+            status = item.get('status') or default_status
+            if status not in VALID_STATUSES:
+                raise RowError(f'invalid status "{status}" in {section}')
+            items.append({'text': str(item['text']).strip(), 'status': status})
+        return items
+
+    def report_error(self, line_number, error):
+        self.errors += 1
+        if self.errors <= self.max_errors:
+            self.stderr.write(f'Line {line_number}: {error}')
+        elif self.errors == self.max_errors + 1:
+            self.stderr.write('Too many errors, not printing the rest.')
@@ -0,0 +1,38 @@
+"""
+Management command to re-index the open journal items for near-duplicate lookups
+"""
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.journal.fingerprints import rebuild_fingerprints
+
+
+class Command(BaseCommand):
+    help = 'Recompute the item fingerprints, for all weeks or the weeks between --since and --until'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=str, help='First week to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--until', type=str, help='Last week to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Journals read and rows inserted per batch')
+
+    def handle(self, *args, **options):
+        since = self.parse_date(options['since'], '--since')
+        until = self.parse_date(options['until'], '--until')
+        if since and until and since > until:
+            raise CommandError('--since is after --until.')
+
+        start = time.perf_counter()
+        count = rebuild_fingerprints(since, until, batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} item fingerprints in {time.perf_counter() - start:.1f}s'
+        ))
+
+    def parse_date(self, value, option):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'{option} must be a date in YYYY-MM-DD format.')
@@ -0,0 +1,30 @@
+"""
+Management command to refresh the cached item text and status of top management tags
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.journal.models import TopManagementReport, TopManagementTag
+from apps.journal.tagging import resync_report_tags, resync_tags
+
+
+class Command(BaseCommand):
+    help = 'Refresh the cached section, position, text and status of tags from their journal items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', type=int, action='append', help='Only resync the tags of this report id (repeatable)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['report']:
+            reports = list(TopManagementReport.objects.filter(pk__in=options['report']))
+            missing = set(options['report']) - {report.pk for report in reports}
+            if missing:
+                raise CommandError(f'Unknown report id(s): {", ".join(map(str, sorted(missing)))}')
+            updated = sum(resync_report_tags(report) for report in reports)
+        else:
+            updated = resync_tags(TopManagementTag.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} tags in {time.perf_counter() - start:.1f}s'
+        ))
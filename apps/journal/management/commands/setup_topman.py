@@ -117,9 +117,10 @@ Key challenges include resource allocation and timeline management for multiple
                         tag, tag_created = TopManagementTag.objects.get_or_create(
                             journal_entry=journal,
                             report=current_report,
-                            section='highlights',
-                            item_index=i,
+                            item_id=highlight['id'],
                             defaults={
+                                'section': 'highlights',
+                                'item_index': i,
                                 'item_text': highlight.get('text', ''),
                                 'item_status': highlight.get('status', 'completed'),
                                 'tagged_by': admin_user,
@@ -137,9 +138,10 @@ Key challenges include resource allocation and timeline management for multiple
                     tag, tag_created = TopManagementTag.objects.get_or_create(
                         journal_entry=journal,
                         report=current_report,
-                        section='challenges',
-                        item_index=i,
+                        item_id=challenge['id'],
                         defaults={
+                            'section': 'challenges',
+                            'item_index': i,
                             'item_text': challenge.get('text', ''),
                             'item_status': challenge.get('status', 'on_hold'),
                             'tagged_by': admin_user,
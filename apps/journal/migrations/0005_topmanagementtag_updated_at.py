@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0004_topmanagementreport_topmanagementtag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topmanagementtag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
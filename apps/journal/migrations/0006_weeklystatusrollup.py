@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0005_topmanagementtag_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('section', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_rollups', to='journal.department')),
+            ],
+            options={
+                'verbose_name': 'Weekly Status Rollup',
+                'verbose_name_plural': 'Weekly Status Rollups',
+                'ordering': ['week_start', 'department', 'section', 'status'],
+                'indexes': [models.Index(fields=['week_start'], name='journal_wee_week_st_dc2a2e_idx')],
+                'unique_together': {('department', 'week_start', 'section', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0006_weeklystatusrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weeklyjournal',
+            index=models.Index(fields=['department', 'date_from'], name='journal_wee_departm_9d6a62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyjournal',
+            index=models.Index(fields=['date_from'], name='journal_wee_date_fr_20ad3c_idx'),
+        ),
+    ]
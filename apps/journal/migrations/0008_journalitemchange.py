@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0007_weeklyjournal_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalItemChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('highlights', 'Highlights'), ('pendings', 'Pendings'), ('challenges', 'Challenges'), ('personal_updates', 'Personal Updates'), ('strategies', 'Strategies')], max_length=20)),
+                ('position', models.PositiveIntegerField()),
+                ('change', models.CharField(choices=[('added', 'Added'), ('removed', 'Removed'), ('status', 'Status changed'), ('text', 'Text changed'), ('both', 'Text and status changed')], max_length=10)),
+                ('old_status', models.CharField(blank=True, max_length=20)),
+                ('new_status', models.CharField(blank=True, max_length=20)),
+                ('old_text_hash', models.CharField(blank=True, max_length=16)),
+                ('new_text_hash', models.CharField(blank=True, max_length=16)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_changes', to='journal.weeklyjournal')),
+            ],
+            options={
+                'verbose_name': 'Journal Item Change',
+                'verbose_name_plural': 'Journal Item Changes',
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['journal', 'changed_at'], name='journal_jou_journal_cf65b9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:25
+
+import uuid
+
+from django.db import migrations, models
+
+
+SECTION_DEFAULT_STATUS = {
+    'highlights': 'completed',
+    'pendings': 'in_progress',
+    'challenges': 'on_hold',
+    'personal_updates': 'completed',
+    'strategies': 'not_started',
+}
+
+
+def normalize_items(value, default_status):
+    # Same as WeeklyJournal.normalize_items at the time of this migration
+    if isinstance(value, list):
+        result = []
+        for item in value:
+            if isinstance(item, dict):
+                if item.get('text', '').strip():
+                    result.append(item)
+            elif isinstance(item, str) and item.strip():
+                result.append({'text': item.strip(), 'status': default_status})
+        return result
+    if value:
+        return [{'text': value, 'status': default_status}]
+    return []
+
+
+def assign_item_ids(apps, schema_editor):
+    """Give every journal item an id and point the existing tags at the item at their index"""
+    WeeklyJournal = apps.get_model('journal', 'WeeklyJournal')
+    TopManagementTag = apps.get_model('journal', 'TopManagementTag')
+    sections = list(SECTION_DEFAULT_STATUS)
+
+    batch = []
+    for journal in WeeklyJournal.objects.only('pk', *sections).iterator(chunk_size=2000):
+        for section, default_status in SECTION_DEFAULT_STATUS.items():
+            setattr(journal, section, [
+                {**item, 'id': uuid.uuid4().hex} for item in normalize_items(getattr(journal, section), default_status)
+            ])
+        batch.append(journal)
+        if len(batch) == 1000:
+            WeeklyJournal.objects.bulk_update(batch, sections)
+            batch = []
+    WeeklyJournal.objects.bulk_update(batch, sections)
+
+    tags = []
+    for tag in TopManagementTag.objects.select_related('journal_entry').iterator(chunk_size=2000):
+        items = getattr(tag.journal_entry, tag.section, None) or []
+        if 0 <= tag.item_index < len(items):
+            tag.item_id = items[tag.item_index]['id']
+            tags.append(tag)
+    TopManagementTag.objects.bulk_update(tags, ['item_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0008_journalitemchange'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='topmanagementtag',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='topmanagementtag',
+            name='item_id',
+            field=models.UUIDField(blank=True, help_text='Stable id of the tagged item', null=True),
+        ),
+        migrations.RunPython(assign_item_ids, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='topmanagementtag',
+            unique_together={('journal_entry', 'item_id', 'report')},
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0009_topmanagementtag_item_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarriedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.UUIDField()),
+                ('origin_item_id', models.UUIDField()),
+                ('root_item_id', models.UUIDField()),
+                ('carried_at', models.DateTimeField(auto_now_add=True)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carried_items', to='journal.weeklyjournal')),
+                ('origin_journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carried_forward_items', to='journal.weeklyjournal')),
+            ],
+            options={
+                'verbose_name': 'Carried Item',
+                'verbose_name_plural': 'Carried Items',
+                'indexes': [models.Index(fields=['item_id'], name='journal_car_item_id_4cf2f7_idx'), models.Index(fields=['root_item_id'], name='journal_car_root_it_622ab6_idx')],
+                'unique_together': {('journal', 'item_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0010_carrieditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('section', models.CharField(choices=[('highlights', 'Highlights'), ('pendings', 'Pendings'), ('challenges', 'Challenges'), ('personal_updates', 'Personal Updates'), ('strategies', 'Strategies')], max_length=20)),
+                ('item_id', models.UUIDField()),
+                ('status', models.CharField(max_length=20)),
+                ('text', models.TextField()),
+                ('signature', models.BinaryField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_fingerprints', to='journal.weeklyjournal')),
+            ],
+            options={
+                'verbose_name': 'Item Fingerprint',
+                'verbose_name_plural': 'Item Fingerprints',
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='journal.itemfingerprint')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='itemfingerprint',
+            index=models.Index(fields=['week_start', 'author'], name='journal_ite_week_st_de3cac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itembucket',
+            index=models.Index(fields=['author', 'band', 'bucket', 'week_start'], name='journal_ite_author__2762bc_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0011_itemfingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topmanagementreport',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='weeklyjournal',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
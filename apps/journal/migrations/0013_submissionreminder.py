@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0012_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_reminders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Submission Reminder',
+                'verbose_name_plural': 'Submission Reminders',
+                'unique_together': {('user', 'week_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0013_submissionreminder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itembucket',
+            index=models.Index(fields=['week_start', 'author', 'band', 'bucket'], name='journal_ite_week_st_833787_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0014_itembucket_week_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalitemchange',
+            name='item_id',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
@@ -1,13 +1,8 @@
-from django.db import models
-from django.contrib.auth.models import User
-from django.urls import reverse
-import json
-
-
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
 import json
+import uuid
 
 
 class Department(models.Model):
@@ -23,7 +18,65 @@ class Department(models.Model):
         ordering = ['name']
 
 
-class WeeklyJournal(models.Model):
+class VersionConflict(Exception):
+    """Raised when saving a row that someone else saved after it was loaded"""
+
+    def __init__(self, instance, current_version):
+        super().__init__(
+            f"{instance._meta.verbose_name} {instance.pk} was saved by someone else "
+            f"(version {current_version})"
+        )
+        self.instance = instance
+        self.current_version = current_version
+
+
+class VersionedModel(models.Model):
+    """
+    Optimistic locking: every save of an existing row bumps `version`, and
+    the UPDATE only applies while the row still has the version the instance
+    was loaded with (UPDATE ... WHERE id = %s AND version = %s). A save that
+    lost the race raises VersionConflict instead of overwriting the other
+    change, without holding any lock while the user edits.
+
+    Raise-on-conflict marks an enclosing atomic block for rollback, so callers
+    that handle VersionConflict save inside their own transaction.atomic().
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'version' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'version']
+        if self._state.adding:
+            self._expected_version = None
+            return super().save(*args, **kwargs)
+        self._expected_version = self.version
+        self.version += 1
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            self.version = self._expected_version
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update):
+            return True
+        current = base_qs.filter(pk=pk_val).values_list('version', flat=True).first()
+        if current is None:
+            # The row is gone, let save() insert it like any other model
+            return False
+        raise VersionConflict(self, current)
+
+
+class WeeklyJournal(VersionedModel):
     """Model for weekly team updates/journal entries"""
     
     # Status choices for each item
@@ -74,11 +127,21 @@ class WeeklyJournal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    def get_highlights_list(self):
-        """Return highlights as a list with status, handling both old text and new JSON format"""
-        if isinstance(self.highlights, list):
+    # Status given to items stored in the old plain-text format, per section
+    SECTION_DEFAULT_STATUS = {
+        'highlights': 'completed',
+        'pendings': 'in_progress',
+        'challenges': 'on_hold',
+        'personal_updates': 'completed',
+        'strategies': 'not_started',
+    }
+    
+    @staticmethod
+    def normalize_items(value, default_status):
+        """Return a section value as a list of {"text", "status"} items, handling both old text and new JSON format"""
+        if isinstance(value, list):
             result = []
-            for item in self.highlights:
+            for item in value:
                 if isinstance(item, dict):
                     # New format with status
                     if item.get('text', '').strip():
@@ -86,88 +149,73 @@ class WeeklyJournal(models.Model):
                 elif isinstance(item, str):
                     # Old format, convert to new format
                     if item.strip():
-                        result.append({"text": item.strip(), "status": "completed"})
+                        result.append({"text": item.strip(), "status": default_status})
             return result
         # Very old single text format
-        if self.highlights:
-            return [{"text": self.highlights, "status": "completed"}]
+        if value:
+            return [{"text": value, "status": default_status}]
         return []
     
+    @staticmethod
+    def clean_item_id(value):
+        """Return an item id as 32 hex digits, or None if it isn't a valid id"""
+        try:
+            return uuid.UUID(str(value)).hex
+        except ValueError:
+            return None
+    
+    def assign_item_ids(self):
+        """
+        Give every item a stable id, kept across edits and reorderings so
+        top management tags can point at the item rather than its position.
+        Items in the old text formats are converted to {"text", "status", "id"}.
+        """
+        seen = set()
+        for section, default_status in self.SECTION_DEFAULT_STATUS.items():
+            items = []
+            for item in self.normalize_items(getattr(self, section), default_status):
+                item_id = self.clean_item_id(item.get('id') or '')
+                if item_id is None or item_id in seen:
+                    item_id = uuid.uuid4().hex
+                seen.add(item_id)
+                items.append({**item, 'id': item_id})
+            setattr(self, section, items)
+    
+    def items_by_id(self):
+        """{item id: (section, index, item)} of every item with an id"""
+        result = {}
+        for section, default_status in self.SECTION_DEFAULT_STATUS.items():
+            for index, item in enumerate(self.normalize_items(getattr(self, section), default_status)):
+                if item.get('id'):
+                    result[item['id']] = (section, index, item)
+        return result
+    
+    def save(self, *args, **kwargs):
+        self.assign_item_ids()
+        # The signal handlers run in the same transaction: pre_save locks the
+        # stored row, so concurrent saves apply their rollup deltas one at a time
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+    
+    def get_highlights_list(self):
+        """Return highlights as a list with status, handling both old text and new JSON format"""
+        return self.normalize_items(self.highlights, self.SECTION_DEFAULT_STATUS['highlights'])
+    
     def get_pendings_list(self):
         """Return pendings as a list with status, handling both old text and new JSON format"""
-        if isinstance(self.pendings, list):
-            result = []
-            for item in self.pendings:
-                if isinstance(item, dict):
-                    # New format with status
-                    if item.get('text', '').strip():
-                        result.append(item)
-                elif isinstance(item, str):
-                    # Old format, convert to new format
-                    if item.strip():
-                        result.append({"text": item.strip(), "status": "in_progress"})
-            return result
-        # Very old single text format
-        if self.pendings:
-            return [{"text": self.pendings, "status": "in_progress"}]
-        return []
+        return self.normalize_items(self.pendings, self.SECTION_DEFAULT_STATUS['pendings'])
     
     def get_challenges_list(self):
         """Return challenges as a list with status, handling both old text and new JSON format"""
-        if isinstance(self.challenges, list):
-            result = []
-            for item in self.challenges:
-                if isinstance(item, dict):
-                    # New format with status
-                    if item.get('text', '').strip():
-                        result.append(item)
-                elif isinstance(item, str):
-                    # Old format, convert to new format
-                    if item.strip():
-                        result.append({"text": item.strip(), "status": "on_hold"})
-            return result
-        # Very old single text format
-        if self.challenges:
-            return [{"text": self.challenges, "status": "on_hold"}]
-        return []
+        return self.normalize_items(self.challenges, self.SECTION_DEFAULT_STATUS['challenges'])
     
     def get_personal_updates_list(self):
         """Return personal_updates as a list with status, handling both old text and new JSON format"""
-        if isinstance(self.personal_updates, list):
-            result = []
-            for item in self.personal_updates:
-                if isinstance(item, dict):
-                    # New format with status
-                    if item.get('text', '').strip():
-                        result.append(item)
-                elif isinstance(item, str):
-                    # Old format, convert to new format
-                    if item.strip():
-                        result.append({"text": item.strip(), "status": "completed"})
-            return result
-        # Very old single text format
-        if self.personal_updates:
-            return [{"text": self.personal_updates, "status": "completed"}]
-        return []
+        return self.normalize_items(self.personal_updates, self.SECTION_DEFAULT_STATUS['personal_updates'])
     
     def get_strategies_list(self):
         """Return strategies as a list with status, handling both old text and new JSON format"""
-        if isinstance(self.strategies, list):
-            result = []
-            for item in self.strategies:
-                if isinstance(item, dict):
-                    # New format with status
-                    if item.get('text', '').strip():
-                        result.append(item)
-                elif isinstance(item, str):
-                    # Old format, convert to new format
-                    if item.strip():
-                        result.append({"text": item.strip(), "status": "not_started"})
-            return result
-        # Very old single text format
-        if self.strategies:
-            return [{"text": self.strategies, "status": "not_started"}]
-        return []
+        return self.normalize_items(self.strategies, self.SECTION_DEFAULT_STATUS['strategies'])
     
     @staticmethod
     def get_status_choices():
@@ -213,6 +261,10 @@ class WeeklyJournal(models.Model):
     class Meta:
         ordering = ['-date_from', '-created_at']
         unique_together = ('author', 'date_from', 'date_to')
+        indexes = [
+            models.Index(fields=['department', 'date_from']),
+            models.Index(fields=['date_from']),
+        ]
         verbose_name = "Weekly Journal Entry"
         verbose_name_plural = "Weekly Journal Entries"
 
@@ -231,7 +283,148 @@ class JournalComment(models.Model):
         ordering = ['-created_at']
 
 
-class TopManagementReport(models.Model):
+class WeeklyStatusRollup(models.Model):
+    """Item counts per department, ISO week, section and status, maintained incrementally (see rollups.py)"""
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='status_rollups')
+    # Monday of the ISO week the journal entries start in
+    week_start = models.DateField()
+    section = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    @property
+    def iso_week(self):
+        """(ISO year, ISO week number) of the row"""
+        year, week, _ = self.week_start.isocalendar()
+        return year, week
+
+    def __str__(self):
+        return f"{self.department_id} {self.week_start} {self.section}/{self.status}: {self.count}"
+
+    class Meta:
+        ordering = ['week_start', 'department', 'section', 'status']
+        unique_together = ('department', 'week_start', 'section', 'status')
+        indexes = [models.Index(fields=['week_start'])]
+        verbose_name = "Weekly Status Rollup"
+        verbose_name_plural = "Weekly Status Rollups"
+
+
+class SubmissionReminder(models.Model):
+    """A missing submission reminder sent to a user, at most one per week (see compliance.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submission_reminders')
+    # Monday of the week the reminder was about
+    week_start = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} {self.week_start}"
+
+    class Meta:
+        unique_together = ('user', 'week_start')
+        verbose_name = "Submission Reminder"
+        verbose_name_plural = "Submission Reminders"
+
+
+class JournalItemChange(models.Model):
+    """One changed item of a journal save, only the difference is stored (see history.py)"""
+
+    CHANGE_CHOICES = [
+        ('added', 'Added'),
+        ('removed', 'Removed'),
+        ('status', 'Status changed'),
+        ('text', 'Text changed'),
+        ('both', 'Text and status changed'),
+    ]
+    SECTION_CHOICES = [
+        ('highlights', 'Highlights'),
+        ('pendings', 'Pendings'),
+        ('challenges', 'Challenges'),
+        ('personal_updates', 'Personal Updates'),
+        ('strategies', 'Strategies'),
+    ]
+
+    journal = models.ForeignKey(WeeklyJournal, on_delete=models.CASCADE, related_name='item_changes')
+    section = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    position = models.PositiveIntegerField()
+    # Empty for the changes of stored items from before items had ids
+    item_id = models.UUIDField(null=True, blank=True)
+    change = models.CharField(max_length=10, choices=CHANGE_CHOICES)
+    old_status = models.CharField(max_length=20, blank=True)
+    new_status = models.CharField(max_length=20, blank=True)
+    # Short hashes of the item text: enough to tell edits apart without copying the text
+    old_text_hash = models.CharField(max_length=16, blank=True)
+    new_text_hash = models.CharField(max_length=16, blank=True)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.section}[{self.position}] {self.change}: {self.old_status or '-'} -> {self.new_status or '-'}"
+
+    class Meta:
+        ordering = ['changed_at', 'id']
+        indexes = [models.Index(fields=['journal', 'changed_at'])]
+        verbose_name = "Journal Item Change"
+        verbose_name_plural = "Journal Item Changes"
+
+
+class CarriedItem(models.Model):
+    """A journal item carried forward from an item of an earlier journal (see carry.py)"""
+    journal = models.ForeignKey(WeeklyJournal, on_delete=models.CASCADE, related_name='carried_items')
+    item_id = models.UUIDField()
+    origin_journal = models.ForeignKey(WeeklyJournal, on_delete=models.CASCADE, related_name='carried_forward_items')
+    origin_item_id = models.UUIDField()
+    # First item of the chain, shared by every link in an item's lineage
+    root_item_id = models.UUIDField()
+    carried_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.origin_item_id} -> {self.item_id}"
+
+    class Meta:
+        unique_together = ('journal', 'item_id')
+        indexes = [models.Index(fields=['item_id']), models.Index(fields=['root_item_id'])]
+        verbose_name = "Carried Item"
+        verbose_name_plural = "Carried Items"
+
+
+class ItemFingerprint(models.Model):
+    """MinHash signature of an open journal item, for finding it again in other weeks (see fingerprints.py)"""
+    journal = models.ForeignKey(WeeklyJournal, on_delete=models.CASCADE, related_name='item_fingerprints')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    week_start = models.DateField()
+    section = models.CharField(max_length=20, choices=JournalItemChange.SECTION_CHOICES)
+    item_id = models.UUIDField()
+    status = models.CharField(max_length=20)
+    text = models.TextField()
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.week_start} {self.section}: {self.text[:50]}"
+
+    class Meta:
+        indexes = [models.Index(fields=['week_start', 'author'])]
+        verbose_name = "Item Fingerprint"
+        verbose_name_plural = "Item Fingerprints"
+
+
+class ItemBucket(models.Model):
+    """One LSH band of an item fingerprint: items of an author sharing a bucket are near-duplicate candidates"""
+    fingerprint = models.ForeignKey(ItemFingerprint, on_delete=models.CASCADE, related_name='buckets')
+    # Copied from the fingerprint, so candidate lookups only read the indexes below
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    week_start = models.DateField()
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'band', 'bucket', 'week_start']),
+            # long_running_items() starts from all the buckets of one week
+            models.Index(fields=['week_start', 'author', 'band', 'bucket']),
+        ]
+
+
+class TopManagementReport(VersionedModel):
     """Model for Top Management weekly reports - Admin only"""
     
     title = models.CharField(max_length=200, default="Top Management Weekly Report")
@@ -333,6 +526,9 @@ class TopManagementTag(models.Model):
     ]
     
     section = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    # The tagged item's id in the journal JSON (see WeeklyJournal.assign_item_ids);
+    # section, index, text and status are cached from it by tagging.resync_tags
+    item_id = models.UUIDField(null=True, blank=True, help_text="Stable id of the tagged item")
     item_index = models.IntegerField(help_text="Index of the item within the section")
     item_text = models.TextField(help_text="Cached text of the tagged item")
     item_status = models.CharField(max_length=20, help_text="Cached status of the tagged item")
@@ -357,6 +553,7 @@ class TopManagementTag(models.Model):
     
     # Metadata
     tagged_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Tagged: {self.item_text[:50]}... - {self.journal_entry.author.username}"
@@ -389,6 +586,6 @@ class TopManagementTag(models.Model):
     
     class Meta:
         ordering = ['-priority', '-tagged_at']
-        unique_together = ('journal_entry', 'section', 'item_index', 'report')
+        unique_together = ('journal_entry', 'item_id', 'report')
         verbose_name = "Top Management Tag"
         verbose_name_plural = "Top Management Tags"
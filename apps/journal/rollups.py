@@ -0,0 +1,192 @@
+"""
+Weekly item status rollups for long-range trends.
+
+WeeklyStatusRollup keeps one row per (department, ISO week, section, status)
+with the number of journal items in it. Saving or deleting a journal applies
+the difference to the few rows it touches (see signals.py), so trend charts
+over years read a few hundred rows instead of every journal's JSON.
+Bulk inserts don't send signals; rebuild_rollups() recomputes a date range
+and the rebuild_rollups command the whole table. Both start a new rollup
+version, which the cached analytics are keyed on.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest, TruncMonth, TruncQuarter, TruncYear
+
+from .models import WeeklyJournal, WeeklyStatusRollup
+
+
+SECTIONS = tuple(WeeklyJournal.SECTION_DEFAULT_STATUS)
+
+# Fields whose changes move items between rollup rows
+ROLLUP_FIELDS = ('department_id', 'date_from') + SECTIONS
+
+PERIODS = {
+    'week': None,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+
+ROLLUP_VERSION_KEY = 'journal:rollups:version'
+
+_suspended = ContextVar('rollups_suspended', default=False)
+
+
+def week_start(day):
+    """Monday of the ISO week containing day"""
+    return day - timedelta(days=day.weekday())
+
+
+def count_items(department_id, date_from, sections):
+    """Rollup counts of one journal, given its department, start date and section values"""
+    counts = Counter()
+    monday = week_start(date_from)
+    for section, value in zip(SECTIONS, sections):
+        default_status = WeeklyJournal.SECTION_DEFAULT_STATUS[section]
+        for item in WeeklyJournal.normalize_items(value, default_status):
+            status = str(item.get('status') or default_status)[:20]
+            counts[(department_id, monday, section, status)] += 1
+    return counts
+
+
+def journal_counts(journal):
+    # date_from may still be the string it was assigned as
+    date_from = WeeklyJournal._meta.get_field('date_from').to_python(journal.date_from)
+    return count_items(journal.department_id, date_from, [getattr(journal, section) for section in SECTIONS])
+
+
+def stored_journal_values(pk, lock=False):
+    """
+    The rollup fields and date_to of a journal as currently stored, {} when it
+    isn't stored. With lock, the row stays locked until the transaction ends.
+    """
+    journals = WeeklyJournal.objects.filter(pk=pk)
+    if lock:
+        journals = journals.select_for_update()
+    return journals.values(*ROLLUP_FIELDS, 'date_to').first() or {}
+
+
+def stored_counts(values):
+    """Rollup counts of the values returned by stored_journal_values()"""
+    if not values:
+        return Counter()
+    return count_items(values['department_id'], values['date_from'], [values[section] for section in SECTIONS])
+
+
+def rollups_enabled():
+    return not _suspended.get()
+
+
+@contextmanager
+def rollups_suspended():
+    """Skip incremental updates in the block, for bulk jobs that rebuild the rollups afterwards"""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def apply_counts(delta):
+    """Add a {(department_id, week_start, section, status): difference} mapping to the rollup rows"""
+    delta = {key: value for key, value in delta.items() if value}
+    if not delta:
+        return
+    with transaction.atomic():
+        for (department_id, monday, section, status), value in delta.items():
+            lookup = dict(department_id=department_id, week_start=monday, section=section, status=status)
+            if value > 0:
+                WeeklyStatusRollup.objects.get_or_create(**lookup)
+            # Clamped, so rollups that drifted (bulk jobs, races) never fail the journal save
+            WeeklyStatusRollup.objects.filter(**lookup).update(count=Greatest(F('count') + value, 0))
+        if any(value < 0 for value in delta.values()):
+            WeeklyStatusRollup.objects.filter(
+                department_id__in={key[0] for key in delta},
+                week_start__in={key[1] for key in delta},
+                count__lte=0,
+            ).delete()
+
+
+def get_rollup_version():
+    """Return the current rollup version, bumped by bulk changes to the rollups"""
+    version = cache.get(ROLLUP_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(ROLLUP_VERSION_KEY, version, None)
+    return version
+
+
+def bump_rollup_version():
+    """Start a new rollup version, so results computed from the old rollups are computed again"""
+    try:
+        cache.incr(ROLLUP_VERSION_KEY)
+    except ValueError:
+        cache.set(ROLLUP_VERSION_KEY, 2, None)
+
+
+def rebuild_rollups(since=None, until=None, batch_size=2000):
+    """
+    Recompute the rollups of the weeks between since and until (all weeks by
+    default) from the journals. Returns the number of rollup rows written.
+    """
+    journals = WeeklyJournal.objects.order_by()
+    rollups = WeeklyStatusRollup.objects.all()
+    if since is not None:
+        journals = journals.filter(date_from__gte=week_start(since))
+        rollups = rollups.filter(week_start__gte=week_start(since))
+    if until is not None:
+        journals = journals.filter(date_from__lt=week_start(until) + timedelta(weeks=1))
+        rollups = rollups.filter(week_start__lte=week_start(until))
+
+    counts = Counter()
+    for row in journals.values_list(*ROLLUP_FIELDS).iterator(chunk_size=batch_size):
+        counts.update(count_items(row[0], row[1], row[2:]))
+
+    with transaction.atomic():
+        rollups.delete()
+        WeeklyStatusRollup.objects.bulk_create(
+            [
+                WeeklyStatusRollup(
+                    department_id=department_id, week_start=monday, section=section, status=status, count=count
+                )
+                for (department_id, monday, section, status), count in counts.items()
+            ],
+            batch_size=batch_size,
+        )
+    bump_rollup_version()
+    return len(counts)
+
+
+def status_trends(period='month', since=None, until=None, departments=None, sections=None):
+    """
+    Item counts per period and status from the rollups, e.g.
+    ``[{'period': date(2024, 1, 1), 'status': 'completed', 'count': 120}, ...]``.
+
+    period is one of week, month, quarter or year. Rows are grouped per
+    department too when departments is given.
+    """
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period "{period}"')
+    rollups = WeeklyStatusRollup.objects.order_by()
+    if since is not None:
+        rollups = rollups.filter(week_start__gte=week_start(since))
+    if until is not None:
+        rollups = rollups.filter(week_start__lte=until)
+    if sections:
+        rollups = rollups.filter(section__in=sections)
+
+    group_by = ['period', 'status']
+    if departments:
+        rollups = rollups.filter(department__in=departments)
+        group_by.insert(1, 'department_id')
+
+    truncate = PERIODS[period]
+    rollups = rollups.annotate(period=truncate('week_start') if truncate else F('week_start'))
+    return list(rollups.values(*group_by).annotate(count=Sum('count')).order_by(*group_by))
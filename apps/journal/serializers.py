@@ -0,0 +1,137 @@
+"""
+Lightweight serializers for the read-only JSON API.
+
+They read ``.values()`` rows instead of model instances and only select the
+columns needed for the requested fields.
+"""
+from .models import Department, WeeklyJournal, TopManagementReport, TopManagementTag
+
+
+class InvalidFields(ValueError):
+    """Raised when a client requests fields a serializer doesn't provide"""
+
+
+class ValuesSerializer:
+    """
+    Serialize ``.values()`` rows of a queryset.
+
+    ``fields`` maps each output field to the ORM lookup it is read from, and
+    ``transforms`` optionally maps output fields to a function applied to the
+    raw value. ``default_fields`` is used when no sparse fieldset is requested.
+    """
+    model = None
+    fields = {}
+    transforms = {}
+    default_fields = None
+
+    def __init__(self, requested_fields=None):
+        if requested_fields:
+            unknown = [name for name in requested_fields if name not in self.fields]
+            if unknown:
+                raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+            self.field_names = list(dict.fromkeys(requested_fields))
+        else:
+            self.field_names = list(self.default_fields or self.fields)
+
+    def get_lookups(self):
+        """Return the ORM lookups to pass to .values(), always including the pk for pagination"""
+        lookups = ['id']
+        for name in self.field_names:
+            lookup = self.fields[name]
+            if lookup not in lookups:
+                lookups.append(lookup)
+        return lookups
+
+    def rows(self, queryset):
+        return queryset.values(*self.get_lookups())
+
+    def serialize_row(self, row):
+        data = {}
+        for name in self.field_names:
+            value = row[self.fields[name]]
+            transform = self.transforms.get(name)
+            data[name] = transform(value) if transform else value
+        return data
+
+    def serialize(self, rows):
+        return [self.serialize_row(row) for row in rows]
+
+
+def _section_items(section):
+    default_status = WeeklyJournal.SECTION_DEFAULT_STATUS[section]
+    return lambda value: WeeklyJournal.normalize_items(value, default_status)
+
+
+class DepartmentSerializer(ValuesSerializer):
+    model = Department
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'created_at': 'created_at',
+    }
+
+
+class WeeklyJournalSerializer(ValuesSerializer):
+    model = WeeklyJournal
+    fields = {
+        'id': 'id',
+        'author_id': 'author_id',
+        'author_username': 'author__username',
+        'author_first_name': 'author__first_name',
+        'author_last_name': 'author__last_name',
+        'department_id': 'department_id',
+        'department_name': 'department__name',
+        'date_from': 'date_from',
+        'date_to': 'date_to',
+        'highlights': 'highlights',
+        'pendings': 'pendings',
+        'challenges': 'challenges',
+        'personal_updates': 'personal_updates',
+        'strategies': 'strategies',
+        'version': 'version',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    transforms = {section: _section_items(section) for section in WeeklyJournal.SECTION_DEFAULT_STATUS}
+
+
+class TopManagementReportSerializer(ValuesSerializer):
+    model = TopManagementReport
+    fields = {
+        'id': 'id',
+        'title': 'title',
+        'week_start': 'week_start',
+        'week_end': 'week_end',
+        'created_by_id': 'created_by_id',
+        'created_by_username': 'created_by__username',
+        'executive_summary': 'executive_summary',
+        'admin_highlights': 'admin_highlights',
+        'admin_challenges': 'admin_challenges',
+        'admin_strategies': 'admin_strategies',
+        'version': 'version',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+
+
+class TopManagementTagSerializer(ValuesSerializer):
+    model = TopManagementTag
+    fields = {
+        'id': 'id',
+        'report_id': 'report_id',
+        'journal_id': 'journal_entry_id',
+        'author_id': 'journal_entry__author_id',
+        'author_username': 'journal_entry__author__username',
+        'department_name': 'journal_entry__department__name',
+        'section': 'section',
+        'item_id': 'item_id',
+        'item_index': 'item_index',
+        'item_text': 'item_text',
+        'item_status': 'item_status',
+        'priority': 'priority',
+        'admin_note': 'admin_note',
+        'tagged_by_id': 'tagged_by_id',
+        'tagged_at': 'tagged_at',
+        'updated_at': 'updated_at',
+    }
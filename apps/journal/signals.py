@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import WeeklyJournal, Department, TopManagementTag
+from .cache import (
+    invalidate_all_dashboards, invalidate_all_fragments, invalidate_global_dashboard, invalidate_user_dashboard,
+)
+from .rollups import SECTIONS, apply_counts, journal_counts, rollups_enabled, stored_counts, stored_journal_values
+from .compliance import invalidate_journal_weeks
+from .history import record_changes
+from .tagging import resync_tags
+from .carry import drop_rejected_origins, sync_carried_items
+from .fingerprints import index_journal
+from .live import journal_values, publish_journal_counts, publish_tag_change
+
+
+# Saving only other fields leaves the rollups and the item history alone
+TRACKED_UPDATE_FIELDS = {'department', 'date_from', *SECTIONS}
+
+_suspended = ContextVar('journal_signals_suspended', default=False)
+
+
+@contextmanager
+def signals_suspended():
+    """
+    Skip every receiver below in the block, for bulk jobs that rebuild the
+    rollups and fingerprints and drop the caches once afterwards
+    """
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def unless_suspended(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _suspended.get():
+            handler(*args, **kwargs)
+    return wrapper
+
+
+@receiver(post_save, sender=WeeklyJournal)
+@receiver(post_delete, sender=WeeklyJournal)
+@unless_suspended
+def journal_changed(sender, instance, **kwargs):
+    """Drop the dashboard snapshots that include this journal entry"""
+    invalidate_global_dashboard()
+    invalidate_user_dashboard(instance.author_id)
+
+
+@receiver(post_save, sender=WeeklyJournal)
+@receiver(post_delete, sender=WeeklyJournal)
+@unless_suspended
+def journal_submitted(sender, instance, **kwargs):
+    """Drop the cached missing submissions of the weeks this journal counts for"""
+    invalidate_journal_weeks(instance)
+
+
+@receiver(pre_save, sender=WeeklyJournal)
+@unless_suspended
+def remember_stored_journal(sender, instance, update_fields=None, **kwargs):
+    """
+    Drop the item origins that can't be linked, and keep the stored items, so
+    post_save only records and counts the difference
+    """
+    instance._stored_values = None
+    if update_fields is not None and not TRACKED_UPDATE_FIELDS & set(update_fields):
+        return
+    drop_rejected_origins(instance)
+    instance._stored_values = stored_journal_values(instance.pk, lock=True) if instance.pk else {}
+
+
+@receiver(post_save, sender=WeeklyJournal)
+@unless_suspended
+def journal_items_saved(sender, instance, **kwargs):
+    """
+    Update the rollups, item change log, carried item links, item fingerprints
+    and tags of the journal, and push the counter changes to open pages
+    """
+    stored = getattr(instance, '_stored_values', None)
+    if stored is None:
+        return
+    instance._stored_values = None
+    if rollups_enabled():
+        delta = journal_counts(instance)
+        delta.subtract(stored_counts(stored))
+        apply_counts(delta)
+    # Views and the admin set _changed_by to the user making the change
+    record_changes(instance, stored, getattr(instance, '_changed_by', None))
+    sync_carried_items(instance, stored)
+    index_journal(instance, stored)
+    # Keep the text and status cached on the journal's top management tags current
+    resync_tags(instance.topman_tags.all(), journal=instance)
+    publish_journal_counts(instance.author_id, stored, journal_values(instance))
+
+
+@receiver(post_delete, sender=WeeklyJournal)
+@unless_suspended
+def update_rollups_on_delete(sender, instance, **kwargs):
+    if rollups_enabled():
+        apply_counts({key: -count for key, count in journal_counts(instance).items()})
+
+
+@receiver(post_delete, sender=WeeklyJournal)
+@unless_suspended
+def journal_deleted(sender, instance, **kwargs):
+    publish_journal_counts(instance.author_id, journal_values(instance), {})
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@unless_suspended
+def department_changed(sender, instance, **kwargs):
+    """Department names appear in every snapshot and journal fragment, so rebuild all of them"""
+    invalidate_all_dashboards()
+    invalidate_all_fragments()
+
+
+@receiver(post_save, sender=User)
+@unless_suspended
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """Author names appear in the global snapshot and journal fragments; logins only touch last_login"""
+    if update_fields is None or not set(update_fields) <= {'last_login'}:
+        invalidate_global_dashboard()
+        invalidate_all_fragments()
+
+
+@receiver(post_save, sender=TopManagementTag)
+@unless_suspended
+def tag_saved(sender, instance, created, **kwargs):
+    """Push new tags and priority changes to the open tagging pages of the report"""
+    publish_tag_change(instance, 'tag' if created else 'priority')
+
+
+@receiver(post_delete, sender=TopManagementTag)
+@unless_suspended
+def tag_deleted(sender, instance, **kwargs):
+    publish_tag_change(instance, 'untag')
@@ -0,0 +1,56 @@
+"""
+Top management tags point at journal items by their stable id (see
+WeeklyJournal.assign_item_ids), and cache the item's section, position,
+text and status for the report pages.
+
+resync_tags() refreshes that cache in bulk: one query reads the tags with
+their journals, one bulk_update writes the tags that changed.
+"""
+from django.utils import timezone
+
+from .models import TopManagementTag, WeeklyJournal
+
+
+SYNCED_FIELDS = ('section', 'item_index', 'item_text', 'item_status', 'updated_at')
+
+
+def item_state(section, index, item):
+    """The cached (section, item_index, item_text, item_status) of a tag on the item"""
+    return section, index, item.get('text', ''), item.get('status') or WeeklyJournal.SECTION_DEFAULT_STATUS[section]
+
+
+def resync_tags(tags, journal=None):
+    """
+    Refresh the cached item fields of a queryset of tags and return the
+    number of tags updated. Pass journal when all the tags belong to it,
+    to use the loaded instance instead of joining the journals.
+
+    Tags whose item was removed keep the text they were tagged with.
+    """
+    tags = tags.exclude(item_id=None)
+    if journal is None:
+        tags = tags.select_related('journal_entry')
+    items = {}
+    changed = []
+    now = timezone.now()
+    for tag in tags:
+        entry = journal or tag.journal_entry
+        if entry.pk not in items:
+            items[entry.pk] = entry.items_by_id()
+        found = items[entry.pk].get(tag.item_id.hex)
+        if found is None:
+            continue
+        state = item_state(*found)
+        if state != (tag.section, tag.item_index, tag.item_text, tag.item_status):
+            tag.section, tag.item_index, tag.item_text, tag.item_status = state
+            # bulk_update skips auto_now, and the report page ETags depend on it
+            tag.updated_at = now
+            changed.append(tag)
+    if changed:
+        TopManagementTag.objects.bulk_update(changed, SYNCED_FIELDS, batch_size=500)
+    return len(changed)
+
+
+def resync_report_tags(report):
+    """Refresh the cached item fields of every tag in a report"""
+    return resync_tags(TopManagementTag.objects.filter(report=report))
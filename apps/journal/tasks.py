@@ -0,0 +1,37 @@
+from datetime import date
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+
+from .analytics import analytics_cache_key, analytics_range, compute_department_analytics
+
+
+@shared_task
+def precompute_department_analytics(since=None, until=None):
+    """
+    Compute the department analytics of one range of weeks, or of every
+    range in ANALYTICS_PRECOMPUTE_WEEKS when called without arguments
+    (the periodic run in CELERY_BEAT_SCHEDULE).
+    """
+    if since and until:
+        ranges = [(date.fromisoformat(since), date.fromisoformat(until))]
+    else:
+        ranges = [analytics_range(weeks) for weeks in settings.ANALYTICS_PRECOMPUTE_WEEKS]
+    for first, last in ranges:
+        compute_department_analytics(first, last)
+        cache.delete(f'{analytics_cache_key(first, last)}:pending')
+    return len(ranges)
+
+
+@shared_task
+def precompute_missing_submissions():
+    """Refresh the cached missing submissions of the current week (periodic run)"""
+    call_command('check_submissions', verbosity=0)
+
+
+@shared_task
+def send_submission_reminders():
+    """Remind the users missing the current week's journal (periodic run)"""
+    call_command('check_submissions', '--send-reminders', verbosity=0)
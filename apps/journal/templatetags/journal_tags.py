@@ -1,5 +1,7 @@
 from django import template
+from django.core.cache import cache
 from apps.journal.models import WeeklyJournal
+from apps.journal.cache import get_fragment_generation, get_fragment_timeout, journal_fragment_key
 
 register = template.Library()
 
@@ -101,3 +103,61 @@ def regroup_by(items, attribute):
             groups[key] = []
         groups[key].append(item)
     return groups
+
+
+class JournalFragmentNode(template.Node):
+    """Render a block once per journal version and serve it from the cache afterwards"""
+
+    def __init__(self, nodelist, fragment_name, journal, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.journal = journal
+        self.vary_on = vary_on
+
+    def render(self, context):
+        journal = self.journal.resolve(context)
+        fragment_name = self.fragment_name.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+
+        # Read once per page rather than once per journal
+        if 'journal_fragment_generation' not in context.render_context:
+            context.render_context['journal_fragment_generation'] = get_fragment_generation()
+        generation = context.render_context['journal_fragment_generation']
+
+        key = journal_fragment_key(fragment_name, journal, vary_on, generation)
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, get_fragment_timeout())
+        return value
+
+
+@register.tag
+def journal_fragment(parser, token):
+    """
+    Cache the markup of a single journal entry, keyed on its pk and updated_at.
+    Renaming a department or user starts a new generation of every fragment.
+
+    Usage::
+
+        {% journal_fragment "summary_report" entry [vary_on ...] %}
+            .. markup that only depends on the entry ..
+        {% endjournal_fragment %}
+
+    The fragment name selects the template version from JOURNAL_FRAGMENT_VERSIONS.
+    Anything user- or request-specific must stay outside of the block or be
+    passed as an extra vary_on argument.
+    """
+    nodelist = parser.parse(('endjournal_fragment',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            "'%s' tag requires at least a fragment name and a journal entry." % bits[0]
+        )
+    return JournalFragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
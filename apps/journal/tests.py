@@ -1,7 +1,42 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
 from django.contrib.auth.models import User
 from django.urls import reverse
-from .models import Department, WeeklyJournal
+from django.core.cache import cache
+from django.core import mail
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from unittest.mock import patch
+from datetime import date, timedelta
+from .models import (
+    Department, WeeklyJournal, JournalComment, TopManagementReport, TopManagementTag, WeeklyStatusRollup,
+    JournalItemChange, ItemBucket, ItemFingerprint, SubmissionReminder, VersionConflict,
+)
+from .cache import JOURNAL_FRAGMENT_VERSIONS, get_dashboard_snapshot
+from .rollups import rebuild_rollups, status_trends, week_start
+from .analytics import analytics_range, submission_rates
+from .tasks import precompute_department_analytics
+from .compliance import missing_submissions
+from .history import status_timeline
+from .tagging import resync_report_tags
+from .carry import item_lineage, previous_journal
+from .fingerprints import BANDS, long_running_items, minhash, similarity
+from .live import DASHBOARD_CHANNEL, report_channel, summary_counts, user_channel, week_channel, weekly_summary_counts
+from . import compliance
+from .checks import check_analytics_background
+from apps.web.events import get_broker
+
+
+def without_ids(items):
+    """Journal items without their generated ids, which must be present"""
+    assert all(item.get('id') for item in items), items
+    return [{key: value for key, value in item.items() if key != 'id'} for item in items]
 
 
 class JournalModelTest(TestCase):
@@ -53,3 +88,1211 @@ class JournalViewTest(TestCase):
         self.client.login(username='testuser', password='testpass123')
         response = self.client.get(reverse('journal:list'))
         self.assertEqual(response.status_code, 200)
+
+
+class DashboardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.department = Department.objects.create(
+            name='Test Department'
+        )
+        WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{"text": "Shipped release", "status": "completed"}]
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_warm_dashboard_query_count(self):
+        self.client.get(reverse('journal:dashboard'))
+        # Only the session and user lookups remain once the snapshot is cached
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('journal:dashboard'))
+        self.assertEqual(response.context['total_journals'], 1)
+        self.assertEqual(response.context['status_summary']['completed'], 1)
+
+    def test_journal_save_invalidates_snapshot(self):
+        self.client.get(reverse('journal:dashboard'))
+        WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-08',
+            date_to='2024-01-14',
+            highlights=[{"text": "Fixed bug", "status": "in_progress"}]
+        )
+        response = self.client.get(reverse('journal:dashboard'))
+        self.assertEqual(response.context['total_journals'], 2)
+        self.assertEqual(response.context['user_journal_count'], 2)
+        self.assertEqual(response.context['user_status_summary']['in_progress'], 1)
+
+    def test_department_change_invalidates_snapshot(self):
+        self.client.get(reverse('journal:dashboard'))
+        Department.objects.create(name='Another Department')
+        response = self.client.get(reverse('journal:dashboard'))
+        self.assertEqual(len(response.context['departments']), 2)
+
+    def test_author_rename_invalidates_snapshot(self):
+        self.client.get(reverse('journal:dashboard'))
+        self.user.first_name, self.user.last_name = 'Ada', 'Lovelace'
+        self.user.save()
+        response = self.client.get(reverse('journal:dashboard'))
+        self.assertEqual(response.context['recent_journals'][0]['author_name'], 'Ada Lovelace')
+        self.assertContains(response, 'Ada Lovelace - Test Department')
+
+
+class JournalFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.department = Department.objects.create(
+            name='Test Department'
+        )
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{"text": "Original highlight", "status": "completed"}]
+        )
+        self.template = Template(
+            '{% load journal_tags %}'
+            '{% journal_fragment "summary_report" journal %}'
+            '{% for item in journal.get_highlights_list %}{{ item.text }}{% endfor %}'
+            '{% endjournal_fragment %}'
+        )
+
+    def render(self, journal):
+        return self.template.render(Context({'journal': journal}))
+
+    def test_fragment_served_from_cache(self):
+        self.assertEqual(self.render(self.journal), 'Original highlight')
+        # Bypass save() so updated_at stays the same
+        WeeklyJournal.objects.filter(pk=self.journal.pk).update(
+            highlights=[{"text": "Changed highlight", "status": "completed"}]
+        )
+        journal = WeeklyJournal.objects.get(pk=self.journal.pk)
+        self.assertEqual(self.render(journal), 'Original highlight')
+
+    def test_save_renders_new_fragment(self):
+        self.render(self.journal)
+        self.journal.highlights = [{"text": "Changed highlight", "status": "completed"}]
+        self.journal.save()
+        self.assertEqual(self.render(self.journal), 'Changed highlight')
+
+    def test_template_version_bump_renders_new_fragment(self):
+        self.render(self.journal)
+        WeeklyJournal.objects.filter(pk=self.journal.pk).update(
+            highlights=[{"text": "Changed highlight", "status": "completed"}]
+        )
+        journal = WeeklyJournal.objects.get(pk=self.journal.pk)
+        with patch.dict(JOURNAL_FRAGMENT_VERSIONS, {'summary_report': 2}):
+            self.assertEqual(self.render(journal), 'Changed highlight')
+
+    def test_renames_render_new_fragments(self):
+        template = Template(
+            '{% load journal_tags %}'
+            '{% journal_fragment "journal_list" journal %}'
+            '{{ journal.department.name }} {{ journal.author.username }}'
+            '{% endjournal_fragment %}'
+        )
+        self.assertEqual(template.render(Context({'journal': self.journal})), 'Test Department testuser')
+        self.department.name = 'Renamed Department'
+        self.department.save()
+        self.user.username = 'renamed'
+        self.user.save()
+        journal = WeeklyJournal.objects.get(pk=self.journal.pk)
+        self.assertEqual(template.render(Context({'journal': journal})), 'Renamed Department renamed')
+
+    def test_pages_render_with_fragments(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.login(username='testuser', password='testpass123')
+        for url in [
+            reverse('journal:list'),
+            reverse('journal:summary_report') + '?date_from=2024-01-01&date_to=2024-01-31',
+            reverse('journal:topman_tagging') + '?week_start=2024-01-01&week_end=2024-01-07',
+        ]:
+            for _ in range(2):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Original highlight')
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.department = Department.objects.create(
+            name='Test Department'
+        )
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{"text": "Shipped release", "status": "completed"}]
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def assertNotModified(self, url):
+        # The first response sets the CSRF cookie, which is part of the ETag
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_journal_detail(self):
+        url = reverse('journal:detail', kwargs={'pk': self.journal.pk})
+        etag = self.assertNotModified(url)
+        JournalComment.objects.create(journal=self.journal, author=self.user, content='Nice work')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Nice work')
+
+    def test_report_detail(self):
+        report = TopManagementReport.objects.create(
+            week_start='2024-01-01',
+            week_end='2024-01-07',
+            created_by=self.user
+        )
+        url = reverse('journal:topman_report_detail', kwargs={'pk': report.pk})
+        etag = self.assertNotModified(url)
+        tag = TopManagementTag.objects.create(
+            journal_entry=self.journal,
+            report=report,
+            section='highlights',
+            item_index=0,
+            item_text='Shipped release',
+            item_status='completed',
+            tagged_by=self.user
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        tag.priority = 'high'
+        tag.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_summary_export(self):
+        url = reverse('journal:export_summary') + '?format=html&date_from=2024-01-01&date_to=2024-01-31'
+        etag = self.assertNotModified(url)
+        self.journal.highlights = [{"text": "Shipped hotfix", "status": "completed"}]
+        self.journal.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        other_format = self.client.get(url.replace('format=html', 'format=csv'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other_format.status_code, 200)
+
+
+class JournalApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.department = Department.objects.create(
+            name='Test Department'
+        )
+        for week in range(3):
+            WeeklyJournal.objects.create(
+                author=self.user,
+                department=self.department,
+                date_from=date(2024, 1, 1) + timedelta(days=7 * week),
+                date_to=date(2024, 1, 7) + timedelta(days=7 * week),
+                highlights=['Old text highlight']
+            )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_cursor_pagination(self):
+        url = reverse('journal:api_journal_list') + '?page_size=2'
+        with self.assertNumQueries(3):  # session, user, page
+            data = self.client.get(url).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next_cursor'])
+        next_page = self.client.get(data['next']).json()
+        self.assertEqual(len(next_page['results']), 1)
+        self.assertIsNone(next_page['next'])
+        ids = [row['id'] for row in data['results'] + next_page['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_sparse_fieldset_and_item_normalization(self):
+        url = reverse('journal:api_journal_list') + '?fields=department_name,highlights'
+        row = self.client.get(url).json()['results'][0]
+        self.assertEqual(set(row), {'department_name', 'highlights'})
+        self.assertEqual(without_ids(row['highlights']), [{'text': 'Old text highlight', 'status': 'completed'}])
+
+    def test_errors(self):
+        response = self.client.get(reverse('journal:api_journal_list') + '?fields=password')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('journal:api_journal_list') + '?cursor=%%%')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('journal:api_report_list'))
+        self.assertEqual(response.status_code, 403)
+        self.client.logout()
+        response = self.client.get(reverse('journal:api_department_list'))
+        self.assertEqual(response.status_code, 401)
+
+
+class ImportJournalsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.department = Department.objects.create(name='Test Department')
+        WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from=date(2024, 1, 1),
+            date_to=date(2024, 1, 7),
+            highlights=[{'text': 'Existing', 'status': 'completed'}]
+        )
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', newline='') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_file(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_journals', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        path = self.write_file('.csv', (
+            'author,department,date_from,date_to,highlights,pendings\n'
+            'testuser,Test Department,2024-01-01,2024-01-07,Duplicate,\n'
+            'testuser,Test Department,2024-01-08,2024-01-14,"First\nSecond",'
+            '"[{""text"": ""Waiting"", ""status"": ""on_hold""}]"\n'
+            'ghost,Test Department,2024-01-08,2024-01-14,Unknown author,\n'
+            'testuser,New Department,2024-01-15,2024-01-21,Needs a department,\n'
+        ))
+        out, err = self.import_file(path, '--batch-size', '2')
+
+        self.assertIn('1 inserted, 1 duplicates, 2 rejected', out)
+        self.assertIn('unknown author "ghost"', err)
+        journal = WeeklyJournal.objects.get(date_from=date(2024, 1, 8))
+        self.assertEqual(without_ids(journal.highlights), [
+            {'text': 'First', 'status': 'completed'},
+            {'text': 'Second', 'status': 'completed'},
+        ])
+        self.assertEqual(without_ids(journal.pendings), [{'text': 'Waiting', 'status': 'on_hold'}])
+
+        # Only the inserted journal is counted and fingerprinted, the duplicate row changes nothing
+        self.assertIn('Updated the rollups and fingerprints of the inserted journals', out)
+        self.assertEqual(
+            set(WeeklyStatusRollup.objects.values_list('week_start', 'section', 'status', 'count')),
+            {
+                (date(2024, 1, 1), 'highlights', 'completed', 1),
+                (date(2024, 1, 8), 'highlights', 'completed', 2),
+                (date(2024, 1, 8), 'pendings', 'on_hold', 1),
+            },
+        )
+        self.assertEqual(list(ItemFingerprint.objects.values_list('journal_id', 'text')), [(journal.pk, 'Waiting')])
+
+    def test_jsonl_import_creates_departments(self):
+        rows = [
+            {'author': 'testuser', 'department': 'Operations', 'date_from': '2024-02-05',
+             'date_to': '2024-02-11', 'strategies': ['Plan']},
+            {'author': 'testuser', 'department': 'Operations', 'date_from': '2024-02-05',
+             'date_to': '2024-02-11', 'strategies': ['Repeated']},
+            {'author': 'testuser', 'department': 'Operations', 'date_from': '2024-02-12',
+             'date_to': '2024-02-18', 'pendings': [{'text': 42, 'status': 'on_hold'}]},
+        ]
+        path = self.write_file('.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n')
+
+        out, _ = self.import_file(path, '--dry-run', '--create-departments')
+        self.assertIn('1 valid', out)
+        self.assertFalse(Department.objects.filter(name='Operations').exists())
+
+        out, err = self.import_file(path, '--create-departments')
+        self.assertIn('1 inserted, 1 duplicates, 2 rejected', out)
+        self.assertIn('Line 3: item text must be a string', err)
+        self.assertIn('Line 4: invalid JSON', err)
+        journal = WeeklyJournal.objects.get(department__name='Operations')
+        self.assertEqual(without_ids(journal.strategies), [{'text': 'Plan', 'status': 'not_started'}])
+
+
+class GenerateLoadDataTest(TestCase):
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_load_data', '--scale', '0.01', '--weeks', '2', *args, stdout=out)
+        return list(
+            WeeklyJournal.objects.order_by('author__username', 'date_from')
+            .values_list('author__username', 'highlights', 'pendings')
+        )
+
+    def test_same_seed_gives_same_data(self):
+        first = self.generate()
+        self.assertTrue(first)
+        self.assertEqual(User.objects.filter(username__startswith='load_user').count(), 10)
+        self.assertTrue(TopManagementTag.objects.exists())
+        self.assertEqual(self.generate('--reset'), first)
+        self.assertNotEqual(self.generate('--reset', '--seed', '7'), first)
+
+    def test_reset_skips_journal_signals(self):
+        self.generate()
+        with patch('apps.journal.signals.publish_journal_counts') as publish, \
+                patch('apps.journal.signals.invalidate_journal_weeks') as invalidate:
+            self.generate('--reset')
+        publish.assert_not_called()
+        invalidate.assert_not_called()
+        rollups = set(WeeklyStatusRollup.objects.values_list('department_id', 'week_start', 'section', 'status', 'count'))
+        self.assertTrue(rollups)
+        rebuild_rollups()
+        self.assertEqual(
+            set(WeeklyStatusRollup.objects.values_list('department_id', 'week_start', 'section', 'status', 'count')),
+            rollups,
+        )
+
+
+class WeeklyRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.department = Department.objects.create(name='Test Department')
+
+    def rollups(self):
+        return {
+            (row.week_start, row.section, row.status): row.count
+            for row in WeeklyStatusRollup.objects.filter(department=self.department)
+        }
+
+    def test_counts_follow_saves_and_deletes(self):
+        journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-03',
+            date_to='2024-01-09',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}, {'text': 'Fixed', 'status': 'completed'}],
+            pendings=['Old format item'],
+        )
+        week = date(2024, 1, 1)
+        self.assertEqual(self.rollups(), {
+            (week, 'highlights', 'completed'): 2,
+            (week, 'pendings', 'in_progress'): 1,
+        })
+
+        journal.highlights[1]['status'] = 'cancelled'
+        journal.save()
+        self.assertEqual(self.rollups(), {
+            (week, 'highlights', 'completed'): 1,
+            (week, 'highlights', 'cancelled'): 1,
+            (week, 'pendings', 'in_progress'): 1,
+        })
+
+        journal.date_from = date(2024, 1, 10)
+        journal.save()
+        next_week = date(2024, 1, 8)
+        self.assertEqual(self.rollups(), {
+            (next_week, 'highlights', 'completed'): 1,
+            (next_week, 'highlights', 'cancelled'): 1,
+            (next_week, 'pendings', 'in_progress'): 1,
+        })
+
+        journal.delete()
+        self.assertEqual(self.rollups(), {})
+
+    def test_drifted_rollups_dont_fail_saves(self):
+        journal = WeeklyJournal.objects.create(
+            author=self.user, department=self.department, date_from='2024-01-01', date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}, {'text': 'Fixed', 'status': 'completed'}],
+        )
+        # As if a bulk job had left the rollup behind
+        WeeklyStatusRollup.objects.filter(department=self.department).update(count=1)
+        journal.highlights = []
+        journal.save()
+        self.assertEqual(self.rollups(), {})
+
+    def test_rebuild_and_trends(self):
+        WeeklyJournal.objects.create(
+            author=self.user, department=self.department, date_from=date(2024, 1, 29), date_to=date(2024, 2, 4),
+            highlights=[{'text': 'Shipped', 'status': 'completed'}],
+        )
+        # bulk_create skips the signals, the rebuild picks the row up
+        WeeklyJournal.objects.bulk_create([WeeklyJournal(
+            author=self.user, department=self.department, date_from=date(2024, 2, 5), date_to=date(2024, 2, 11),
+            highlights=[{'text': 'Planned', 'status': 'completed'}], strategies=['Next'],
+        )])
+        incremental = self.rollups()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('Rebuilt 3 rollup rows', out.getvalue())
+        self.assertEqual(self.rollups(), {**incremental, (date(2024, 2, 5), 'highlights', 'completed'): 1,
+                                          (date(2024, 2, 5), 'strategies', 'not_started'): 1})
+
+        self.assertEqual(status_trends('month', sections=['highlights']), [
+            {'period': date(2024, 1, 1), 'status': 'completed', 'count': 1},
+            {'period': date(2024, 2, 1), 'status': 'completed', 'count': 1},
+        ])
+        self.assertEqual(status_trends('year', departments=[self.department]), [
+            {'period': date(2024, 1, 1), 'department_id': self.department.pk, 'status': 'completed', 'count': 2},
+            {'period': date(2024, 1, 1), 'department_id': self.department.pk, 'status': 'not_started', 'count': 1},
+        ])
+
+
+class DepartmentAnalyticsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.sales = Department.objects.create(name='Sales')
+        self.support = Department.objects.create(name='Support')
+        self.since, self.until = analytics_range(4)
+        self.members = [User.objects.create_user(username=f'member{i}', password='testpass123') for i in range(3)]
+        # member0 and member1 submit every week to Sales, member2 stops after the first
+        # two weeks; the Support member submits every week
+        for week in range(4):
+            week_start = self.since + timedelta(weeks=week)
+            for member in self.members[:2] + ([self.members[2]] if week < 2 else []):
+                self.add_journal(member, self.sales, week_start)
+        self.helpdesk = User.objects.create_user(username='helpdesk', password='testpass123', first_name='Helen')
+        for week in range(4):
+            self.add_journal(self.helpdesk, self.support, self.since + timedelta(weeks=week))
+        self.client.login(username='admin', password='testpass123')
+
+    def add_journal(self, author, department, week_start):
+        WeeklyJournal.objects.create(
+            author=author, department=department, date_from=week_start, date_to=week_start + timedelta(days=6),
+            highlights=[{'text': 'Done', 'status': 'completed'}],
+        )
+
+    def test_submission_rates(self):
+        rows = [row for row in submission_rates(self.since, self.until) if row['department_id'] == self.sales.pk]
+        self.assertEqual([row['submitted'] for row in rows], [3, 3, 2, 2])
+        self.assertEqual(rows[0]['members'], 3)
+        self.assertAlmostEqual(rows[-1]['rate'], 2 / 3)
+        self.assertAlmostEqual(rows[-1]['moving_rate'], 10 / 12)
+        self.assertEqual(rows[-1]['week_rank'], 2)
+        self.assertEqual(rows[-1]['overall_rank'], 2)
+
+    def test_members_follow_compliance_roster(self):
+        # member2 moves to Support in the last week, member0 is deactivated
+        self.add_journal(self.members[2], self.support, self.until)
+        self.members[0].is_active = False
+        self.members[0].save()
+        for row in submission_rates(self.since, self.until):
+            missing = [user for user in missing_submissions(row['week']) if user['department_id'] == row['department_id']]
+            self.assertEqual(row['members'], row['submitted'] + len(missing), row)
+
+    def test_rollup_rebuild_recomputes_analytics(self):
+        url = reverse('journal:department_analytics') + '?weeks=4'
+        self.assertEqual(self.client.get(url).context['page_obj'][0]['members'], 1)
+        # Bypass the signals, like bulk jobs do
+        WeeklyJournal.objects.filter(department=self.support).update(department=self.sales)
+        self.assertEqual(self.client.get(url).context['page_obj'][0]['members'], 1)
+        rebuild_rollups()
+        self.assertEqual([department['name'] for department in self.client.get(url).context['page_obj']], ['Sales'])
+
+    def test_overview_and_department_pages(self):
+        response = self.client.get(reverse('journal:department_analytics') + '?weeks=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([department['name'] for department in response.context['page_obj']], ['Support', 'Sales'])
+        self.assertEqual(len(response.context['status_mix'][0]['shares']), 5)
+
+        response = self.client.get(reverse('journal:department_analytics') + f'?weeks=4&department={self.sales.pk}')
+        self.assertEqual([row['id'] for row in response.context['missing_members']], [self.members[2].pk])
+        self.assertEqual(len(response.context['department_weeks']), 4)
+
+        self.client.login(username='member0', password='testpass123')
+        response = self.client.get(reverse('journal:department_analytics'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(ANALYTICS_BACKGROUND=True)
+    @patch('apps.journal.tasks.precompute_department_analytics.apply_async')
+    def test_long_ranges_computed_in_background(self, apply_async):
+        url = reverse('journal:department_analytics') + '?weeks=156'
+        self.assertTrue(self.client.get(url).context['pending'])
+        self.assertTrue(self.client.get(url).context['pending'])
+        apply_async.assert_called_once()
+
+        precompute_department_analytics(*apply_async.call_args.kwargs['args'])
+        response = self.client.get(url)
+        self.assertNotIn('pending', response.context)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(ANALYTICS_BACKGROUND=False)
+    @patch('apps.journal.tasks.precompute_department_analytics.apply_async')
+    def test_long_ranges_computed_in_request_without_shared_cache(self, apply_async):
+        response = self.client.get(reverse('journal:department_analytics') + '?weeks=156')
+        self.assertNotIn('pending', response.context)
+        apply_async.assert_not_called()
+
+    def test_background_needs_shared_cache(self):
+        with override_settings(ANALYTICS_BACKGROUND=True):
+            self.assertEqual([error.id for error in check_analytics_background(None)], ['journal.E001'])
+        with override_settings(ANALYTICS_BACKGROUND=False):
+            self.assertEqual(check_analytics_background(None), [])
+
+
+@override_settings(COMPLIANCE_REMINDER_BATCH_SIZE=1)
+class MissingSubmissionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.department = Department.objects.create(name='Finance')
+        self.this_week = date(2024, 3, 4)
+        last_week = self.this_week - timedelta(weeks=1)
+        self.users = {}
+        for username, is_active in [('ana', True), ('ben', True), ('carla', True), ('dan', False)]:
+            user = User.objects.create_user(
+                username=username, password='testpass123', email=f'{username}@example.com', is_active=is_active
+            )
+            self.users[username] = user
+            self.add_journal(user, last_week)
+        self.add_journal(self.users['ana'], self.this_week)
+        # Never submitted anything, so not on the roster
+        User.objects.create_user(username='new', password='testpass123', email='new@example.com')
+
+    def add_journal(self, author, week):
+        WeeklyJournal.objects.create(
+            author=author, department=self.department, date_from=week, date_to=week + timedelta(days=6),
+            highlights=['Done'],
+        )
+
+    def test_missing_users_cached_per_week(self):
+        with self.assertNumQueries(1):
+            rows = missing_submissions(self.this_week + timedelta(days=2))
+        self.assertEqual([row['username'] for row in rows], ['ben', 'carla'])
+        self.assertEqual(rows[0]['department_name'], 'Finance')
+        self.assertEqual(rows[0]['last_submitted'], self.this_week - timedelta(weeks=1))
+        with self.assertNumQueries(0):
+            missing_submissions(self.this_week)
+
+        self.add_journal(self.users['ben'], self.this_week)
+        self.assertEqual([row['username'] for row in missing_submissions(self.this_week)], ['carla'])
+
+    def test_command_sends_reminders_once_over_one_connection(self):
+        out = StringIO()
+        with patch.object(compliance, 'get_connection', wraps=compliance.get_connection) as get_connection:
+            call_command('check_submissions', '--week', '2024-03-06', '--send-reminders', stdout=out)
+        get_connection.assert_called_once()
+        self.assertIn('Week of 2024-03-04: 2 missing', out.getvalue())
+        self.assertIn('Sent 2 reminders', out.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['ben@example.com', 'carla@example.com'])
+        self.assertIn('/create/', mail.outbox[0].body)
+
+        # Sent reminders are kept in the database, not in the cache of one process
+        self.assertEqual(SubmissionReminder.objects.filter(week_start=date(2024, 3, 4)).count(), 2)
+        cache.clear()
+        call_command('check_submissions', '--week', '2024-03-06', '--send-reminders', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class JournalItemHistoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.department = Department.objects.create(name='Test Department')
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}],
+            pendings=[{'text': 'Review', 'status': 'not_started'}, 'Old format item'],
+        )
+
+    def changes(self):
+        return list(self.journal.item_changes.exclude(change='added').values_list(
+            'section', 'position', 'change', 'old_status', 'new_status'
+        ))
+
+    def test_new_journal_records_added_items(self):
+        self.assertEqual(
+            list(self.journal.item_changes.values_list('section', 'position', 'change', 'new_status')),
+            [
+                ('highlights', 0, 'added', 'completed'),
+                ('pendings', 0, 'added', 'not_started'),
+                ('pendings', 1, 'added', 'in_progress'),
+            ],
+        )
+
+    def test_only_differences_are_recorded_in_one_insert(self):
+        self.journal.pendings[0]['status'] = 'in_progress'
+        self.journal.pendings[1]['text'] = 'Old format item, reworded'
+        self.journal.highlights.append({'text': 'Released', 'status': 'completed'})
+        self.journal._changed_by = self.user
+        with CaptureQueriesContext(connection) as context:
+            self.journal.save(update_fields=['highlights', 'pendings'])
+        inserts = [query for query in context.captured_queries if 'INSERT INTO "journal_journalitemchange"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertTrue(self.journal.item_changes.filter(section='highlights', position=1, change='added').exists())
+        self.assertEqual(sorted(self.changes()), [
+            ('pendings', 0, 'status', 'not_started', 'in_progress'),
+            ('pendings', 1, 'text', 'in_progress', 'in_progress'),
+        ])
+        self.assertTrue(self.journal.item_changes.filter(change='status', changed_by=self.user).exists())
+
+        self.journal.save()
+        self.journal.save(update_fields=['date_to'])
+        self.journal.pendings.pop()
+        self.journal.save()
+        self.assertEqual(self.changes()[-1], ('pendings', 1, 'removed', 'in_progress', ''))
+
+    def test_items_paired_by_id(self):
+        self.journal.pendings.append({'text': 'Plan', 'status': 'not_started'})
+        self.journal.save()
+        review_id = self.journal.pendings[0]['id']
+
+        # Moving and deleting items is not an edit of the items after them
+        self.journal.pendings = [self.journal.pendings[2], self.journal.pendings[0]]
+        self.journal.pendings[1]['status'] = 'completed'
+        self.journal.save()
+        self.assertEqual(self.changes()[-2:], [
+            ('pendings', 1, 'status', 'not_started', 'completed'),
+            ('pendings', 1, 'removed', 'in_progress', ''),
+        ])
+        self.assertEqual(
+            [change.new_status for change in status_timeline(self.journal, item_id=review_id)],
+            ['not_started', 'completed'],
+        )
+
+    def test_legacy_items_paired_by_position(self):
+        WeeklyJournal.objects.filter(pk=self.journal.pk).update(pendings=['First', 'Second'])
+        journal = WeeklyJournal.objects.get(pk=self.journal.pk)
+        journal.pendings[1] = {'text': 'Second', 'status': 'completed'}
+        journal.save()
+        self.assertEqual(self.changes(), [('pendings', 1, 'status', 'in_progress', 'completed')])
+
+    def test_status_timeline_and_detail_page(self):
+        for status in ('in_progress', 'completed'):
+            self.journal.pendings[0]['status'] = status
+            self.journal.save()
+        self.assertEqual(
+            [change.new_status for change in status_timeline(self.journal, 'pendings', 0)],
+            ['not_started', 'in_progress', 'completed'],
+        )
+
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('journal:detail', kwargs={'pk': self.journal.pk}))
+        self.assertContains(response, 'Item History')
+        self.assertEqual(len(response.context['item_changes']), 5)
+
+
+class StableItemIdTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.department = Department.objects.create(name='Test Department')
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}, 'Old format item'],
+            challenges=[{'text': 'Flaky CI', 'status': 'on_hold'}],
+        )
+        self.report = TopManagementReport.objects.create(
+            week_start='2024-01-01', week_end='2024-01-07', created_by=self.user
+        )
+        self.client.login(username='admin', password='testpass123')
+
+    def test_items_get_ids_kept_across_saves(self):
+        ids = [item['id'] for item in self.journal.get_highlights_list()]
+        self.assertEqual(len(set(ids)), 2)
+        self.assertEqual(self.journal.highlights[1]['text'], 'Old format item')
+
+        self.journal.highlights.reverse()
+        self.journal.highlights.append({'text': 'Copied', 'status': 'completed', 'id': ids[0]})
+        self.journal.save()
+        self.journal.refresh_from_db()
+        saved_ids = [item['id'] for item in self.journal.highlights]
+        self.assertEqual(saved_ids[:2], ids[::-1])
+        self.assertNotIn(saved_ids[2], ids)
+
+    def test_tag_follows_item_through_edits(self):
+        shipped, old = self.journal.get_highlights_list()
+        response = self.client.post(reverse('journal:ajax_tag_item'), {
+            'journal_id': self.journal.pk, 'report_id': self.report.pk, 'action': 'tag',
+            'section': 'highlights', 'item_index': 1, 'item_id': old['id'],
+        })
+        self.assertTrue(response.json()['success'])
+        tag = TopManagementTag.objects.get()
+        self.assertEqual((tag.item_id.hex, tag.item_text), (old['id'], 'Old format item'))
+
+        # Remove the first item and edit the tagged one through the journal form
+        response = self.client.post(reverse('journal:update', kwargs={'pk': self.journal.pk}), {
+            'department': self.department.pk,
+            'date_from': '2024-01-01',
+            'date_to': '2024-01-07',
+            'highlights_0': 'Old format item, reworded',
+            'highlights_status_0': 'cancelled',
+            'highlights_id_0': old['id'],
+        })
+        self.assertEqual(response.status_code, 302)
+        tag.refresh_from_db()
+        self.assertEqual(
+            (tag.section, tag.item_index, tag.item_text, tag.item_status),
+            ('highlights', 0, 'Old format item, reworded', 'cancelled'),
+        )
+
+        response = self.client.post(reverse('journal:ajax_tag_item'), {
+            'journal_id': self.journal.pk, 'report_id': self.report.pk, 'action': 'untag',
+            'section': 'highlights', 'item_index': 0, 'item_id': old['id'],
+        })
+        self.assertFalse(TopManagementTag.objects.exists())
+
+    def test_report_resync_reads_tags_in_one_query(self):
+        for section, items in (('highlights', self.journal.get_highlights_list()), ('challenges', self.journal.get_challenges_list())):
+            for index, item in enumerate(items):
+                TopManagementTag.objects.create(
+                    journal_entry=self.journal, report=self.report, section=section, item_id=item['id'],
+                    item_index=index, item_text='stale', item_status='not_started', tagged_by=self.user,
+                )
+        with self.assertNumQueries(2):
+            self.assertEqual(resync_report_tags(self.report), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(resync_report_tags(self.report), 0)
+        out = StringIO()
+        call_command('resync_topman_tags', '--report', str(self.report.pk), stdout=out)
+        self.assertIn('Updated 0 tags', out.getvalue())
+        self.assertEqual(
+            sorted(self.report.tagged_items.values_list('item_text', flat=True)),
+            ['Flaky CI', 'Old format item', 'Shipped'],
+        )
+
+
+class CarryForwardTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.department = Department.objects.create(name='Test Department')
+        self.this_week = week_start(date.today())
+        self.previous = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from=self.this_week - timedelta(weeks=1),
+            date_to=self.this_week - timedelta(days=1),
+            highlights=['Done'],
+            pendings=[{'text': 'Review', 'status': 'in_progress'}, {'text': 'Merged', 'status': 'completed'}],
+            strategies=[{'text': 'Plan Q3', 'status': 'not_started'}, {'text': 'Dropped', 'status': 'cancelled'}],
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def post_journal(self, week, items):
+        data = {
+            'department': self.department.pk,
+            'date_from': week,
+            'date_to': week + timedelta(days=6),
+            'highlights_0': 'Something',
+        }
+        for index, (section, text, origin) in enumerate(items):
+            data[f'{section}_{index}'] = text
+            data[f'{section}_origin_{index}'] = f"{origin['journal']}:{origin['item']}"
+        self.assertEqual(self.client.post(reverse('journal:create'), data).status_code, 302)
+        return WeeklyJournal.objects.get(author=self.user, date_from=week)
+
+    def test_open_items_prefilled_from_previous_entry(self):
+        with self.assertNumQueries(1):
+            previous = previous_journal(self.user, self.this_week + timedelta(weeks=1))
+        self.assertEqual(previous, self.previous)
+
+        response = self.client.get(reverse('journal:create'))
+        carried = response.context['carried_items']
+        self.assertEqual(response.context['carried_count'], 2)
+        self.assertEqual([item['text'] for item in carried['pendings']], ['Review'])
+        self.assertEqual(carried['strategies'][0]['origin'], {
+            'journal': self.previous.pk, 'item': self.previous.strategies[0]['id'],
+        })
+        self.assertContains(response, 'carried-items')
+        self.assertNotIn('carried_items', self.client.get(reverse('journal:create') + '?carry=0').context)
+
+    def test_carried_items_linked_across_weeks(self):
+        origin = self.client.get(reverse('journal:create')).context['carried_items']['pendings'][0]['origin']
+        journal = self.post_journal(self.this_week, [('pendings', 'Review', origin)])
+        carried = journal.pendings[0]
+        self.assertEqual(carried['origin'], origin)
+        self.assertNotEqual(carried['id'], origin['item'])
+
+        following = self.post_journal(
+            self.this_week + timedelta(weeks=1),
+            [('pendings', 'Review, nearly done', {'journal': journal.pk, 'item': carried['id']})],
+        )
+        with self.assertNumQueries(2):
+            lineage = item_lineage(following.pendings[0]['id'])
+        self.assertEqual([link.origin_journal for link in lineage], [self.previous, journal])
+        self.assertEqual({link.root_item_id.hex for link in lineage}, {origin['item']})
+
+        # Removing the item from the journal drops its link
+        following.pendings = []
+        following.save()
+        self.assertEqual(len(item_lineage(origin['item'])), 1)
+        # Links to other authors' entries are ignored
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.previous.author = other
+        self.previous.save()
+        journal.pendings[0]['id'] = ''
+        journal.save()
+        self.assertFalse(journal.carried_items.exists())
+
+    def test_late_entry_carries_from_the_week_before_it(self):
+        # A late entry for the week before the previous one
+        late_week = self.this_week - timedelta(weeks=2)
+        older = WeeklyJournal.objects.create(
+            author=self.user, department=self.department,
+            date_from=late_week - timedelta(weeks=1), date_to=late_week - timedelta(days=1),
+            pendings=[{'text': 'Hire', 'status': 'on_hold'}],
+        )
+        response = self.client.get(reverse('journal:create') + f'?date_from={late_week}')
+        self.assertEqual(response.context['form'].initial['date_from'], late_week)
+        self.assertEqual(response.context['carried_from'], older)
+
+        # Origins that don't precede the entry are dropped from the JSON, not only from CarriedItem
+        origin = {'journal': self.previous.pk, 'item': self.previous.pendings[0]['id']}
+        journal = self.post_journal(late_week, [('pendings', 'Review', origin)])
+        self.assertNotIn('origin', journal.pendings[0])
+        self.assertFalse(journal.carried_items.exists())
+
+
+class LongRunningItemsTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.department = Department.objects.create(name='Test Department')
+        self.week = date(2024, 3, 4)
+        texts = [
+            'Migrate the billing service to the new cluster',
+            'Migrating billing service to new cluster, blocked on DNS',
+            'Migrate billing service to the new cluster (DNS done)',
+            'Migrate the billing service to the new cluster',
+        ]
+        for weeks_ago, text in zip((3, 2, 1, 0), texts):
+            self.add_journal(self.week - timedelta(weeks=weeks_ago), [
+                {'text': text, 'status': 'in_progress'},
+                {'text': f'Unrelated task number {weeks_ago}', 'status': 'on_hold' if weeks_ago else 'completed'},
+            ])
+        # The same text by someone else doesn't count for this author
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.add_journal(self.week - timedelta(weeks=4), [{'text': texts[0], 'status': 'in_progress'}], author=other)
+
+    def add_journal(self, week, pendings, author=None):
+        return WeeklyJournal.objects.create(
+            author=author or self.user, department=self.department, date_from=week,
+            date_to=week + timedelta(days=6), highlights=['Done'], pendings=pendings,
+        )
+
+    def test_near_duplicates_found_across_weeks(self):
+        self.assertGreater(similarity(minhash('Migrate the billing service'), minhash('migrate billing service!')), 0.99)
+        self.assertEqual(ItemFingerprint.objects.filter(author=self.user).count(), 7)
+
+        with self.assertNumQueries(4):
+            items = long_running_items(self.week, min_weeks=3)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['weeks_open'], 4)
+        self.assertEqual(items[0]['first_seen'], self.week - timedelta(weeks=3))
+        self.assertEqual(long_running_items(self.week, min_weeks=5), [])
+
+        # Completing the item drops it from the report
+        journal = WeeklyJournal.objects.get(author=self.user, date_from=self.week)
+        journal.pendings[0]['status'] = 'completed'
+        journal.save()
+        self.assertEqual(long_running_items(self.week), [])
+        self.assertFalse(journal.item_fingerprints.exists())
+
+    def test_rebuild_and_report_page(self):
+        ItemFingerprint.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_fingerprints', stdout=out)
+        self.assertIn('Rebuilt 8 item fingerprints', out.getvalue())
+        self.assertEqual(ItemBucket.objects.count(), 8 * BANDS)
+
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('journal:long_running_items'), {'week': '2024-03-06'})
+        self.assertContains(response, 'Migrate the billing service to the new cluster')
+        self.assertNotContains(response, 'Unrelated task')
+
+
+class OptimisticLockingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.department = Department.objects.create(name='Test Department')
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}],
+        )
+        self.report = TopManagementReport.objects.create(
+            week_start='2024-01-01', week_end='2024-01-07', created_by=self.user
+        )
+        self.client.login(username='admin', password='testpass123')
+
+    def journal_data(self, text, **extra):
+        return {
+            'department': self.department.pk,
+            'date_from': '2024-01-01',
+            'date_to': '2024-01-07',
+            'highlights_0': text,
+            'highlights_status_0': 'completed',
+            **extra,
+        }
+
+    def test_stale_save_raises_conflict(self):
+        first = WeeklyJournal.objects.get(pk=self.journal.pk)
+        second = WeeklyJournal.objects.get(pk=self.journal.pk)
+        first.highlights = [{'text': 'First editor', 'status': 'completed'}]
+        with CaptureQueriesContext(connection) as queries:
+            first.save()
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE "journal_weeklyjournal"'))
+        self.assertIn('"version" = 1', update.split('WHERE')[1])
+        self.assertEqual(first.version, 2)
+
+        changes = JournalItemChange.objects.count()
+        second.highlights = [{'text': 'Second editor', 'status': 'completed'}]
+        with self.assertRaises(VersionConflict) as raised, transaction.atomic():
+            second.save()
+        self.assertEqual((raised.exception.current_version, second.version), (2, 1))
+        self.journal.refresh_from_db()
+        self.assertEqual((self.journal.version, self.journal.highlights[0]['text']), (2, 'First editor'))
+        self.assertEqual(JournalItemChange.objects.count(), changes)
+
+        # Reloading picks up the current version
+        second.refresh_from_db()
+        second.save(update_fields=['highlights'])
+        self.assertEqual(WeeklyJournal.objects.get(pk=self.journal.pk).version, 3)
+
+    def test_journal_form_conflict(self):
+        url = reverse('journal:update', kwargs={'pk': self.journal.pk})
+        self.assertContains(self.client.get(url), 'name="version" value="1"')
+        WeeklyJournal.objects.get(pk=self.journal.pk).save()
+
+        response = self.client.post(url, self.journal_data('Stale edit', version=1))
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'Someone else saved this weekly journal entry', status_code=409)
+        self.assertContains(response, 'name="version" value="2"', status_code=409)
+        self.assertContains(response, 'Stale edit', status_code=409)
+        self.assertEqual(WeeklyJournal.objects.get(pk=self.journal.pk).highlights[0]['text'], 'Shipped')
+
+        # Saving again after the warning replaces the other change
+        response = self.client.post(url, self.journal_data('Stale edit', version=2))
+        self.assertEqual(response.status_code, 302)
+        self.journal.refresh_from_db()
+        self.assertEqual((self.journal.version, self.journal.highlights[0]['text']), (3, 'Stale edit'))
+
+    def test_report_form_conflict(self):
+        url = reverse('journal:topman_report_update', kwargs={'pk': self.report.pk})
+        data = {'title': 'Edited', 'week_start': '2024-01-01', 'week_end': '2024-01-07', 'executive_summary': ''}
+        TopManagementReport.objects.filter(pk=self.report.pk).update(version=2)
+        response = self.client.post(url, {**data, 'version': 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertNotEqual(TopManagementReport.objects.get(pk=self.report.pk).title, 'Edited')
+        response = self.client.post(url, {**data, 'version': 2})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(TopManagementReport.objects.get(pk=self.report.pk).version, 3)
+
+    def test_tagging_a_changed_journal_conflicts(self):
+        item = self.journal.get_highlights_list()[0]
+        data = {
+            'journal_id': self.journal.pk, 'report_id': self.report.pk, 'action': 'tag',
+            'section': 'highlights', 'item_index': 0, 'item_id': item['id'], 'journal_version': 1,
+        }
+        self.journal.save()
+        response = self.client.post(reverse('journal:ajax_tag_item'), data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['journal_version'], 2)
+        self.assertFalse(TopManagementTag.objects.exists())
+
+        response = self.client.post(reverse('journal:ajax_tag_item'), {**data, 'journal_version': 2})
+        self.assertTrue(response.json()['success'])
+        self.assertTrue(TopManagementTag.objects.exists())
+
+
+class TagEventsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.department = Department.objects.create(name='Test Department')
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user,
+            department=self.department,
+            date_from='2024-01-01',
+            date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}],
+        )
+        self.item_id = self.journal.get_highlights_list()[0]['id']
+        self.report = TopManagementReport.objects.create(
+            week_start='2024-01-01', week_end='2024-01-07', created_by=self.user
+        )
+        self.url = reverse('journal:report_tag_events', kwargs={'pk': self.report.pk})
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def tag(self, action, priority='medium'):
+        return self.client.post(reverse('journal:ajax_tag_item'), {
+            'journal_id': self.journal.pk, 'report_id': self.report.pk, 'action': action,
+            'section': 'highlights', 'item_index': 0, 'item_id': self.item_id, 'priority': priority,
+        })
+
+    def test_tag_changes_published_on_commit(self):
+        with patch('apps.journal.live.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tag('tag')
+                publish.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tag('tag', priority='high')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tag('untag')
+        channel = report_channel(self.report.pk)
+        event = {'journal': self.journal.pk, 'item': self.item_id}
+        self.assertEqual([call.args for call in publish.call_args_list], [
+            (channel, {'type': 'tag', **event, 'priority': 'medium'}),
+            (channel, {'type': 'priority', **event, 'priority': 'high'}),
+            (channel, {'type': 'untag', **event, 'priority': 'high'}),
+        ])
+
+    def test_stream_needs_asgi_and_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+        self.client.force_login(User.objects.create_user(username='member', password='testpass123'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    async def test_stream_sends_snapshot_then_changes(self):
+        await TopManagementTag.objects.acreate(
+            journal_entry=self.journal, report=self.report, section='highlights', item_id=self.item_id,
+            item_index=0, item_text='Shipped', item_status='completed', tagged_by=self.user, priority='high',
+        )
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        snapshot = await anext(stream)
+        self.assertTrue(snapshot.startswith(b'event: snapshot\n'))
+        self.assertEqual(json.loads(snapshot.split(b'data: ')[1]), {
+            'type': 'snapshot', 'count': 1,
+            'tags': [{'journal': self.journal.pk, 'item': self.item_id, 'priority': 'high'}],
+        })
+
+        get_broker().publish(report_channel(self.report.pk), {'type': 'untag', 'journal': self.journal.pk})
+        self.assertTrue((await anext(stream)).startswith(b'event: untag\n'))
+        await stream.aclose()
+
+
+class LiveCountersTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.department = Department.objects.create(name='Test Department')
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def published(self, publish):
+        return {channel: event['counts'] for (channel, event), _ in publish.call_args_list}
+
+    def test_journal_changes_publish_counter_deltas(self):
+        monday, next_monday = date(2024, 1, 1), date(2024, 1, 8)
+        with patch('apps.journal.live.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                journal = WeeklyJournal.objects.create(
+                    author=self.user, department=self.department, date_from=monday, date_to='2024-01-07',
+                    highlights=[{'text': 'Shipped', 'status': 'completed'}],
+                    pendings=[{'text': 'Review', 'status': 'in_progress'}],
+                )
+        self.assertEqual(self.published(publish), {
+            DASHBOARD_CHANNEL: {
+                'total_journals': 1, 'status_summary.completed': 1, 'status_summary.in_progress': 1,
+                'status_summary.total_items': 2,
+            },
+            user_channel(self.user.pk): {
+                'user_journal_count': 1, 'user_status_summary.completed': 1, 'user_status_summary.in_progress': 1,
+                'user_status_summary.total_items': 2,
+            },
+            week_channel(monday): {
+                'stats.total_entries': 1, 'status_summary.completed': 1, 'status_summary.in_progress': 1,
+                'status_summary.total_items': 2,
+            },
+        })
+
+        # Moving the entry to the next week and finishing the review
+        journal.date_from, journal.date_to = next_monday, date(2024, 1, 14)
+        journal.pendings = [{**journal.pendings[0], 'status': 'completed'}]
+        with patch('apps.journal.live.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                journal.save()
+        self.assertEqual(self.published(publish), {
+            DASHBOARD_CHANNEL: {'status_summary.completed': 1, 'status_summary.in_progress': -1},
+            user_channel(self.user.pk): {'user_status_summary.completed': 1, 'user_status_summary.in_progress': -1},
+            week_channel(monday): {
+                'stats.total_entries': -1, 'status_summary.completed': -1, 'status_summary.in_progress': -1,
+                'status_summary.total_items': -2,
+            },
+            week_channel(next_monday): {
+                'stats.total_entries': 1, 'status_summary.completed': 2, 'status_summary.total_items': 2,
+            },
+        })
+
+        with patch('apps.journal.live.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                journal.delete()
+        self.assertEqual(self.published(publish)[DASHBOARD_CHANNEL], {
+            'total_journals': -1, 'status_summary.completed': -2, 'status_summary.total_items': -2,
+        })
+
+    def test_changes_numbered_after_snapshots(self):
+        cache.clear()
+        snapshot = get_dashboard_snapshot(self.user)
+        with patch.object(get_broker(), 'deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                WeeklyJournal.objects.create(
+                    author=self.user, department=self.department, date_from='2024-01-01', date_to='2024-01-07',
+                )
+        seq = {channel: event['seq'] for (channel, event), _ in deliver.call_args_list}
+        self.assertGreater(seq[DASHBOARD_CHANNEL], snapshot['global_seq'])
+        self.assertGreater(seq[user_channel(self.user.pk)], snapshot['user_seq'])
+
+        # Snapshots that count the change skip its event
+        snapshot = get_dashboard_snapshot(self.user)
+        self.assertEqual((snapshot['total_journals'], snapshot['global_seq']), (1, seq[DASHBOARD_CHANNEL]))
+        self.assertEqual((snapshot['user_journal_count'], snapshot['user_seq']), (1, seq[user_channel(self.user.pk)]))
+        week = weekly_summary_counts(date(2024, 1, 1))
+        self.assertEqual(week['counts']['stats.total_entries'], 1)
+        self.assertEqual(week['seq'], {week_channel(date(2024, 1, 1)): seq[week_channel(date(2024, 1, 1))]})
+
+    def test_summary_snapshot_matches_page(self):
+        WeeklyJournal.objects.create(
+            author=self.user, department=self.department, date_from='2024-01-01', date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}, {'text': 'Hired', 'status': 'on_hold'}],
+        )
+        response = self.client.get(reverse('journal:topman_summary'), {'week_start': '2024-01-01', 'week_end': '2024-01-07'})
+        self.assertEqual(response.context['live_counters_url'], reverse('journal:topman_summary_events') + '?week=2024-01-01')
+        with self.assertNumQueries(3):
+            counts = summary_counts(date(2024, 1, 1))
+        for name, value in response.context['stats'].items():
+            self.assertEqual(counts[f'stats.{name}'], value)
+        for status, value in response.context['status_summary'].items():
+            self.assertEqual(counts[f'status_summary.{status}'], value)
+
+        # Other ranges aren't pushed
+        response = self.client.get(reverse('journal:topman_summary'), {'week_start': '2024-01-03', 'week_end': '2024-01-09'})
+        self.assertNotIn('live_counters_url', response.context)
+        response = self.client.get(reverse('journal:topman_summary_events'), {'week': '2024-01-03'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_dashboard_stream(self):
+        await WeeklyJournal.objects.acreate(
+            author=self.user, department=self.department, date_from='2024-01-01', date_to='2024-01-07',
+            highlights=[{'text': 'Shipped', 'status': 'completed'}],
+        )
+        response = await self.async_client.get(reverse('journal:dashboard_events'))
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        snapshot = json.loads((await anext(stream)).split(b'data: ')[1])
+        self.assertEqual(
+            (snapshot['counts']['total_journals'], snapshot['counts']['user_status_summary.completed']), (1, 1)
+        )
+        self.assertEqual(set(snapshot['seq']), {DASHBOARD_CHANNEL, user_channel(self.user.pk)})
+
+        get_broker().publish(user_channel(self.user.pk), {'type': 'counts', 'counts': {'user_journal_count': 1}})
+        self.assertTrue((await anext(stream)).startswith(b'event: counts\n'))
+        await stream.aclose()
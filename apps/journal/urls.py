@@ -2,12 +2,15 @@ from django.urls import path
 from . import views
 from . import views_topman
 from . import views_summary
+from . import views_api
+from . import views_analytics
 
 app_name = 'journal'
 
 urlpatterns = [
     # Dashboard
     path('', views.dashboard, name='dashboard'),
+    path('events/', views.dashboard_events, name='dashboard_events'),
     
     # Journal CRUD
     path('list/', views.JournalListView.as_view(), name='list'),
@@ -29,7 +32,23 @@ urlpatterns = [
     path('topman/update/<int:pk>/', views_topman.TopManagementReportUpdateView.as_view(), name='topman_report_update'),
     path('topman/tagging/', views_topman.topman_tagging_interface, name='topman_tagging'),
     path('topman/summary/', views_topman.topman_weekly_summary, name='topman_summary'),
+    path('topman/summary/events/', views_topman.weekly_summary_events, name='topman_summary_events'),
     
-    # AJAX endpoints for tagging
+    # Department analytics (Admin Only)
+    path('analytics/', views_analytics.department_analytics, name='department_analytics'),
+    path('analytics/long-running/', views_analytics.long_running_report, name='long_running_items'),
+    
+    # AJAX endpoints and live updates for tagging
     path('ajax/tag-item/', views_topman.ajax_tag_item, name='ajax_tag_item'),
+    path('topman/report/<int:pk>/events/', views_topman.report_tag_events, name='report_tag_events'),
+    
+    # Read-only JSON API
+    path('api/journals/', views_api.journal_list, name='api_journal_list'),
+    path('api/journals/<int:pk>/', views_api.journal_detail, name='api_journal_detail'),
+    path('api/departments/', views_api.department_list, name='api_department_list'),
+    path('api/departments/<int:pk>/', views_api.department_detail, name='api_department_detail'),
+    path('api/reports/', views_api.report_list, name='api_report_list'),
+    path('api/reports/<int:pk>/', views_api.report_detail, name='api_report_detail'),
+    path('api/tags/', views_api.tag_list, name='api_tag_list'),
+    path('api/tags/<int:pk>/', views_api.tag_detail, name='api_tag_detail'),
 ]
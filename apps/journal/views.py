@@ -3,14 +3,27 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
-from django.urls import reverse_lazy
-from django.http import JsonResponse
-from django.db.models import Q
-from datetime import datetime, timedelta
-from .models import WeeklyJournal, Department, JournalComment
+from django.urls import reverse, reverse_lazy
+from django.http import HttpResponseForbidden, JsonResponse
+from django.db import transaction
+from django.db.models import Q, Max, Count
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from datetime import date, datetime, timedelta
+from .models import WeeklyJournal, Department, JournalComment, VersionConflict
 from .forms import WeeklyJournalForm, JournalCommentForm
+from .cache import get_dashboard_snapshot, make_page_etag
+from .carry import carry_forward_items, previous_journal
+from .rollups import week_start
+from .live import DASHBOARD_CHANNEL, dashboard_snapshot, user_channel
+from apps.web.queries import query_budget
+from apps.web.routers import replica_reads
+from apps.web.events import event_stream, request_user
+from functools import partial
 
 
+@query_budget(6)
 class JournalListView(LoginRequiredMixin, ListView):
     """View to list all journal entries"""
     model = WeeklyJournal
@@ -60,6 +73,19 @@ class JournalListView(LoginRequiredMixin, ListView):
         return context
 
 
+def journal_detail_etag(request, pk):
+    """ETag for the journal detail page, changes with the entry and its comments"""
+    state = WeeklyJournal.objects.filter(pk=pk).aggregate(
+        updated_at=Max('updated_at'),
+        last_comment=Max('comments__created_at'),
+        comment_count=Count('comments'),
+    )
+    if state['updated_at'] is None:
+        return None
+    return make_page_etag(request, state['updated_at'], state['last_comment'], state['comment_count'])
+
+
+@method_decorator(condition(etag_func=journal_detail_etag), name='dispatch')
 class JournalDetailView(LoginRequiredMixin, DetailView):
     """View to display a single journal entry"""
     model = WeeklyJournal
@@ -70,6 +96,7 @@ class JournalDetailView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         context['comments'] = self.object.comments.select_related('author')
         context['comment_form'] = JournalCommentForm()
+        context['item_changes'] = self.object.item_changes.select_related('changed_by').order_by('-changed_at', '-id')[:20]
         return context
 
 
@@ -81,8 +108,35 @@ class JournalCreateView(LoginRequiredMixin, CreateView):
     template_name = 'journal/journal_form.html'
     success_url = reverse_lazy('journal:list')
     
+    def get_initial(self):
+        initial = super().get_initial()
+        # Links like ?date_from=2024-03-04 start an entry for an earlier week
+        try:
+            date_from = parse_date(self.request.GET.get('date_from') or '')
+        except ValueError:
+            date_from = None
+        if date_from is not None:
+            initial['date_from'] = date_from
+        return initial
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Pre-fill the unfinished pendings and strategies of the author's entry
+        # before the week being written, unless they asked to start empty
+        if self.request.method == 'GET' and self.request.GET.get('carry') != '0':
+            date_from = context['form'].initial.get('date_from') or date.today()
+            previous = previous_journal(self.request.user, week_start(date_from))
+            if previous is not None:
+                carried = carry_forward_items(previous)
+                if any(carried.values()):
+                    context['carried_from'] = previous
+                    context['carried_items'] = carried
+                    context['carried_count'] = sum(len(items) for items in carried.values())
+        return context
+    
     def form_valid(self, form):
         form.instance.author = self.request.user
+        form.instance._changed_by = self.request.user
         messages.success(self.request, 'Journal entry created successfully!')
         return super().form_valid(form)
 
@@ -98,8 +152,16 @@ class JournalUpdateView(LoginRequiredMixin, UpdateView):
         return WeeklyJournal.objects.filter(author=self.request.user)
     
     def form_valid(self, form):
+        form.instance._changed_by = self.request.user
+        try:
+            # Saved only if nobody else saved the entry since the form was rendered
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except VersionConflict as conflict:
+            form.add_conflict_error(conflict)
+            return self.render_to_response(self.get_context_data(form=form), status=409)
         messages.success(self.request, 'Journal entry updated successfully!')
-        return super().form_valid(form)
+        return response
 
 
 @login_required
@@ -130,77 +192,41 @@ def add_comment(request, journal_id):
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 
+@query_budget(10)
+@replica_reads
 @login_required
 def dashboard(request):
     """Dashboard view showing journal statistics and recent entries"""
-    user_journals = WeeklyJournal.objects.filter(author=request.user).order_by('-date_from')[:5]
-    recent_journals = WeeklyJournal.objects.select_related('author', 'department').order_by('-created_at')[:10]
+    # Statistics, recent entries and status summaries come from the cached
+    # snapshot; it is invalidated by the signals in signals.py
+    snapshot = get_dashboard_snapshot(request.user)
     
     # Get current week dates for quick entry
     today = datetime.now().date()
     week_start = today - timedelta(days=today.weekday())
     week_end = week_start + timedelta(days=6)
     
-    # Calculate status summary across all entries
-    all_journals = WeeklyJournal.objects.all()
-    status_summary = {
-        'completed': 0,
-        'in_progress': 0,
-        'on_hold': 0,
-        'not_started': 0,
-        'cancelled': 0,
-        'total_items': 0
-    }
-    
-    for journal in all_journals:
-        all_items = []
-        all_items.extend(journal.get_highlights_list())
-        all_items.extend(journal.get_pendings_list())
-        all_items.extend(journal.get_challenges_list())
-        all_items.extend(journal.get_personal_updates_list())
-        all_items.extend(journal.get_strategies_list())
-        
-        for item in all_items:
-            status = item.get('status', 'not_started')
-            if status in status_summary:
-                status_summary[status] += 1
-            status_summary['total_items'] += 1
-    
-    # User-specific status summary
-    user_status_summary = {
-        'completed': 0,
-        'in_progress': 0,
-        'on_hold': 0,
-        'not_started': 0,
-        'cancelled': 0,
-        'total_items': 0
-    }
-    
-    user_all_journals = WeeklyJournal.objects.filter(author=request.user)
-    for journal in user_all_journals:
-        all_items = []
-        all_items.extend(journal.get_highlights_list())
-        all_items.extend(journal.get_pendings_list())
-        all_items.extend(journal.get_challenges_list())
-        all_items.extend(journal.get_personal_updates_list())
-        all_items.extend(journal.get_strategies_list())
-        
-        for item in all_items:
-            status = item.get('status', 'not_started')
-            if status in user_status_summary:
-                user_status_summary[status] += 1
-            user_status_summary['total_items'] += 1
-    
     context = {
-        'user_journals': user_journals,
-        'recent_journals': recent_journals,
+        'user_journals': snapshot['user_journals'],
+        'recent_journals': snapshot['recent_journals'],
         'suggested_date_from': week_start,
         'suggested_date_to': week_end,
-        'total_journals': WeeklyJournal.objects.count(),
-        'user_journal_count': WeeklyJournal.objects.filter(author=request.user).count(),
-        'departments': Department.objects.all(),
-        'status_summary': status_summary,
-        'user_status_summary': user_status_summary,
+        'total_journals': snapshot['total_journals'],
+        'user_journal_count': snapshot['user_journal_count'],
+        'departments': snapshot['departments'],
+        'status_summary': snapshot['status_summary'],
+        'user_status_summary': snapshot['user_status_summary'],
+        'live_counters_url': reverse('journal:dashboard_events'),
     }
     
     return render(request, 'journal/dashboard.html', context)
+
+
+async def dashboard_events(request):
+    """Server-sent changes of the dashboard counters"""
+    user = await request_user(request)
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+    return event_stream(
+        request, DASHBOARD_CHANNEL, user_channel(user.pk), snapshot=partial(dashboard_snapshot, user)
+    )
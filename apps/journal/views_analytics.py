@@ -0,0 +1,98 @@
+from datetime import date
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.paginator import Paginator
+from django.shortcuts import render
+from .analytics import (
+    DEFAULT_WEEKS, WEEK_CHOICES, analytics_range, get_department_analytics, get_department_weeks, status_mix,
+)
+from .compliance import missing_submissions
+from .fingerprints import long_running_items
+from .models import Department
+from .rollups import week_start
+from apps.web.queries import query_budget
+from apps.web.routers import replica_reads
+
+
+DEPARTMENTS_PER_PAGE = 50
+MIN_WEEKS_CHOICES = (3, 4, 6, 8, 12)
+
+
+@query_budget(6)
+@replica_reads
+@staff_member_required
+def department_analytics(request):
+    """Submission rates, status mix and missing members per department over a range of weeks"""
+    try:
+        weeks = int(request.GET.get('weeks', DEFAULT_WEEKS))
+    except ValueError:
+        weeks = DEFAULT_WEEKS
+    if weeks not in WEEK_CHOICES:
+        weeks = DEFAULT_WEEKS
+    since, until = analytics_range(weeks)
+
+    context = {
+        'weeks': weeks,
+        'week_choices': WEEK_CHOICES,
+        'since': since,
+        'until': until,
+    }
+    analytics = get_department_analytics(
+        since, until, background=settings.ANALYTICS_BACKGROUND and weeks > settings.ANALYTICS_SYNC_MAX_WEEKS
+    )
+    if analytics is None:
+        # Being computed by the Celery task, the page reloads until it's done
+        context['pending'] = True
+        return render(request, 'journal/department_analytics.html', context)
+    context['analytics'] = analytics
+
+    department_id = request.GET.get('department')
+    department = next(
+        (department for department in analytics['departments'] if str(department['id']) == department_id), None
+    )
+    if department is not None:
+        context.update({
+            'department': department,
+            'department_weeks': get_department_weeks(since, until, department['id']),
+            'status_mix': status_mix(since, until, department['id']),
+            'missing_members': [
+                row for row in missing_submissions(until) if row['department_id'] == department['id']
+            ],
+        })
+    else:
+        context.update({
+            'page_obj': Paginator(analytics['departments'], DEPARTMENTS_PER_PAGE).get_page(request.GET.get('page')),
+            'status_mix': analytics['status_mix'],
+        })
+    return render(request, 'journal/department_analytics.html', context)
+
+
+@query_budget(8)
+@replica_reads
+@staff_member_required
+def long_running_report(request):
+    """Items of a week that have been in progress or on hold for several weeks, per author"""
+    try:
+        week = week_start(date.fromisoformat(request.GET.get('week', '')))
+    except ValueError:
+        week = week_start(date.today())
+    try:
+        min_weeks = int(request.GET.get('min_weeks', MIN_WEEKS_CHOICES[0]))
+    except ValueError:
+        min_weeks = MIN_WEEKS_CHOICES[0]
+    if min_weeks not in MIN_WEEKS_CHOICES:
+        min_weeks = MIN_WEEKS_CHOICES[0]
+    departments = list(Department.objects.only('id', 'name'))
+    department = next(
+        (department for department in departments if str(department.pk) == request.GET.get('department')), None
+    )
+
+    return render(request, 'journal/long_running_items.html', {
+        'week': week,
+        'min_weeks': min_weeks,
+        'min_weeks_choices': MIN_WEEKS_CHOICES,
+        'departments': departments,
+        'department': department,
+        'items': long_running_items(week, min_weeks=min_weeks, department=department),
+    })
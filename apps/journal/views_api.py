@@ -0,0 +1,238 @@
+from datetime import date
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.views.decorators.http import require_GET
+
+from .models import WeeklyJournal, Department, TopManagementReport, TopManagementTag
+from .serializers import (
+    InvalidFields, DepartmentSerializer, WeeklyJournalSerializer,
+    TopManagementReportSerializer, TopManagementTagSerializer,
+)
+from .views_topman import is_admin_user
+from apps.web.instrumentation import timed
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class BadRequest(ValueError):
+    """Raised for invalid query parameters, returned to the client as a 400"""
+
+
+def api_login_required(view_func):
+    """Like login_required, but answers with a JSON 401 instead of redirecting"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def api_admin_required(view_func):
+    """Restrict an API view to admin users (staff or superuser)"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        if not is_admin_user(request.user):
+            return JsonResponse({'error': 'Administrator privileges required'}, status=403)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def encode_cursor(pk):
+    return urlsafe_base64_encode(str(pk).encode())
+
+
+def decode_cursor(cursor):
+    try:
+        return int(urlsafe_base64_decode(cursor).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Invalid cursor')
+
+
+def get_serializer(request, serializer_class):
+    """Build the serializer for the sparse fieldset in ?fields=a,b,c"""
+    fields = request.GET.get('fields')
+    requested = [name.strip() for name in fields.split(',') if name.strip()] if fields else None
+    try:
+        return serializer_class(requested)
+    except InvalidFields as e:
+        raise BadRequest(str(e))
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('page_size must be an integer')
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+def parse_int(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+
+
+def parse_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be a YYYY-MM-DD date')
+
+
+def paginated_response(request, queryset, serializer_class):
+    """
+    Return one page of serialized rows using cursor pagination.
+
+    Rows are ordered by descending id and the cursor holds the last id of
+    the previous page, so every page is a single indexed range query no
+    matter how deep the client pages.
+    """
+    serializer = get_serializer(request, serializer_class)
+    page_size = get_page_size(request)
+
+    queryset = queryset.order_by('-id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = queryset.filter(id__lt=decode_cursor(cursor))
+
+    rows = list(serializer.rows(queryset)[:page_size + 1])
+    next_cursor = None
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]['id'])
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    with timed('serialization'):
+        return JsonResponse({
+            'results': serializer.serialize(rows),
+            'next_cursor': next_cursor,
+            'next': next_url,
+        })
+
+
+def detail_response(request, queryset, serializer_class, pk):
+    serializer = get_serializer(request, serializer_class)
+    row = serializer.rows(queryset.filter(pk=pk)).first()
+    if row is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    with timed('serialization'):
+        return JsonResponse(serializer.serialize_row(row))
+
+
+def handle_bad_request(view_func):
+    """Turn BadRequest raised while parsing parameters into a JSON 400"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except BadRequest as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    return wrapper
+
+
+def filter_journals(request, queryset):
+    """Apply the same filters as the summary report"""
+    department_id = parse_int(request, 'department')
+    if department_id:
+        queryset = queryset.filter(department_id=department_id)
+    author_id = parse_int(request, 'author')
+    if author_id:
+        queryset = queryset.filter(author_id=author_id)
+    date_from = parse_date(request, 'date_from')
+    if date_from:
+        queryset = queryset.filter(date_from__gte=date_from)
+    date_to = parse_date(request, 'date_to')
+    if date_to:
+        queryset = queryset.filter(date_to__lte=date_to)
+    return queryset
+
+
+@require_GET
+@api_login_required
+@handle_bad_request
+def journal_list(request):
+    """List journal entries, filterable by department, author and date range"""
+    return paginated_response(request, filter_journals(request, WeeklyJournal.objects.all()), WeeklyJournalSerializer)
+
+
+@require_GET
+@api_login_required
+@handle_bad_request
+def journal_detail(request, pk):
+    return detail_response(request, WeeklyJournal.objects.all(), WeeklyJournalSerializer, pk)
+
+
+@require_GET
+@api_login_required
+@handle_bad_request
+def department_list(request):
+    return paginated_response(request, Department.objects.all(), DepartmentSerializer)
+
+
+@require_GET
+@api_login_required
+@handle_bad_request
+def department_detail(request, pk):
+    return detail_response(request, Department.objects.all(), DepartmentSerializer, pk)
+
+
+@require_GET
+@api_admin_required
+@handle_bad_request
+def report_list(request):
+    """List top management reports, filterable by week range"""
+    queryset = TopManagementReport.objects.all()
+    week_start = parse_date(request, 'week_start')
+    if week_start:
+        queryset = queryset.filter(week_start__gte=week_start)
+    week_end = parse_date(request, 'week_end')
+    if week_end:
+        queryset = queryset.filter(week_end__lte=week_end)
+    return paginated_response(request, queryset, TopManagementReportSerializer)
+
+
+@require_GET
+@api_admin_required
+@handle_bad_request
+def report_detail(request, pk):
+    return detail_response(request, TopManagementReport.objects.all(), TopManagementReportSerializer, pk)
+
+
+@require_GET
+@api_admin_required
+@handle_bad_request
+def tag_list(request):
+    """List top management tags, filterable by report, priority and section"""
+    queryset = TopManagementTag.objects.all()
+    report_id = parse_int(request, 'report')
+    if report_id:
+        queryset = queryset.filter(report_id=report_id)
+    for param in ('priority', 'section'):
+        value = request.GET.get(param)
+        if value:
+            queryset = queryset.filter(**{param: value})
+    return paginated_response(request, queryset, TopManagementTagSerializer)
+
+
+@require_GET
+@api_admin_required
+@handle_bad_request
+def tag_detail(request, pk):
+    return detail_response(request, TopManagementTag.objects.all(), TopManagementTagSerializer, pk)
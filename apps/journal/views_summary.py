@@ -5,14 +5,21 @@ from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count, Prefetch
+from django.db.models import Q, Count, Max, Prefetch
+from django.views.decorators.http import condition
 from django.template.loader import render_to_string
 from datetime import datetime, timedelta, date
 from .models import WeeklyJournal, Department, JournalComment
 from .forms import WeeklyJournalForm, JournalCommentForm
+from .cache import make_page_etag
+from apps.web.instrumentation import timed
+from apps.web.queries import query_budget
+from apps.web.routers import replica_reads
 import json
 
 
+@query_budget(10)
+@replica_reads
 class SummaryReportView(LoginRequiredMixin, ListView):
     """Consolidated summary report of all journal entries with date filtering"""
     model = WeeklyJournal
@@ -194,7 +201,29 @@ class SummaryReportView(LoginRequiredMixin, ListView):
             return grouped
 
 
+def export_summary_etag(request):
+    """ETag for the summary export, changes with the filtered entries and their comments"""
+    if not request.user.is_authenticated:
+        return None
+    summary_view = SummaryReportView()
+    summary_view.request = request
+    state = summary_view.get_queryset().aggregate(
+        updated_at=Max('updated_at'),
+        entry_count=Count('id', distinct=True),
+        last_comment=Max('comments__created_at'),
+        comment_count=Count('comments', distinct=True),
+    )
+    # Without dates the export covers the current month, so today is part of the state
+    return make_page_etag(
+        request, request.GET.urlencode(), date.today(),
+        state['updated_at'], state['entry_count'], state['last_comment'], state['comment_count'],
+    )
+
+
+@query_budget(8)
+@replica_reads
 @login_required
+@condition(etag_func=export_summary_etag)
 def export_summary_report(request):
     """Export summary report as CSV or print-friendly HTML"""
     export_format = request.GET.get('format', 'html')
@@ -217,25 +246,26 @@ def export_summary_report(request):
             'Highlights', 'Pendings', 'Challenges', 'Personal Updates', 'Strategies'
         ])
         
-        for entry in queryset:
-            # Convert JSON lists to readable strings
-            highlights = ' | '.join([item.get('text', '') for item in entry.get_highlights_list()])
-            pendings = ' | '.join([item.get('text', '') for item in entry.get_pendings_list()])
-            challenges = ' | '.join([item.get('text', '') for item in entry.get_challenges_list()])
-            personal = ' | '.join([item.get('text', '') for item in entry.get_personal_updates_list()])
-            strategies = ' | '.join([item.get('text', '') for item in entry.get_strategies_list()])
+        with timed('serialization'):
+            for entry in queryset:
+                # Convert JSON lists to readable strings
+                highlights = ' | '.join([item.get('text', '') for item in entry.get_highlights_list()])
+                pendings = ' | '.join([item.get('text', '') for item in entry.get_pendings_list()])
+                challenges = ' | '.join([item.get('text', '') for item in entry.get_challenges_list()])
+                personal = ' | '.join([item.get('text', '') for item in entry.get_personal_updates_list()])
+                strategies = ' | '.join([item.get('text', '') for item in entry.get_strategies_list()])
             
-            writer.writerow([
-                entry.date_from.strftime('%Y-%m-%d'),
-                entry.date_to.strftime('%Y-%m-%d'),
-                entry.author.get_full_name() or entry.author.username,
-                entry.department.name,
-                highlights[:500] + '...' if len(highlights) > 500 else highlights,
-                pendings[:500] + '...' if len(pendings) > 500 else pendings,
-                challenges[:500] + '...' if len(challenges) > 500 else challenges,
-                personal[:500] + '...' if len(personal) > 500 else personal,
-                strategies[:500] + '...' if len(strategies) > 500 else strategies,
-            ])
+                writer.writerow([
+                    entry.date_from.strftime('%Y-%m-%d'),
+                    entry.date_to.strftime('%Y-%m-%d'),
+                    entry.author.get_full_name() or entry.author.username,
+                    entry.department.name,
+                    highlights[:500] + '...' if len(highlights) > 500 else highlights,
+                    pendings[:500] + '...' if len(pendings) > 500 else pendings,
+                    challenges[:500] + '...' if len(challenges) > 500 else challenges,
+                    personal[:500] + '...' if len(personal) > 500 else personal,
+                    strategies[:500] + '...' if len(strategies) > 500 else strategies,
+                ])
         
         return response
     
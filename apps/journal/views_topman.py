@@ -4,12 +4,22 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy, reverse
-from django.http import JsonResponse
-from django.db.models import Q, Count
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.db import transaction
+from django.db.models import Q, Count, Max
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from datetime import datetime, timedelta, date
-from .models import WeeklyJournal, TopManagementReport, TopManagementTag
+from .models import WeeklyJournal, TopManagementReport, TopManagementTag, VersionConflict
 from .forms_topman import TopManagementReportForm, TopManagementTagForm, WeekSelectionForm
+from .cache import make_page_etag
+from .tagging import item_state
+from .live import report_channel, tag_snapshot, week_channel, weekly_summary_snapshot
+from apps.web.events import event_stream, request_user
+from apps.web.queries import query_budget
+from apps.web.routers import replica_reads
+from functools import partial
 import json
 
 
@@ -41,6 +51,24 @@ class TopManagementReportListView(AdminRequiredMixin, ListView):
         return TopManagementReport.objects.select_related('created_by').prefetch_related('tagged_items')
 
 
+def report_detail_etag(request, pk):
+    """ETag for the report detail page, changes with the report and its tagged items"""
+    if not is_admin_user(request.user):
+        return None
+    state = TopManagementReport.objects.filter(pk=pk).aggregate(
+        updated_at=Max('updated_at'),
+        last_tag_update=Max('tagged_items__updated_at'),
+        tag_count=Count('tagged_items'),
+    )
+    if state['updated_at'] is None:
+        return None
+    # The page shows how long ago the week started, so it also changes daily
+    return make_page_etag(
+        request, state['updated_at'], state['last_tag_update'], state['tag_count'], date.today()
+    )
+
+
+@method_decorator(condition(etag_func=report_detail_etag), name='dispatch')
 class TopManagementReportDetailView(AdminRequiredMixin, DetailView):
     """View top management report details - Admin only"""
     model = TopManagementReport
@@ -87,10 +115,18 @@ class TopManagementReportUpdateView(AdminRequiredMixin, UpdateView):
     template_name = 'journal/topman/report_form.html'
     
     def form_valid(self, form):
+        try:
+            # Saved only if nobody else saved the report since the form was rendered
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except VersionConflict as conflict:
+            form.add_conflict_error(conflict)
+            return self.render_to_response(self.get_context_data(form=form), status=409)
         messages.success(self.request, "Top Management report updated successfully!")
-        return super().form_valid(form)
+        return response
 
 
+@query_budget(11)
 @staff_member_required
 def topman_tagging_interface(request):
     """Interface for admins to tag journal items for top management"""
@@ -122,14 +158,18 @@ def topman_tagging_interface(request):
     ).select_related('author', 'department').order_by('department__name', 'author__last_name')
     
     # Get already tagged items for this report
-    existing_tags = TopManagementTag.objects.filter(report=report).values_list(
-        'journal_entry_id', 'section', 'item_index'
+    existing_tags = TopManagementTag.objects.filter(report=report).exclude(item_id=None).values_list(
+        'journal_entry_id', 'item_id'
     )
     
     # Create a set for quick lookup of tagged items
     tagged_items = set()
-    for tag in existing_tags:
-        tagged_items.add((tag[0], tag[1], tag[2]))
+    for journal_id, item_id in existing_tags:
+        tagged_items.add((journal_id, item_id.hex))
+    
+    # Keys used by the page script to mark tagged items, since the
+    # item markup itself is fragment-cached without tag state
+    tagged_item_keys = [f"{journal_id}:{item_id}" for journal_id, item_id in tagged_items]
     
     context = {
         'week_form': week_form,
@@ -138,6 +178,7 @@ def topman_tagging_interface(request):
         'report': report,
         'journal_entries': journal_entries,
         'tagged_items': tagged_items,
+        'tagged_item_keys': tagged_item_keys,
         'created_report': created
     }
     
@@ -153,7 +194,8 @@ def ajax_tag_item(request):
     try:
         journal_id = request.POST.get('journal_id')
         section = request.POST.get('section')
-        item_index = int(request.POST.get('item_index'))
+        item_index = int(request.POST.get('item_index', -1))
+        item_id = WeeklyJournal.clean_item_id(request.POST.get('item_id', ''))
         action = request.POST.get('action')  # 'tag' or 'untag'
         report_id = request.POST.get('report_id')
         priority = request.POST.get('priority', 'medium')
@@ -162,21 +204,37 @@ def ajax_tag_item(request):
         journal_entry = get_object_or_404(WeeklyJournal, id=journal_id)
         report = get_object_or_404(TopManagementReport, id=report_id)
         
+        # Tags point at the item id, the index is only used by clients that don't send one
+        if item_id is None:
+            items = getattr(journal_entry, f'get_{section}_list')() if section in WeeklyJournal.SECTION_DEFAULT_STATUS else []
+            if 0 <= item_index < len(items):
+                item_id = WeeklyJournal.clean_item_id(items[item_index].get('id', ''))
+        
         if action == 'tag':
-            # Get the item data based on section
-            items = getattr(journal_entry, f'get_{section}_list')()
-            if item_index < len(items):
-                item = items[item_index]
+            # Tag only what the admin was shown: refuse if the author saved the entry since
+            journal_version = request.POST.get('journal_version', '')
+            if journal_version.isdigit() and int(journal_version) != journal_entry.version:
+                return JsonResponse({
+                    'success': False,
+                    'conflict': True,
+                    'error': 'This journal entry was changed after the page was loaded, reload to see the current items',
+                    'journal_version': journal_entry.version,
+                }, status=409)
+            
+            found = journal_entry.items_by_id().get(item_id)
+            if found is not None:
+                section, item_index, item_text, item_status = item_state(*found)
                 
                 # Create or update tag
                 tag, created = TopManagementTag.objects.get_or_create(
                     journal_entry=journal_entry,
-                    section=section,
-                    item_index=item_index,
+                    item_id=item_id,
                     report=report,
                     defaults={
-                        'item_text': item.get('text', ''),
-                        'item_status': item.get('status', 'not_started'),
+                        'section': section,
+                        'item_index': item_index,
+                        'item_text': item_text,
+                        'item_status': item_status,
                         'tagged_by': request.user,
                         'priority': priority,
                         'admin_note': admin_note
@@ -184,10 +242,10 @@ def ajax_tag_item(request):
                 )
                 
                 if not created:
-                    # Update existing tag
+                    # Update existing tag, leaving the item fields kept current by resync_tags alone
                     tag.priority = priority
                     tag.admin_note = admin_note
-                    tag.save()
+                    tag.save(update_fields=['priority', 'admin_note', 'updated_at'])
                 
                 return JsonResponse({
                     'success': True,
@@ -195,12 +253,11 @@ def ajax_tag_item(request):
                     'created': created
                 })
         
-        elif action == 'untag':
+        elif action == 'untag' and item_id is not None:
             # Remove tag
             TopManagementTag.objects.filter(
                 journal_entry=journal_entry,
-                section=section,
-                item_index=item_index,
+                item_id=item_id,
                 report=report
             ).delete()
             
@@ -215,6 +272,15 @@ def ajax_tag_item(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+async def report_tag_events(request, pk):
+    """Server-sent tag, untag and priority changes of a report, for the tagging page"""
+    if not is_admin_user(await request_user(request)):
+        return HttpResponseForbidden()
+    return event_stream(request, report_channel(pk), snapshot=partial(tag_snapshot, pk))
+
+
+@query_budget(9)
+@replica_reads
 @staff_member_required
 def topman_weekly_summary(request):
     """Generate weekly summary view for top management"""
@@ -284,4 +350,29 @@ def topman_weekly_summary(request):
         'status_summary': status_summary,
     }
     
+    # Counter changes are pushed per ISO week, other ranges stay as rendered
+    if week_start.weekday() == 0 and week_end == week_start + timedelta(days=6):
+        context['live_counters_url'] = f"{reverse('journal:topman_summary_events')}?week={week_start.isoformat()}"
+    
     return render(request, 'journal/topman/weekly_summary.html', context)
+
+
+async def weekly_summary_events(request):
+    """Server-sent changes of the weekly summary counters of the week starting on ?week="""
+    if not is_admin_user(await request_user(request)):
+        return HttpResponseForbidden()
+    try:
+        monday = date.fromisoformat(request.GET.get('week', ''))
+    except ValueError:
+        return HttpResponseBadRequest('week must be a date')
+    if monday.weekday() != 0:
+        return HttpResponseBadRequest('week must be a Monday')
+    
+    # Tags and untags of the week's report change the tagged items counter
+    channels = [week_channel(monday)]
+    report_id = await TopManagementReport.objects.filter(
+        week_start=monday, week_end=monday + timedelta(days=6)
+    ).values_list('pk', flat=True).afirst()
+    if report_id is not None:
+        channels.append(report_channel(report_id))
+    return event_stream(request, *channels, snapshot=partial(weekly_summary_snapshot, monday, report_id))
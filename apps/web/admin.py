@@ -1,3 +1,34 @@
 from django.contrib import admin
+from .models import SlowQuery
 
-# Register your models here.
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'duration_ms', 'view_name', 'short_sql', 'database')
+    list_filter = ('view_name', 'database', 'created_at')
+    search_fields = ('sql', 'path', 'view_name', 'template_location', 'code_location')
+    date_hierarchy = 'created_at'
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    fieldsets = (
+        ('Query', {
+            'fields': ('sql', 'params', 'fingerprint', 'duration_ms', 'database')
+        }),
+        ('Source', {
+            'fields': ('method', 'path', 'view_name', 'template_location', 'code_location')
+        }),
+        ('Plan', {
+            'fields': ('explain',)
+        }),
+        ('Metadata', {
+            'fields': ('id', 'created_at'),
+            'classes': ('collapse',)
+        })
+    )
+
+    def short_sql(self, obj):
+        return obj.sql[:120]
+    short_sql.short_description = 'SQL'
+
+    def has_add_permission(self, request):
+        return False
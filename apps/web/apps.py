@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class WebConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.web'
+
+    def ready(self):
+        from . import checks  # noqa: F401
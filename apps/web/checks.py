@@ -0,0 +1,52 @@
+"""
+System checks for settings that only work within a single process.
+
+Errors stop manage.py commands and, through on_starting in
+docuapp/gunicorn.conf.py, the web server.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+# Cache backends whose data never leaves the process that wrote it
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    """Whether every worker and Celery process sees what one of them caches"""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if settings.WEB_CONCURRENCY > 1 and not cache_is_shared():
+        return [
+            Error(
+                f'The default cache is local to each process, but WEB_CONCURRENCY is {settings.WEB_CONCURRENCY}.',
+                hint=(
+                    'Dashboard invalidation only reaches the worker that handled the change, so the others '
+                    'serve stale pages. Set REDIS_HOST to use the Redis cache, or WEB_CONCURRENCY=1.'
+                ),
+                id='web.E002',
+            )
+        ]
+    return []
+
+
+@register()
+def check_events_backend(app_configs, **kwargs):
+    if settings.EVENTS_BACKEND == 'local' and settings.WEB_CONCURRENCY > 1:
+        return [
+            Error(
+                f"EVENTS_BACKEND is 'local', but WEB_CONCURRENCY is {settings.WEB_CONCURRENCY}.",
+                hint=(
+                    'Events only reach the streams of the worker that published them, so most live '
+                    "updates would be lost. Set REDIS_HOST and DJANGO_EVENTS_BACKEND=redis, or WEB_CONCURRENCY=1."
+                ),
+                id='web.E001',
+            )
+        ]
+    return []
@@ -0,0 +1,267 @@
+"""
+Publish/subscribe for server-sent events.
+
+publish() may be called from any thread, usually from signal handlers after
+the transaction commits. Subscriptions live on the event loop of an ASGI
+worker (see docuapp/asgi.py): event_stream() serves one as a
+text/event-stream response.
+
+The 'local' backend delivers events within the process, which is enough for
+a single node. The 'redis' backend publishes through Redis pub/sub, and each
+process runs one pattern subscription that feeds its local subscribers, so
+every node sees the events of every other node.
+
+Brokers number the events of each channel as they publish them, after
+the change committed: in the process for 'local', with a Redis INCR for
+'redis'. Snapshots read the numbers with read_sequences() before they count,
+and clients skip the events numbered at or below the snapshot's. Neither
+side takes a database lock; a change committing while a snapshot is counted
+may be counted twice until the stream reconnects with a fresh snapshot.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'docuapp:events:'
+# Redis keys of the channels' last event numbers
+SEQUENCE_PREFIX = 'docuapp:events:seq:'
+# Events a slow client may fall behind by before its stream is closed; it
+# reconnects and starts over from a fresh snapshot
+QUEUE_SIZE = 256
+# Sentinel put on a subscriber's queue when it overflowed
+OVERFLOW = object()
+
+
+class Subscription:
+    """Events of some channels for one client, registered until close()"""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        broker.add(self)
+
+    def put(self, event):
+        """Queue an event, called on the subscriber's event loop"""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = OVERFLOW
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """The next event, None when none came within timeout seconds, OVERFLOW if the client fell behind"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBroker:
+    """Delivers events to the subscribers of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._sequences = defaultdict(int)
+
+    def add(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].add(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[channel]
+
+    def subscribe(self, *channels):
+        """Subscribe to channels, must be called on the event loop that reads them"""
+        return Subscription(self, channels)
+
+    def publish(self, channel, event):
+        with self._lock:
+            self._sequences[channel] += 1
+            seq = self._sequences[channel]
+        self.deliver(channel, {**event, 'seq': seq})
+
+    def sequences(self, channels):
+        with self._lock:
+            return {channel: self._sequences.get(channel, 0) for channel in channels}
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                subscription.close()
+
+
+class RedisBroker(LocalBroker):
+    """Fans events out to every process through Redis pub/sub"""
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._client = None
+        self._listeners = {}
+
+    def subscribe(self, *channels):
+        subscription = super().subscribe(*channels)
+        listener = self._listeners.get(subscription.loop)
+        if listener is None or listener.done():
+            self._listeners[subscription.loop] = subscription.loop.create_task(self.listen())
+        return subscription
+
+    @property
+    def client(self):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def publish(self, channel, event):
+        import redis
+
+        try:
+            event = {**event, 'seq': self.client.incr(SEQUENCE_PREFIX + channel)}
+            self.client.publish(CHANNEL_PREFIX + channel, json.dumps(event, cls=DjangoJSONEncoder))
+        except redis.RedisError:
+            # Live updates are best effort, clients resync when they reconnect
+            logger.warning('Could not publish event to %s', channel, exc_info=True)
+
+    def sequences(self, channels):
+        import redis
+
+        try:
+            values = self.client.mget([SEQUENCE_PREFIX + channel for channel in channels])
+        except redis.RedisError:
+            # Nothing is published either, the stream resyncs when it reconnects
+            logger.warning('Could not read the event numbers of %s', channels, exc_info=True)
+            values = [None] * len(channels)
+        return {channel: int(value or 0) for channel, value in zip(channels, values)}
+
+    async def listen(self):
+        """Relay the events of every channel to this process's subscribers, reconnecting on errors"""
+        import redis
+        import redis.asyncio
+
+        while True:
+            client = redis.asyncio.Redis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                    async for message in pubsub.listen():
+                        if message['type'] == 'pmessage':
+                            channel = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                            self.deliver(channel, json.loads(message['data']))
+            except redis.RedisError:
+                logger.warning('Lost the Redis event subscription, reconnecting', exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            if settings.EVENTS_BACKEND == 'redis':
+                _broker = RedisBroker(settings.EVENTS_REDIS_URL)
+            else:
+                _broker = LocalBroker()
+        return _broker
+
+
+def read_sequences(channels):
+    """The number of the last event published on some channels, {channel: seq}"""
+    return get_broker().sequences(channels)
+
+
+def publish(channel, event):
+    """
+    Send an event ({"type": ..., ...}) to the subscribers of a channel. Events
+    are stamped with their channel, so clients subscribed to several can
+    compare an event's "seq" with the snapshot's number for its channel.
+    """
+    get_broker().publish(channel, {**event, 'channel': channel})
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def request_user(request):
+    """The user of an async request, loaded in a thread since the session lookup is sync"""
+    return await sync_to_async(get_user)(request)
+
+
+def event_stream(request, *channels, snapshot=None):
+    """
+    A text/event-stream response with the events of some channels.
+
+    snapshot is an async callable returning the first event, sent once the
+    subscription is in place so no change falls between the two. Browsers
+    reconnect when the stream ends, and get a fresh snapshot, so streams are
+    closed after EVENTS_STREAM_TIMEOUT seconds: Django 4.2 doesn't notice
+    clients that disconnected.
+
+    Streams only work under ASGI; WSGI workers would be held for the whole
+    stream, so they answer 204, which tells EventSource not to reconnect.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(_stream(channels, snapshot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _stream(channels, snapshot):
+    deadline = time.monotonic() + settings.EVENTS_STREAM_TIMEOUT
+    with get_broker().subscribe(*channels) as subscription:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        if snapshot is not None:
+            yield format_event(await snapshot())
+        while (remaining := deadline - time.monotonic()) > 0:
+            event = await subscription.get(min(settings.EVENTS_KEEPALIVE, remaining))
+            if event is OVERFLOW:
+                return
+            # Comments keep proxies from closing idle streams
+            yield ': keepalive\n\n' if event is None else format_event(event)
@@ -0,0 +1,184 @@
+"""
+Per-request instrumentation: view, template, database, cache and serialization timings
+"""
+import time
+from collections import defaultdict
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.template.base import Template
+
+from .queries import wrap_connections
+
+
+# Profile of the request being handled by the current thread, None when not sampled
+_current_profile = ContextVar('request_profile', default=None)
+
+_MISSING = object()
+_hooks_installed = False
+
+
+class RequestProfile:
+    """Timings collected while handling one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_duration = 0.0
+        self.db_queries = 0
+        self.db_duration = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.templates = defaultdict(lambda: [0, 0.0])
+        self.sections = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper hook counting queries and their time"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_duration += time.perf_counter() - start
+
+    def as_dict(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 2),
+            'view_ms': round(self.view_duration * 1000, 2),
+            'db_ms': round(self.db_duration * 1000, 2),
+            'db_queries': self.db_queries,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'templates': {
+                name: {'renders': count, 'ms': round(duration * 1000, 2)}
+                for name, (count, duration) in self.templates.items()
+            },
+            'sections': {name: round(duration * 1000, 2) for name, duration in self.sections.items()},
+        }
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+@contextmanager
+def activate(profile):
+    """Make profile the one collecting timings for the current request"""
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def request_profile():
+    """
+    Collect a RequestProfile for the current request, counting queries on
+    every database connection. Reuses the profile already active, so stacked
+    middlewares share one profile instead of counting queries twice.
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        yield profile
+        return
+    profile = RequestProfile()
+    with activate(profile), ExitStack() as stack:
+        wrap_connections(stack, profile)
+        yield profile
+
+
+@asynccontextmanager
+async def arequest_profile():
+    """request_profile() for async requests, counting the queries of the thread running their sync code"""
+    profile = _current_profile.get()
+    if profile is not None:
+        yield profile
+        return
+    profile = RequestProfile()
+    with activate(profile), ExitStack() as stack:
+        await sync_to_async(wrap_connections)(stack, profile)
+        yield profile
+
+
+@contextmanager
+def timed(section):
+    """
+    Time a block of code under a named section of the current request profile,
+    e.g. ``with timed('serialization'):``. Does nothing when the request isn't sampled.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[section] += time.perf_counter() - start
+
+
+def install_hooks():
+    """Wrap template rendering and the configured cache backends, once per process"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    original_render = Template._render
+
+    def instrumented_render(template, context):
+        profile = _current_profile.get()
+        if profile is None:
+            return original_render(template, context)
+        start = time.perf_counter()
+        try:
+            return original_render(template, context)
+        finally:
+            # Inclusive of nested {% include %} and {% extends %} templates
+            stats = profile.templates[template.origin.template_name or template.origin.name]
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+
+    Template._render = instrumented_render
+
+    for alias in settings.CACHES:
+        instrument_cache_class(type(caches[alias]))
+
+
+def instrument_cache_class(cache_class):
+    """Count hits and misses of get() and get_many() on a cache backend class"""
+    if getattr(cache_class, '_instrumented', False):
+        return
+    original_get = cache_class.get
+
+    def get(self, key, default=None, version=None):
+        value = original_get(self, key, _MISSING, version=version)
+        profile = _current_profile.get()
+        if profile is not None:
+            if value is _MISSING:
+                profile.cache_misses += 1
+            else:
+                profile.cache_hits += 1
+        return default if value is _MISSING else value
+
+    cache_class.get = get
+    cache_class._instrumented = True
+
+    # The default get_many() calls get() per key, which is already counted
+    if 'get_many' not in cache_class.__dict__:
+        return
+    original_get_many = cache_class.get_many
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = original_get_many(self, keys, version=version)
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.cache_hits += len(found)
+            profile.cache_misses += len(keys) - len(found)
+        return found
+
+    cache_class.get_many = get_many
@@ -0,0 +1,129 @@
+"""
+Management command to benchmark template compile and render times
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.engine import Engine
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.web.templating import warm_template_cache, record_template_renders
+
+
+# Pages rendered for the render benchmark; (url name, query string, staff only)
+BENCHMARK_PAGES = [
+    ('journal:dashboard', '', False),
+    ('journal:list', '', False),
+    ('journal:summary_report', '', False),
+    ('journal:summary_report', 'group_by=department', False),
+    ('journal:export_summary', 'format=html', False),
+    ('journal:topman_report_list', '', True),
+    ('journal:topman_tagging', '', True),
+    ('journal:topman_summary', '', True),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark template compile times and per-template render times'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            type=str,
+            help='User to render the pages as (defaults to the first superuser)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of times each template is compiled and each page rendered'
+        )
+        parser.add_argument(
+            '--compile-only',
+            action='store_true',
+            help='Only measure template compile times'
+        )
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+
+        self.benchmark_compile(repeat)
+        if not options['compile_only']:
+            self.benchmark_render(self.get_user(options['username']), repeat)
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist.')
+        user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No superuser found, pass --username.')
+        return user
+
+    def benchmark_compile(self, repeat):
+        """Compare parsing every template from disk with a lookup in the cached loader"""
+        engine = engines['django'].engine
+        loaders = ['django.template.loaders.filesystem.Loader']
+        if engine.app_dirs or settings.TEMPLATE_PRODUCTION_MODE:
+            loaders.append('django.template.loaders.app_directories.Loader')
+        uncached = Engine(dirs=engine.dirs, loaders=loaders, libraries=engine.libraries)
+
+        # Templates that fail to compile are logged by the warm-up and skipped here
+        compiled = warm_template_cache()
+
+        self.stdout.write(self.style.SUCCESS('=== Template compile times (ms) ==='))
+        self.stdout.write(f'{"Template":<50} {"parse":>10} {"cached":>10}')
+        for name in compiled:
+            parse_times = []
+            cached_times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                uncached.get_template(name)
+                parse_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                engines['django'].get_template(name)
+                cached_times.append(time.perf_counter() - start)
+            self.stdout.write(
+                f'{name:<50} {statistics.mean(parse_times) * 1000:>10.2f} '
+                f'{statistics.mean(cached_times) * 1000:>10.2f}'
+            )
+        if not settings.TEMPLATE_PRODUCTION_MODE:
+            self.stdout.write(self.style.WARNING(
+                'TEMPLATE_PRODUCTION_MODE is off, set DJANGO_TEMPLATE_PRODUCTION_MODE=True '
+                'to measure the production loader.'
+            ))
+
+    def benchmark_render(self, user, repeat):
+        """Render the main journal pages and report the time spent in each template"""
+        client = Client()
+        client.force_login(user)
+
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            with record_template_renders() as timings:
+                for url_name, query, staff_only in BENCHMARK_PAGES:
+                    if staff_only and not (user.is_staff or user.is_superuser):
+                        continue
+                    url = reverse(url_name)
+                    if query:
+                        url = f'{url}?{query}'
+                    for _ in range(repeat):
+                        response = client.get(url)
+                        if response.status_code != 200:
+                            raise CommandError(f'{url} returned {response.status_code}')
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('=== Template render times (ms, inclusive) ==='))
+        self.stdout.write(f'{"Template":<50} {"renders":>8} {"mean":>10} {"p50":>10} {"max":>10}')
+        for name, durations in sorted(timings.items(), key=lambda item: -sum(item[1])):
+            self.stdout.write(
+                f'{name:<50} {len(durations):>8} {statistics.mean(durations) * 1000:>10.2f} '
+                f'{statistics.median(durations) * 1000:>10.2f} {max(durations) * 1000:>10.2f}'
+            )
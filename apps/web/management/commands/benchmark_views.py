@@ -0,0 +1,276 @@
+"""
+Management command to benchmark the hot views against generated datasets
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentHistory
+from apps.journal.models import JournalComment, TopManagementTag, WeeklyJournal
+
+
+# Generated data uses this prefix so it can be told apart from real data
+BENCHMARK_PREFIX = 'bench'
+
+# Views to benchmark; (name, url name, query string, user role)
+# Roles: admin is a superuser, member the author with the most journals,
+# document_owner the user with the most documents.
+BENCHMARK_CASES = [
+    ('dashboard', 'journal:dashboard', '', 'member'),
+    ('journal_list', 'journal:list', '', 'member'),
+    ('journal_list_search', 'journal:list', 'search=budget', 'member'),
+    ('summary_report_date', 'journal:summary_report', 'group_by=date&date_from={month_ago}', 'admin'),
+    ('summary_report_department', 'journal:summary_report', 'group_by=department&date_from={month_ago}', 'admin'),
+    ('summary_report_author', 'journal:summary_report', 'group_by=author&date_from={month_ago}', 'admin'),
+    ('export_summary_csv', 'journal:export_summary', 'format=csv&date_from={month_ago}', 'admin'),
+    ('export_summary_html', 'journal:export_summary', 'format=html&date_from={month_ago}', 'admin'),
+    ('topman_tagging_interface', 'journal:topman_tagging', '', 'admin'),
+    ('topman_weekly_summary', 'journal:topman_summary', '', 'admin'),
+    ('department_analytics', 'journal:department_analytics', 'weeks=12', 'admin'),
+    ('long_running_items', 'journal:long_running_items', '', 'admin'),
+    ('document_list', 'document_list', '', 'document_owner'),
+    ('document_history', 'document_history', '', 'document_owner'),
+]
+
+# A case regresses when its p50 grows by more than this fraction, or it runs more queries
+REGRESSION_THRESHOLD = 0.2
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark latency, query counts and peak memory of the hot views and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='0.1,0.5,1',
+            help='Comma separated generate_load_data scale factors to benchmark'
+        )
+        parser.add_argument('--weeks', type=int, default=26, help='Weeks of journals in each dataset')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for the generated datasets')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed requests per view')
+        parser.add_argument('--output', type=str, default='benchmark_views.json', help='JSON file for the results')
+        parser.add_argument(
+            '--current-db',
+            action='store_true',
+            help='Benchmark the data already in the database instead of generating datasets in a test database'
+        )
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--only', type=str, help='Comma separated case names to run')
+        parser.add_argument('--compare', type=str, help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        self.repeat = max(options['repeat'], 1)
+        self.cold_cache = options['cold_cache']
+        self.cases = BENCHMARK_CASES
+        if options['only']:
+            names = set(options['only'].split(','))
+            self.cases = [case for case in BENCHMARK_CASES if case[0] in names]
+            if not self.cases:
+                raise CommandError('No benchmark case matches --only.')
+
+        results = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'repeat': self.repeat,
+                'cold_cache': self.cold_cache,
+                'seed': options['seed'],
+            },
+            'datasets': [],
+        }
+
+        if options['current_db']:
+            results['datasets'].append(self.benchmark_dataset(None))
+        else:
+            try:
+                sizes = [float(size) for size in options['sizes'].split(',') if size.strip()]
+            except ValueError:
+                raise CommandError('--sizes must be a comma separated list of numbers.')
+            old_name = settings.DATABASES['default']['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                for scale in sizes:
+                    self.stdout.write(f'Generating dataset at scale {scale}...')
+                    call_command(
+                        'generate_load_data', scale=scale, weeks=options['weeks'], seed=options['seed'],
+                        prefix=BENCHMARK_PREFIX, reset=True, stdout=StringIO(),
+                    )
+                    results['datasets'].append(self.benchmark_dataset(scale))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def get_users(self):
+        """Pick the user for each role, preferring generated data"""
+        users = User.objects.filter(username__startswith=f'{BENCHMARK_PREFIX}_')
+        if not users.exists():
+            users = User.objects.all()
+        admin = users.filter(is_superuser=True).order_by('pk').first()
+        member = users.annotate(entries=Count('journal_entries')).order_by('-entries', 'pk').first()
+        owner_ids = (
+            Document.objects.filter(created_by__in=users).values('created_by')
+            .annotate(documents=Count('id')).order_by('-documents').values_list('created_by', flat=True)
+        )
+        owner = users.filter(pk__in=owner_ids[:1]).first() or member
+        if admin is None or member is None:
+            raise CommandError('The benchmark needs at least one superuser and one other user.')
+        return {'admin': admin, 'member': member, 'document_owner': owner}
+
+    def dataset_counts(self):
+        return {
+            'users': User.objects.count(),
+            'journals': WeeklyJournal.objects.count(),
+            'comments': JournalComment.objects.count(),
+            'tags': TopManagementTag.objects.count(),
+            'documents': Document.objects.count(),
+            'document_history': DocumentHistory.objects.count(),
+        }
+
+    def benchmark_dataset(self, scale):
+        counts = self.dataset_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Dataset {"current" if scale is None else f"scale {scale}"}: '
+            + ', '.join(f'{count} {name}' for name, count in counts.items()) + ' ==='
+        ))
+        self.stdout.write(
+            f'{"Case":<28} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"max ms":>9} '
+            f'{"queries":>8} {"peak KB":>9} {"bytes":>10}'
+        )
+
+        users = self.get_users()
+        clients = {}
+        for role, user in users.items():
+            clients[role] = Client()
+            clients[role].force_login(user)
+
+        month_ago = (date.today() - timedelta(days=28)).isoformat()
+        case_results = []
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            for name, url_name, query, role in self.cases:
+                url = reverse(url_name)
+                if query:
+                    url = f'{url}?{query.format(month_ago=month_ago)}'
+                result = self.benchmark_case(clients[role], url)
+                result.update({'name': name, 'url': url, 'user': role})
+                case_results.append(result)
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f'{name:<28} {latency["p50"]:>9.1f} {latency["p90"]:>9.1f} {latency["p99"]:>9.1f} '
+                    f'{latency["max"]:>9.1f} {result["queries"]:>8} {result["peak_memory_kb"]:>9.0f} '
+                    f'{result["bytes"]:>10}'
+                )
+        return {'scale': scale, 'counts': counts, 'results': case_results}
+
+    def request(self, client, url):
+        if self.cold_cache:
+            cache.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        # Consume streaming responses so their rendering is part of the measurement
+        return b''.join(response) if response.streaming else response.content
+
+    def benchmark_case(self, client, url):
+        """Measure one URL: a warm-up request, the timed requests, then one traced for memory"""
+        self.request(client, url)
+
+        durations = []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                content = self.request(client, url)
+                durations.append((time.perf_counter() - start) * 1000)
+            # Read the count now, the next request resets the connection's query log
+            query_count = len(queries)
+
+        # tracemalloc slows everything down, so memory is measured on a separate request
+        tracemalloc.start()
+        try:
+            self.request(client, url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        durations.sort()
+        return {
+            'status': 200,
+            'latency_ms': {
+                'mean': statistics.mean(durations),
+                'min': durations[0],
+                'p50': percentile(durations, 50),
+                'p90': percentile(durations, 90),
+                'p99': percentile(durations, 99),
+                'max': durations[-1],
+            },
+            'queries': query_count,
+            'peak_memory_kb': peak / 1024,
+            'bytes': len(content),
+        }
+
+    def compare(self, path, results):
+        """Print the cases that got slower or run more queries than in an earlier run"""
+        try:
+            with open(path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+        baseline = {
+            (dataset['scale'], case['name']): case
+            for dataset in previous.get('datasets', []) for case in dataset['results']
+        }
+        regressions = 0
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'=== Compared with {path} ==='))
+        for dataset in results['datasets']:
+            for case in dataset['results']:
+                old = baseline.get((dataset['scale'], case['name']))
+                if old is None:
+                    continue
+                old_p50, new_p50 = old['latency_ms']['p50'], case['latency_ms']['p50']
+                change = (new_p50 - old_p50) / old_p50 if old_p50 else 0
+                slower = change > REGRESSION_THRESHOLD
+                more_queries = case['queries'] > old['queries']
+                line = (
+                    f'scale {dataset["scale"]} {case["name"]:<28} p50 {old_p50:.1f} -> {new_p50:.1f} ms '
+                    f'({change:+.0%}), queries {old["queries"]} -> {case["queries"]}'
+                )
+                if slower or more_queries:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'{regressions} regression(s) found')
@@ -0,0 +1,21 @@
+"""
+Management command to delete old slow query records
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.web.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = 'Delete slow query records older than the given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep records from the last N days')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = SlowQuery.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} slow query records older than {options["days"]} days'))
@@ -0,0 +1,142 @@
+"""
+Prometheus metrics for requests, database, cache, exports and Celery tasks.
+
+With the PROMETHEUS_MULTIPROC_DIR environment variable set, every process
+writes its samples to files in that directory and /metrics aggregates them,
+so the numbers stay correct under a prefork server (see docuapp/gunicorn.conf.py).
+"""
+import os
+import time
+
+from django.conf import settings
+
+# Metrics are disabled when prometheus_client is not installed
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Histogram
+    from prometheus_client.core import GaugeMetricFamily
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+
+# Views whose response size is recorded as an export job size
+EXPORT_VIEW_NAMES = {'journal:export_summary', 'export_document'}
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram(
+        'docuapp_request_duration_seconds',
+        'Request latency by URL name',
+        ['view', 'method', 'status'],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    REQUEST_QUERIES = Histogram(
+        'docuapp_request_db_queries',
+        'Database queries per request by URL name',
+        ['view'],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )
+    REQUEST_DB_SECONDS = Histogram(
+        'docuapp_request_db_duration_seconds',
+        'Time spent in database queries per request by URL name',
+        ['view'],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+    CACHE_REQUESTS = Counter(
+        'docuapp_cache_requests_total',
+        'Cache lookups by URL name and result (hit or miss)',
+        ['view', 'result'],
+    )
+    EXPORT_SIZE = Histogram(
+        'docuapp_export_size_bytes',
+        'Size of generated exports by URL name',
+        ['view', 'format'],
+        buckets=(1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8),
+    )
+    TASK_DURATION = Histogram(
+        'docuapp_celery_task_duration_seconds',
+        'Celery task run time by task name and final state',
+        ['task', 'state'],
+        buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+    )
+
+
+def metrics_available():
+    return prometheus_client is not None and getattr(settings, 'METRICS_ENABLED', False)
+
+
+def observe_request(request, response, duration, profile):
+    """Record the metrics of a finished request"""
+    match = request.resolver_match
+    # Unresolved paths share one label so scanners can't blow up the label cardinality
+    view = match.view_name if match else '<unresolved>'
+    REQUEST_LATENCY.labels(view, request.method, f'{response.status_code // 100}xx').observe(duration)
+    REQUEST_QUERIES.labels(view).observe(profile.db_queries)
+    REQUEST_DB_SECONDS.labels(view).observe(profile.db_duration)
+    if profile.cache_hits:
+        CACHE_REQUESTS.labels(view, 'hit').inc(profile.cache_hits)
+    if profile.cache_misses:
+        CACHE_REQUESTS.labels(view, 'miss').inc(profile.cache_misses)
+    if view in EXPORT_VIEW_NAMES and response.status_code == 200:
+        # Streamed exports are only counted when they declare their size
+        size = response.get('Content-Length') if response.streaming else len(response.content)
+        if size is not None:
+            EXPORT_SIZE.labels(view, request.GET.get('format', 'html')).observe(int(size))
+
+
+class CeleryQueueCollector:
+    """Report the length of the Celery queues on the Redis broker at scrape time"""
+
+    def collect(self):
+        gauge = GaugeMetricFamily('docuapp_celery_queue_length', 'Tasks waiting in each Celery queue', labels=['queue'])
+        broker_url = getattr(settings, 'CELERY_BROKER_URL', '')
+        if broker_url.startswith(('redis://', 'rediss://')):
+            import redis
+
+            try:
+                client = redis.Redis.from_url(broker_url, socket_timeout=1, socket_connect_timeout=1)
+                for queue in settings.METRICS_CELERY_QUEUES:
+                    gauge.add_metric([queue], client.llen(queue))
+            except redis.RedisError:
+                pass
+        yield gauge
+
+
+def generate_metrics():
+    """Return the exposition text for all processes, plus the queue lengths"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        output = prometheus_client.generate_latest(registry)
+    else:
+        output = prometheus_client.generate_latest(prometheus_client.REGISTRY)
+
+    queue_registry = CollectorRegistry()
+    queue_registry.register(CeleryQueueCollector())
+    return output + prometheus_client.generate_latest(queue_registry)
+
+
+def connect_celery_signals():
+    """Time Celery tasks; called from the Celery app so it runs in the workers"""
+    if prometheus_client is None:
+        return
+    from celery.signals import task_prerun, task_postrun
+
+    started = {}
+
+    def on_prerun(task_id=None, **kwargs):
+        started[task_id] = time.perf_counter()
+
+    def on_postrun(task_id=None, task=None, state=None, **kwargs):
+        start = started.pop(task_id, None)
+        if start is not None:
+            TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - start)
+
+    task_prerun.connect(on_prerun, weak=False)
+    task_postrun.connect(on_postrun, weak=False)
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of a dead worker process in multiprocess mode"""
+    if prometheus_client is not None and 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
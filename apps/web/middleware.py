@@ -0,0 +1,388 @@
+import cProfile
+import io
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import pstats
+import random
+import re
+import time
+from contextlib import AsyncExitStack, ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .instrumentation import arequest_profile, current_profile, install_hooks, request_profile
+from .metrics import metrics_available, observe_request
+from .queries import QueryBudgetExceeded, QueryRecorder, get_view_budget, wrap_connections
+from .routers import pin_to_primary, replica_enabled
+from .slowqueries import SlowQueryCollector, save_slow_queries
+
+
+logger = logging.getLogger(__name__)
+instrumentation_logger = logging.getLogger('apps.web.instrumentation')
+
+
+# Cache-Control for fingerprinted files, their content never changes under the same name
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([a-z*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.IGNORECASE)
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs in the mode of the handler it wraps, like
+    Django's own: under ASGI, Django would otherwise run the rest of the chain
+    in a thread for each sync middleware. __call__ returns __acall__(request)
+    when async_mode is set.
+
+    The queries of an async request run on the one thread that runs its sync
+    code, so __acall__ installs query wrappers there, through sync_to_async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class StaticFilesMiddleware(HybridMiddleware):
+    """
+    Serve collected static files from STATIC_ROOT inside the app process.
+
+    Meant for deployments without a CDN or web server in front. Picks the
+    pre-compressed .br/.gz variant written by collectstatic when the client
+    accepts it, and marks fingerprinted files as cacheable forever.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.static_url = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.static_root = str(settings.STATIC_ROOT)
+        self.max_age = getattr(settings, 'STATIC_CACHE_MAX_AGE', 60)
+        self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.static_url):
+            response = self.serve(request, request.path_info[len(self.static_url):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.static_url):
+            # The file lookups block, so they run in a thread
+            response = await sync_to_async(self.serve, thread_sensitive=False)(
+                request, request.path_info[len(self.static_url):]
+            )
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def serve(self, request, name):
+        """Return a response for the static file, or None to fall through to the views"""
+        name = posixpath.normpath(name).lstrip('/')
+        try:
+            path = safe_join(self.static_root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+            self.set_cache_headers(response, name)
+            return response
+
+        content_type, _ = mimetypes.guess_type(path)
+        served_path, content_encoding = self.pick_variant(request, path)
+
+        response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding'
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+        self.set_cache_headers(response, name)
+        return response
+
+    def set_cache_headers(self, response, name):
+        if name in self.hashed_names:
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = f'public, max-age={self.max_age}'
+
+    def pick_variant(self, request, path):
+        """Return the path to serve and its Content-Encoding, preferring brotli over gzip"""
+        accepted = self.accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+    @staticmethod
+    def accepted_encodings(header):
+        encodings = set()
+        for part in header.split(','):
+            match = ACCEPT_ENCODING_RE.match(part)
+            if not match:
+                continue
+            encoding, quality = match.group(1).lower(), match.group(2)
+            try:
+                if quality is not None and float(quality) == 0:
+                    continue
+            except ValueError:
+                continue
+            encodings.add(encoding)
+        return encodings
+
+
+class QueryInspectorMiddleware(HybridMiddleware):
+    """
+    Record the SQL queries of every request, for development and tests.
+
+    Adds X-Query-Count and X-Query-Duration headers, logs query shapes that
+    repeat often enough to be N+1 patterns along with the template line or
+    code that ran them, and reports views going over their query_budget.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.raise_on_budget = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.query_budget = None
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        request.query_budget = None
+        with ExitStack() as stack:
+            recorder = await sync_to_async(stack.enter_context)(QueryRecorder())
+            response = await self.get_response(request)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Duration'] = f'{recorder.duration * 1000:.1f}ms'
+        for group in recorder.n_plus_one():
+            logger.warning('Possible N+1 on %s: %s', request.path, group)
+
+        budget = request.query_budget
+        if budget is not None and recorder.count > budget:
+            message = f'{request.path} ran {recorder.count} queries, over its budget of {budget}'
+            if self.raise_on_budget:
+                raise QueryBudgetExceeded(f'{message}\n{recorder.report()}')
+            logger.error(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_view_budget(view_func)
+
+
+class InstrumentationMiddleware(HybridMiddleware):
+    """
+    Record where the time goes in a sample of requests.
+
+    Sampled requests get a RequestProfile with view, per-template, database,
+    cache and serialization timings, logged as one JSON line. Staff users can
+    send an X-Profile header to get a cProfile dump of the view, sampled or not: "text" returns
+    the top functions instead of the page, any other value writes a .prof file
+    to INSTRUMENTATION_PROFILE_DIR and names it in the X-Profile-File header.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0.01)
+        self.profile_dir = getattr(settings, 'INSTRUMENTATION_PROFILE_DIR', None)
+        install_hooks()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.profiler = None
+        request.view_started = None
+        with ExitStack() as stack:
+            # Only sampled requests are timed. The X-Profile header doesn't bypass the
+            # sampling: it is honoured in process_view, once the user is known to be staff
+            profile = stack.enter_context(request_profile()) if random.random() < self.sample_rate else None
+            response = self.get_response(request)
+            if profile is not None and request.view_started is not None:
+                profile.view_duration = time.perf_counter() - request.view_started
+            if request.profiler is not None:
+                request.profiler.disable()
+
+        if profile is not None:
+            self.log(request, response, profile)
+        if request.profiler is not None:
+            return self.profiler_response(request, response)
+        return response
+
+    async def __acall__(self, request):
+        request.profiler = None
+        request.view_started = None
+        async with AsyncExitStack() as stack:
+            sampled = random.random() < self.sample_rate
+            profile = await stack.enter_async_context(arequest_profile()) if sampled else None
+            response = await self.get_response(request)
+            if profile is not None and request.view_started is not None:
+                profile.view_duration = time.perf_counter() - request.view_started
+            if request.profiler is not None:
+                # process_view runs in the request's thread, and profilers are stopped
+                # on the thread they were started on
+                await sync_to_async(request.profiler.disable)()
+
+        # Logging loads the user, and profiler_response writes files
+        if profile is not None:
+            await sync_to_async(self.log)(request, response, profile)
+        if request.profiler is not None:
+            return await sync_to_async(self.profiler_response)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The view time includes rendering its template response
+        if current_profile() is not None:
+            request.view_started = time.perf_counter()
+        if request.META.get('HTTP_X_PROFILE') and request.user.is_staff:
+            request.profiler = cProfile.Profile()
+            request.profiler.enable()
+        return None
+
+    def log(self, request, response, profile):
+        match = request.resolver_match
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user_id': request.user.pk if hasattr(request, 'user') else None,
+        }
+        data.update(profile.as_dict())
+        instrumentation_logger.info(json.dumps(data, sort_keys=True))
+
+    def profiler_response(self, request, response):
+        stats = pstats.Stats(request.profiler)
+        if request.META['HTTP_X_PROFILE'] == 'text':
+            output = io.StringIO()
+            stats.stream = output
+            stats.sort_stats('cumulative').print_stats(50)
+            return HttpResponse(output.getvalue(), content_type='text/plain')
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        view_name = request.resolver_match.view_name if request.resolver_match else 'unknown'
+        filename = f'{time.strftime("%Y%m%d-%H%M%S")}-{view_name.replace(":", "-")}-{os.getpid()}.prof'
+        stats.dump_stats(os.path.join(self.profile_dir, filename))
+        response['X-Profile-File'] = filename
+        return response
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record request latency, database queries, cache lookups and export sizes for /metrics"""
+
+    def __init__(self, get_response):
+        if not metrics_available():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        install_hooks()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with request_profile() as profile:
+            response = self.get_response(request)
+        observe_request(request, response, time.perf_counter() - start, profile)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        async with arequest_profile() as profile:
+            response = await self.get_response(request)
+        observe_request(request, response, time.perf_counter() - start, profile)
+        return response
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """
+    Catch queries slower than SLOW_QUERY_THRESHOLD_MS and store them with the
+    view, template line and code that ran them and their EXPLAIN output.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.threshold_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200)
+        self.max_queries = getattr(settings, 'SLOW_QUERY_MAX_PER_REQUEST', 20)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        collector = SlowQueryCollector(self.threshold_ms, self.max_queries)
+        with ExitStack() as stack:
+            wrap_connections(stack, collector)
+            response = self.get_response(request)
+        if collector.captured:
+            save_slow_queries(request, collector.captured)
+        return response
+
+    async def __acall__(self, request):
+        collector = SlowQueryCollector(self.threshold_ms, self.max_queries)
+        with ExitStack() as stack:
+            await sync_to_async(wrap_connections)(stack, collector)
+            response = await self.get_response(request)
+        if collector.captured:
+            await sync_to_async(save_slow_queries)(request, collector.captured)
+        return response
+
+
+class ReplicaPinningMiddleware(HybridMiddleware):
+    """
+    Read-your-writes for replica routing: a POST (or other unsafe method) sets
+    a cookie that keeps the client's reads on the primary for
+    DATABASE_REPLICA_PIN_SECONDS, covering the replication lag.
+    """
+
+    UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replica_enabled():
+            return self.get_response(request)
+        writing = request.method in self.UNSAFE_METHODS
+        with pin_to_primary(writing or settings.DATABASE_REPLICA_PIN_COOKIE in request.COOKIES):
+            response = self.get_response(request)
+        return self.pin(request, response, writing)
+
+    async def __acall__(self, request):
+        if not replica_enabled():
+            return await self.get_response(request)
+        writing = request.method in self.UNSAFE_METHODS
+        # The pin is a context variable, seen by the threads running the request's sync code
+        with pin_to_primary(writing or settings.DATABASE_REPLICA_PIN_COOKIE in request.COOKIES):
+            response = await self.get_response(request)
+        return self.pin(request, response, writing)
+
+    def pin(self, request, response, writing):
+        if writing:
+            response.set_cookie(
+                settings.DATABASE_REPLICA_PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('fingerprint', models.CharField(db_index=True, help_text='Hash of the query shape, equal for queries that only differ in parameters', max_length=32)),
+                ('duration_ms', models.FloatField(db_index=True)),
+                ('database', models.CharField(default='default', max_length=50)),
+                ('method', models.CharField(blank=True, max_length=10)),
+                ('path', models.CharField(blank=True, max_length=500)),
+                ('view_name', models.CharField(blank=True, db_index=True, max_length=200)),
+                ('template_location', models.CharField(blank=True, max_length=300)),
+                ('code_location', models.CharField(blank=True, max_length=300)),
+                ('explain', models.TextField(blank=True, help_text='Query plan captured after the request')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Slow Query',
+                'verbose_name_plural': 'Slow Queries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSequence',
+            fields=[
+                ('channel', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
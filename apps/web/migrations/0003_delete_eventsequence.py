@@ -0,0 +1,16 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0002_eventsequence'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='EventSequence',
+        ),
+    ]
@@ -1,3 +1,28 @@
 from django.db import models
 
-# Create your models here.
+
+class SlowQuery(models.Model):
+    """A database query that took longer than SLOW_QUERY_THRESHOLD_MS during a request"""
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    fingerprint = models.CharField(max_length=32, db_index=True, help_text="Hash of the query shape, equal for queries that only differ in parameters")
+    duration_ms = models.FloatField(db_index=True)
+    database = models.CharField(max_length=50, default='default')
+
+    # Where the query came from
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    view_name = models.CharField(max_length=200, blank=True, db_index=True)
+    template_location = models.CharField(max_length=300, blank=True)
+    code_location = models.CharField(max_length=300, blank=True)
+
+    explain = models.TextField(blank=True, help_text="Query plan captured after the request")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f}ms {self.view_name or self.path}: {self.sql[:80]}"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Slow Query"
+        verbose_name_plural = "Slow Queries"
@@ -0,0 +1,189 @@
+"""
+Per-request SQL query recording and N+1 detection
+"""
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+from django.urls import resolve
+
+
+# Collapse "IN (%s, %s, %s)" so lookups over different numbers of ids group together
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*%s\s*,)*\s*%s\s*\)', re.IGNORECASE)
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Frames from these paths are never reported as the cause of a query
+IGNORED_PATHS = (
+    os.path.dirname(__file__) + os.sep + 'queries.py',
+    os.sep + 'site-packages' + os.sep,
+    os.sep + 'dist-packages' + os.sep,
+    os.path.dirname(os.__file__),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request runs more queries than its view's budget"""
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of queries a view may run.
+
+    Works on function views and on class-based views (decorate the class).
+    QueryInspectorMiddleware and QueryBudgetMixin check requests against it.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_view_budget(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None and hasattr(view_func, 'view_class'):
+        budget = getattr(view_func.view_class, 'query_budget', None)
+    return budget
+
+
+def normalize_sql(sql):
+    """Return the query shape, so queries that only differ in parameters compare equal"""
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return LITERAL_RE.sub('?', sql)
+
+
+def find_source():
+    """
+    Return (template location, code location) for the query being executed.
+
+    The template location is the innermost template node being rendered, the
+    code location the innermost frame in project code.
+    """
+    template_location = None
+    code_location = None
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None and (template_location is None or code_location is None):
+        code = frame.f_code
+        if template_location is None and code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node) and node.origin is not None and node.token is not None:
+                template_location = f'{node.origin.template_name}:{node.token.lineno}'
+        if code_location is None:
+            filename = code.co_filename
+            if filename.startswith(base_dir) and not any(path in filename for path in IGNORED_PATHS):
+                code_location = f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return template_location, code_location
+
+
+def wrap_connections(stack, wrapper):
+    """
+    Install an execute_wrapper on every database connection until the stack
+    closes. Connections belong to a thread, so async code calls this through
+    sync_to_async, on the thread its queries run on.
+    """
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+
+
+class QueryGroup:
+    """Queries of the same shape, with where they were run from"""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.duration = 0.0
+        self.sources = Counter()
+
+    @property
+    def source(self):
+        return self.sources.most_common(1)[0][0]
+
+    def __str__(self):
+        return f'{self.count}x {self.duration * 1000:.1f}ms from {self.source}: {self.shape[:200]}'
+
+
+class QueryRecorder:
+    """
+    Record every query run on all database connections while active.
+
+    Use as a context manager; ``n_plus_one()`` returns the query shapes run
+    often enough to look like a query per row.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        self.groups = {}
+        self.count = 0
+        self.duration = 0.0
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        wrap_connections(self._stack, self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - start)
+
+    def record(self, sql, duration):
+        shape = normalize_sql(sql)
+        group = self.groups.get(shape)
+        if group is None:
+            group = self.groups[shape] = QueryGroup(shape)
+        template_location, code_location = find_source()
+        group.count += 1
+        group.duration += duration
+        group.sources[template_location or code_location or 'unknown'] += 1
+        self.count += 1
+        self.duration += duration
+
+    def n_plus_one(self):
+        """Query groups repeated at least ``threshold`` times, most frequent first"""
+        groups = [group for group in self.groups.values() if group.count >= self.threshold]
+        return sorted(groups, key=lambda group: -group.count)
+
+    def report(self):
+        lines = [f'{self.count} queries in {self.duration * 1000:.1f}ms']
+        lines.extend(f'  possible N+1: {group}' for group in self.n_plus_one())
+        return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin with query budget and N+1 assertions"""
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries=None, allow_n_plus_one=False, threshold=None):
+        """
+        Fail when the block runs more than max_queries queries, or repeats a
+        query shape at least threshold times unless allow_n_plus_one is set.
+        """
+        with QueryRecorder(threshold) as recorder:
+            yield recorder
+        if max_queries is not None and recorder.count > max_queries:
+            self.fail(f'Query budget of {max_queries} exceeded: {recorder.report()}')
+        if not allow_n_plus_one and recorder.n_plus_one():
+            self.fail(f'Possible N+1 queries: {recorder.report()}')
+
+    def assertViewWithinBudget(self, url, **kwargs):
+        """GET a URL and check it against the budget declared on its view"""
+        budget = get_view_budget(resolve(url.split('?')[0]).func)
+        if budget is None:
+            self.fail(f'No query budget declared for the view behind {url}')
+        with self.assertQueryBudget(budget, **kwargs):
+            response = self.client.get(url)
+        return response
+
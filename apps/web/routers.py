@@ -0,0 +1,91 @@
+"""
+Database routing of read-only report and export traffic to a read replica
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_ALIAS = 'default'
+
+# Per-request state that is written all the time, always read from the primary
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# Set while a view decorated with replica_reads runs
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+# Set for requests pinned to the primary because the client wrote recently
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_enabled():
+    return getattr(settings, 'DATABASE_REPLICA_ENABLED', False) and REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def pin_to_primary(pinned=True):
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+@contextmanager
+def use_replica():
+    """Send reads in this block to the replica, unless the request is pinned to the primary"""
+    token = _reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+def replica_reads(view):
+    """
+    Run a read-only view against the replica.
+
+    Works on function views and class-based views (decorate the class).
+    Template responses are rendered inside the block, so lazy querysets
+    evaluated by the template are read from the replica too.
+    """
+    if isinstance(view, type):
+        view.dispatch = replica_reads(view.dispatch)
+        return view
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            response = view(*args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Route reads inside use_replica() to the replica and everything else to
+    the primary. Reads stay on the primary inside transactions and for
+    requests pinned after a write, so users always see their own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _reading_from_replica.get() or _pinned_to_primary.get() or not replica_enabled():
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS or connections[PRIMARY_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
@@ -0,0 +1,147 @@
+"""
+Slow query capture with query plans
+"""
+import hashlib
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+from .queries import find_source, normalize_sql
+
+
+logger = logging.getLogger(__name__)
+
+# Only these statements are explained
+EXPLAINABLE_PREFIXES = ('SELECT', 'WITH')
+# EXPLAIN ANALYZE runs the query again, so it is limited to plain reads: a WITH
+# may wrap an INSERT, UPDATE or DELETE, and FOR UPDATE/SHARE takes row locks
+LOCKING_CLAUSE_RE = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b', re.IGNORECASE)
+
+
+class CapturedQuery:
+    def __init__(self, alias, sql, params, duration, template_location, code_location):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.duration = duration
+        self.template_location = template_location
+        self.code_location = code_location
+
+
+class SlowQueryCollector:
+    """execute_wrapper hook keeping the queries slower than the threshold"""
+
+    def __init__(self, threshold_ms, max_queries):
+        self.threshold = threshold_ms / 1000
+        self.max_queries = max_queries
+        self.captured = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold and len(self.captured) < self.max_queries:
+                template_location, code_location = find_source()
+                self.captured.append(CapturedQuery(
+                    context['connection'].alias, sql, None if many else params, duration,
+                    template_location, code_location,
+                ))
+
+
+def can_analyze(sql):
+    """Whether running the statement again for EXPLAIN ANALYZE has no side effects"""
+    return sql.lstrip().upper().startswith('SELECT') and not LOCKING_CLAUSE_RE.search(sql)
+
+
+def explain(alias, sql, params, analyze=False):
+    """Return the query plan as text, or an empty string when it can't be explained"""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE_PREFIXES):
+        return ''
+    analyze = analyze and can_analyze(sql)
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    else:
+        prefix = 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+
+    if connection.vendor == 'sqlite':
+        # Rows are (id, parent, notused, detail), indent the detail by depth
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append('  ' * (depth[node_id] - 1) + detail)
+        return '\n'.join(lines)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def save_slow_queries(request, captured):
+    """
+    Store the captured queries once the response has been produced. Their
+    plans are filled in by the explain_slow_queries task, so the request that
+    was already slow doesn't also wait for EXPLAIN, or right after the commit
+    with SLOW_QUERY_EXPLAIN_INLINE (debug, where no worker may be running).
+    """
+    from .models import SlowQuery
+
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else ''
+    rows = []
+    for query in captured:
+        duration_ms = query.duration * 1000
+        logger.warning(
+            'Slow query %.1fms in %s (%s): %s',
+            duration_ms, view_name or request.path, query.template_location or query.code_location, query.sql,
+        )
+        rows.append(SlowQuery(
+            sql=query.sql,
+            params=repr(query.params) if query.params is not None else '',
+            fingerprint=hashlib.md5(normalize_sql(query.sql).encode(), usedforsecurity=False).hexdigest(),
+            duration_ms=duration_ms,
+            database=query.alias,
+            method=request.method,
+            path=request.path[:500],
+            view_name=view_name,
+            template_location=(query.template_location or '')[:300],
+            code_location=(query.code_location or '')[:300],
+        ))
+    try:
+        rows = SlowQuery.objects.bulk_create(rows)
+    except DatabaseError:
+        logger.exception('Could not store %d slow queries', len(rows))
+        return
+
+    explainable = [
+        [row.pk, query.alias, query.sql, list(query.params)]
+        for row, query in zip(rows, captured)
+        if query.params is not None and query.sql.lstrip().upper().startswith(EXPLAINABLE_PREFIXES)
+    ]
+    if explainable:
+        transaction.on_commit(lambda: queue_explain(explainable))
+
+
+def queue_explain(queries):
+    from kombu.exceptions import OperationalError
+    from .tasks import explain_slow_queries
+
+    if getattr(settings, 'SLOW_QUERY_EXPLAIN_INLINE', settings.DEBUG):
+        explain_slow_queries(queries)
+        return
+    try:
+        explain_slow_queries.apply_async(args=[queries], retry=False)
+    except OperationalError:
+        # The queries are stored all the same, only without their plan
+        logger.warning('Could not queue EXPLAIN of %d slow queries', len(queries), exc_info=True)
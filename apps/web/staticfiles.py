@@ -0,0 +1,67 @@
+"""
+Static file storage that fingerprints files and pre-compresses them at collectstatic
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# Try to use brotli when it is installed, gzip variants are always written
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ico', '.ttf', '.eot',
+)
+
+# Only keep a compressed variant when it saves at least this fraction of the size
+MIN_COMPRESSION_SAVING = 0.05
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes .gz (and .br when brotli is
+    installed) next to every compressible file, so they can be served
+    without compressing on each request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                processed_names.add(name)
+                if hashed_name:
+                    processed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        for name in sorted(processed_names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress_file(name)
+
+    def compress_file(self, name):
+        """Write the compressed variants of a collected file, returns the names written"""
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        written = []
+        variants = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda data: brotli.compress(data)))
+
+        for suffix, compress in variants:
+            compressed = compress(content)
+            if len(compressed) > len(content) * (1 - MIN_COMPRESSION_SAVING):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+                continue
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(name + suffix)
+        return written
@@ -0,0 +1,14 @@
+from celery import shared_task
+from django.conf import settings
+
+from .models import SlowQuery
+from .slowqueries import explain
+
+
+@shared_task
+def explain_slow_queries(queries):
+    """Store the plans of slow queries saved by SlowQueryMiddleware, given [pk, alias, sql, params] lists"""
+    analyze = getattr(settings, 'SLOW_QUERY_EXPLAIN_ANALYZE', settings.DEBUG)
+    for pk, alias, sql, params in queries:
+        SlowQuery.objects.filter(pk=pk).update(explain=explain(alias, sql, params, analyze))
+    return len(queries)
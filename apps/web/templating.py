@@ -0,0 +1,69 @@
+"""
+Template warm-up and render timing helpers
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.template import engines, TemplateSyntaxError, TemplateDoesNotExist
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+
+def iter_project_templates():
+    """Yield the names of every template under the project template directories"""
+    for template_dir in settings.TEMPLATES[0]['DIRS']:
+        template_dir = Path(template_dir)
+        for path in sorted(template_dir.rglob('*.html')):
+            yield path.relative_to(template_dir).as_posix()
+
+
+def warm_template_cache():
+    """
+    Compile every project template through the configured loaders.
+
+    With the cached loader enabled this fills its in-process cache, so the
+    first request of a worker doesn't pay the parse cost. Returns a dict of
+    template name -> compile time in seconds.
+    """
+    engine = engines['django']
+    timings = {}
+    for name in iter_project_templates():
+        start = time.perf_counter()
+        try:
+            engine.get_template(name)
+        except (TemplateSyntaxError, TemplateDoesNotExist) as e:
+            logger.warning('Could not precompile template %s: %s', name, e)
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+@contextmanager
+def record_template_renders():
+    """
+    Record the wall time of every template render inside the block.
+
+    Yields a dict of template name -> list of render durations in seconds.
+    Times are inclusive, so a template that extends another also counts the
+    parent's blocks it renders.
+    """
+    timings = defaultdict(list)
+    original_render = Template._render
+
+    def timed_render(template, context):
+        start = time.perf_counter()
+        try:
+            return original_render(template, context)
+        finally:
+            timings[template.name or '<string>'].append(time.perf_counter() - start)
+
+    Template._render = timed_render
+    try:
+        yield timings
+    finally:
+        Template._render = original_render
@@ -1,3 +1,461 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.template import engines
+from .templating import iter_project_templates, warm_template_cache, record_template_renders
+from .models import SlowQuery
+from .queries import QueryBudgetExceeded, QueryBudgetMixin, QueryRecorder, normalize_sql
+from .routers import use_replica
+from .checks import check_events_backend, check_shared_cache
+from .slowqueries import can_analyze
+from .tasks import explain_slow_queries
+from .events import OVERFLOW, QUEUE_SIZE, LocalBroker
+from apps.journal.analytics import submission_rates
+from apps.journal.models import Department, WeeklyJournal
+from apps.journal.rollups import week_start
+
+
+class TemplateWarmupTest(TestCase):
+    def test_every_project_template_compiles(self):
+        names = list(iter_project_templates())
+        self.assertIn('journal/summary_report.html', names)
+        self.assertEqual(sorted(warm_template_cache()), sorted(names))
+
+    def test_record_template_renders(self):
+        template = engines['django'].from_string('{{ value }}')
+        with record_template_renders() as timings:
+            template.render({'value': 1})
+            template.render({'value': 2})
+        self.assertEqual(len(timings['<string>']), 2)
+
+
+class StaticPipelineTest(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        self.source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        os.makedirs(os.path.join(self.source_dir, 'css'))
+        with open(os.path.join(self.source_dir, 'css', 'app.css'), 'w') as f:
+            f.write('body { color: #333; }\n' * 200)
+
+    def collect(self):
+        with override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[self.source_dir],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'apps.web.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            return staticfiles_storage.hashed_files['css/app.css']
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        hashed_name = self.collect()
+        self.assertNotEqual(hashed_name, 'css/app.css')
+        path = os.path.join(self.static_root, hashed_name)
+        with open(path, 'rb') as f, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), f.read())
+
+    def test_middleware_serves_compressed_immutable_file(self):
+        hashed_name = self.collect()
+        with override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[self.source_dir],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'apps.web.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+            MIDDLEWARE=['apps.web.middleware.StaticFilesMiddleware'] + settings.MIDDLEWARE,
+        ):
+            response = self.client.get('/static/' + hashed_name, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+
+            response = self.client.get('/static/css/app.css')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertNotIn('immutable', response['Cache-Control'])
+
+            response = self.client.get('/static/../manage.py')
+            self.assertEqual(response.status_code, 404)
+
+
+class BenchmarkViewsTest(TestCase):
+    def test_current_db_results_written_as_json(self):
+        call_command('generate_load_data', '--scale', '0.01', '--weeks', '2', '--prefix', 'bench', stdout=StringIO())
+        handle, output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, output)
+
+        call_command(
+            'benchmark_views', '--current-db', '--repeat', '2', '--only', 'dashboard,document_history',
+            '--output', output, stdout=StringIO()
+        )
+        with open(output) as f:
+            results = json.load(f)
+        cases = {case['name']: case for case in results['datasets'][0]['results']}
+        self.assertEqual(set(cases), {'dashboard', 'document_history'})
+        self.assertGreater(cases['dashboard']['queries'], 0)
+        self.assertLessEqual(cases['dashboard']['latency_ms']['p50'], cases['dashboard']['latency_ms']['max'])
+
+
+class QueryInspectorTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_load_data', '--scale', '0.01', '--weeks', '2', '--prefix', 'bench', stdout=StringIO())
+        cls.admin = User.objects.get(username='bench_admin')
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = %s LIMIT 21'),
+            'SELECT * FROM t WHERE id IN (...) AND name = %s LIMIT ?'
+        )
+
+    def test_groups_repeated_queries_with_their_source(self):
+        with QueryRecorder(threshold=3) as recorder:
+            for user in User.objects.filter(username__startswith='bench_user')[:4]:
+                User.objects.get(pk=user.pk)
+        suspects = recorder.n_plus_one()
+        self.assertEqual(recorder.count, 5)
+        self.assertEqual(len(suspects), 1)
+        self.assertEqual(suspects[0].count, 4)
+        self.assertIn('apps/web/tests.py', suspects[0].source)
+
+    def test_template_line_reported(self):
+        template = engines['django'].from_string('{% for user in users %}{{ user.journal_entries.count }}{% endfor %}')
+        with QueryRecorder(threshold=3) as recorder:
+            template.render({'users': list(User.objects.all()[:4])})
+        self.assertRegex(recorder.n_plus_one()[0].source, r':1$')
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_middleware_headers_and_budget(self):
+        self.client.force_login(self.admin)
+        with self.modify_settings(MIDDLEWARE={'prepend': 'apps.web.middleware.QueryInspectorMiddleware'}):
+            response = self.client.get(reverse('document_history'))
+            self.assertGreater(int(response['X-Query-Count']), 0)
+            with patch('apps.documents.views.document_history.query_budget', 1):
+                with self.assertRaises(QueryBudgetExceeded):
+                    self.client.get(reverse('document_history'))
+
+    def test_cold_dashboard_within_budget(self):
+        # Snapshots read their live counter numbers from the broker, not the database
+        member = User.objects.filter(username__startswith='bench_user', journal_entries__isnull=False).first()
+        self.client.force_login(member)
+        cache.clear()
+        self.assertEqual(self.assertViewWithinBudget(reverse('journal:dashboard')).status_code, 200)
+
+    def test_hot_views_within_budget(self):
+        self.client.force_login(self.admin)
+        for url in [
+            reverse('journal:dashboard'),
+            reverse('journal:list'),
+            reverse('journal:summary_report') + '?group_by=department',
+            reverse('journal:export_summary') + '?format=html',
+            reverse('journal:topman_tagging'),
+            reverse('journal:topman_summary'),
+            reverse('journal:department_analytics'),
+            reverse('journal:long_running_items'),
+            reverse('document_list'),
+            reverse('document_history'),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.assertViewWithinBudget(url).status_code, 200)
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+class InstrumentationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client.force_login(self.user)
+        self.middleware = self.modify_settings(MIDDLEWARE={'prepend': 'apps.web.middleware.InstrumentationMiddleware'})
+        self.middleware.enable()
+        self.addCleanup(self.middleware.disable)
+
+    def test_request_logged_as_json(self):
+        with self.assertLogs('apps.web.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('journal:dashboard'))
+        data = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(data['view'], 'journal:dashboard')
+        self.assertEqual(data['status'], 200)
+        self.assertGreater(data['db_queries'], 0)
+        self.assertIn('journal/dashboard.html', data['templates'])
+        self.assertGreaterEqual(data['cache_misses'], 1)
+
+        with self.assertLogs('apps.web.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('journal:dashboard'))
+        self.assertGreaterEqual(json.loads(logs.records[-1].getMessage())['cache_hits'], 1)
+        self.assertGreaterEqual(data['total_ms'], data['view_ms'])
+
+    def test_profile_header(self):
+        with self.assertLogs('apps.web.instrumentation', 'INFO'):
+            response = self.client.get(reverse('journal:dashboard'), HTTP_X_PROFILE='text')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertIn(b'cumulative', response.content)
+
+        # Staff get their profile whether the request was sampled or not
+        with patch('apps.web.middleware.random.random', return_value=1.0), \
+                self.assertNoLogs('apps.web.instrumentation', 'INFO'):
+            response = self.client.get(reverse('journal:dashboard'), HTTP_X_PROFILE='text')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+
+        # Other clients can't use the header to get profiled or logged
+        self.user.is_staff = False
+        self.user.save()
+        with patch('apps.web.middleware.random.random', return_value=1.0), \
+                self.assertNoLogs('apps.web.instrumentation', 'INFO'):
+            response = self.client.get(reverse('journal:dashboard'), HTTP_X_PROFILE='text')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='member', password='testpass123')
+        self.client.force_login(self.user)
+        self.middleware = self.modify_settings(MIDDLEWARE={'prepend': 'apps.web.middleware.MetricsMiddleware'})
+        self.middleware.enable()
+        self.addCleanup(self.middleware.disable)
+
+    def sample(self, name, labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_and_export_metrics(self):
+        labels = {'view': 'journal:export_summary', 'format': 'csv'}
+        exports = self.sample('docuapp_export_size_bytes_count', labels)
+        requests = self.sample(
+            'docuapp_request_duration_seconds_count',
+            {'view': 'journal:export_summary', 'method': 'GET', 'status': '2xx'}
+        )
+        self.client.get(reverse('journal:export_summary') + '?format=csv')
+        self.assertEqual(self.sample('docuapp_export_size_bytes_count', labels), exports + 1)
+        self.assertEqual(self.sample(
+            'docuapp_request_duration_seconds_count',
+            {'view': 'journal:export_summary', 'method': 'GET', 'status': '2xx'}
+        ), requests + 1)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'docuapp_request_db_queries_bucket', response.content)
+        self.assertIn(b'docuapp_celery_queue_length', response.content)
+
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 403)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+        # Localhost is what a reverse proxy on the same host looks like
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_ALLOW_LOCALHOST=True):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 200)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_MAX_PER_REQUEST=50)
+class SlowQueryLogTest(TestCase):
+    @override_settings(SLOW_QUERY_EXPLAIN_INLINE=False)
+    @patch('apps.web.tasks.explain_slow_queries.apply_async')
+    def test_slow_queries_stored_with_plan(self, apply_async):
+        user = User.objects.create_user(username='member', password='testpass123')
+        self.client.force_login(user)
+        with self.assertLogs('apps.web.slowqueries', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('journal:list') + '?search=budget')
+
+        search = SlowQuery.objects.filter(view_name='journal:list', sql__icontains='LIKE').first()
+        self.assertIsNotNone(search)
+        self.assertEqual(search.path, reverse('journal:list'))
+        self.assertIn('%budget%', search.params)
+        # The plan is left to the task, not run in the request
+        self.assertEqual(search.explain, '')
+        apply_async.assert_called_once()
+        explain_slow_queries(*apply_async.call_args.kwargs['args'])
+        search.refresh_from_db()
+        self.assertIn('SCAN', search.explain)
+        self.assertTrue(search.code_location or search.template_location)
+        self.assertEqual(len(search.fingerprint), 32)
+
+    @override_settings(SLOW_QUERY_EXPLAIN_INLINE=True)
+    @patch('apps.web.tasks.explain_slow_queries.apply_async')
+    def test_plans_explained_in_process_in_debug(self, apply_async):
+        user = User.objects.create_user(username='member', password='testpass123')
+        self.client.force_login(user)
+        with self.assertLogs('apps.web.slowqueries', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('journal:list') + '?search=budget')
+
+        search = SlowQuery.objects.filter(view_name='journal:list', sql__icontains='LIKE').first()
+        self.assertIn('SCAN', search.explain)
+        apply_async.assert_not_called()
+
+    def test_analyze_only_plain_selects(self):
+        self.assertTrue(can_analyze('SELECT "id" FROM "journal_weeklyjournal"'))
+        self.assertFalse(can_analyze('SELECT "id" FROM "journal_weeklyjournal" FOR UPDATE'))
+        self.assertFalse(can_analyze('SELECT "id" FROM "journal_weeklyjournal" FOR NO KEY UPDATE NOWAIT'))
+        self.assertFalse(can_analyze('WITH moved AS (DELETE FROM "t" RETURNING *) SELECT * FROM moved'))
+
+
+@override_settings(DATABASE_REPLICA_ENABLED=True, DATABASE_REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    The replica is a second SQLite test database that is never written to.
+    Not a TestCase: reads inside a transaction deliberately stay on the primary.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='member', password='testpass123')
+        department = Department.objects.create(name='Engineering')
+        # "Replicate" the rows the views need to authenticate, but not the journal
+        self.user.save(using='replica')
+        department.save(using='replica')
+        today = date.today()
+        self.journal = WeeklyJournal.objects.create(
+            author=self.user, department=department,
+            date_from=today.replace(day=1), date_to=today.replace(day=1),
+            highlights=[{'text': 'Shipped release', 'status': 'completed'}],
+        )
+        self.client.force_login(self.user)
+
+    def test_router(self):
+        self.assertEqual(WeeklyJournal.objects.all().db, 'default')
+        with use_replica():
+            self.assertEqual(WeeklyJournal.objects.all().db, 'replica')
+            self.assertFalse(WeeklyJournal.objects.exists())
+            self.assertEqual(WeeklyJournal.objects.using('default').count(), 1)
+
+        # Raw SQL follows the router too
+        monday = week_start(self.journal.date_from)
+        self.assertEqual(len(submission_rates(monday, monday)), 1)
+        with use_replica():
+            self.assertEqual(submission_rates(monday, monday), [])
+
+    def test_read_views_use_replica_until_client_writes(self):
+        response = self.client.get(reverse('journal:summary_report'))
+        self.assertEqual(len(response.context['journal_entries']), 0)
+        # Dashboard snapshots are cached, so they are always built from the primary
+        self.assertEqual(self.client.get(reverse('journal:dashboard')).context['total_journals'], 1)
+        # Views that aren't marked read-only keep reading from the primary
+        self.assertContains(self.client.get(reverse('journal:list')), 'Engineering')
+
+        response = self.client.post(
+            reverse('journal:add_comment', args=[self.journal.pk]), {'content': 'Looks good'}
+        )
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(response.cookies[settings.DATABASE_REPLICA_PIN_COOKIE]['max-age'], 30)
+
+        response = self.client.get(reverse('journal:summary_report'))
+        self.assertEqual(len(response.context['journal_entries']), 1)
+
+        # Once the pin expires reads go back to the replica
+        del self.client.cookies[settings.DATABASE_REPLICA_PIN_COOKIE]
+        response = self.client.get(reverse('journal:summary_report'))
+        self.assertEqual(len(response.context['journal_entries']), 0)
+
+
+@override_settings(METRICS_ENABLED=True, INSTRUMENTATION_SAMPLE_RATE=1.0, SLOW_QUERY_THRESHOLD_MS=0)
+class AsyncMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.middleware = self.modify_settings(MIDDLEWARE={'prepend': [
+            'apps.web.middleware.ReplicaPinningMiddleware',
+            'apps.web.middleware.SlowQueryMiddleware',
+            'apps.web.middleware.MetricsMiddleware',
+            'apps.web.middleware.InstrumentationMiddleware',
+            'apps.web.middleware.QueryInspectorMiddleware',
+            'apps.web.middleware.StaticFilesMiddleware',
+        ]})
+        self.middleware.enable()
+        self.addCleanup(self.middleware.disable)
+
+    def test_chain_not_adapted_under_asgi(self):
+        # Django logs "Asynchronous handler adapted for middleware ..." in DEBUG
+        with override_settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_async_request(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        # Queries run on the request's thread are recorded
+        with self.assertLogs('apps.web.instrumentation', 'INFO') as logs, \
+                self.assertLogs('apps.web.slowqueries', 'WARNING'):
+            response = await self.async_client.get(reverse('journal:dashboard'))
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['user_id'], self.user.pk)
+        self.assertGreater(json.loads(logs.records[-1].getMessage())['db_queries'], 0)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertTrue(await SlowQuery.objects.filter(view_name='journal:dashboard').aexists())
+
+        with self.assertLogs('apps.web.instrumentation', 'INFO'), self.assertLogs('apps.web.slowqueries', 'WARNING'):
+            response = await self.async_client.get(reverse('journal:dashboard'), headers={'X-Profile': 'text'})
+        self.assertIn(b'cumulative', response.content)
+
+
+class EventBrokerTest(TestCase):
+    def test_publish_from_another_thread_reaches_subscribers(self):
+        broker = LocalBroker()
+
+        async def receive():
+            with broker.subscribe('report:1:tags') as subscription:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, broker.publish, 'report:1:tags', {'type': 'tag'})
+                await loop.run_in_executor(None, broker.publish, 'report:2:tags', {'type': 'untag'})
+                first = await subscription.get(1)
+                second = await subscription.get(0.01)
+            return first, second
+
+        self.assertEqual(asyncio.run(receive()), ({'type': 'tag', 'seq': 1}, None))
+        self.assertFalse(broker._subscriptions)
+        # Each channel is numbered on its own
+        self.assertEqual(broker.sequences(['report:1:tags', 'report:2:tags', 'report:3:tags']), {
+            'report:1:tags': 1, 'report:2:tags': 1, 'report:3:tags': 0,
+        })
+
+    def test_slow_subscriber_overflows(self):
+        broker = LocalBroker()
+
+        async def receive():
+            with broker.subscribe('report:1:tags') as subscription:
+                for number in range(QUEUE_SIZE + 1):
+                    broker.publish('report:1:tags', {'type': 'tag', 'number': number})
+                await asyncio.sleep(0)
+                return await subscription.get(1)
+
+        self.assertIs(asyncio.run(receive()), OVERFLOW)
+
+
+class SystemChecksTest(TestCase):
+    def test_process_local_cache_with_several_workers(self):
+        with override_settings(WEB_CONCURRENCY=1):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(WEB_CONCURRENCY=3):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['web.E002'])
+        redis_cache = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(WEB_CONCURRENCY=3, CACHES=redis_cache):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_local_events_with_several_workers(self):
+        with override_settings(EVENTS_BACKEND='local', WEB_CONCURRENCY=1):
+            self.assertEqual(check_events_backend(None), [])
+        with override_settings(EVENTS_BACKEND='local', WEB_CONCURRENCY=3):
+            self.assertEqual([error.id for error in check_events_backend(None)], ['web.E001'])
+        with override_settings(EVENTS_BACKEND='redis', WEB_CONCURRENCY=3):
+            self.assertEqual(check_events_backend(None), [])
@@ -3,10 +3,14 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, Http404
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.csrf import csrf_exempt
 import json
 
+from .metrics import metrics_available, generate_metrics
+
 
 def home(request):
     """Home page view"""
@@ -77,3 +81,23 @@ def signup(request):
             messages.error(request, 'An error occurred while creating your account.')
     
     return render(request, 'web/signup.html')
+
+
+def metrics(request):
+    """
+    Prometheus metrics, for staff users and requests with the METRICS_TOKEN
+    bearer token. Localhost is only trusted with METRICS_ALLOW_LOCALHOST: behind
+    a local reverse proxy every request comes from localhost.
+    """
+    if not metrics_available():
+        raise Http404
+    token = settings.METRICS_TOKEN
+    authorized = (
+        (token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'))
+        or (settings.METRICS_ALLOW_LOCALHOST and request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1'))
+        or request.user.is_staff
+    )
+    if not authorized:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    from prometheus_client import CONTENT_TYPE_LATEST
+    return HttpResponse(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
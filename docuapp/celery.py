@@ -2,6 +2,8 @@ import os
 from django.conf import settings
 from celery import Celery
 
+from apps.web.metrics import connect_celery_signals
+
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docuapp.settings')
 
@@ -14,6 +16,9 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Task durations for the /metrics endpoint
+connect_celery_signals()
+
 
 @app.task(bind=True)
 def debug_task(self):
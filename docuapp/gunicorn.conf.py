@@ -0,0 +1,39 @@
+"""
+Gunicorn settings for running the app under a prefork server.
+
+Metrics are shared between workers through PROMETHEUS_MULTIPROC_DIR, which
+must point to an empty directory that is cleared before the server starts.
+
+With DJANGO_SERVER_MODE=asgi the workers are uvicorn workers serving
+docuapp.asgi: each runs its requests on one event loop, so a worker serves
+many event streams, exports and emails waiting on I/O at once instead of one
+request at a time. Start either mode with
+gunicorn -c docuapp/gunicorn.conf.py.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Exported, so the settings (WEB_CONCURRENCY) know how many processes share the work.
+# Several workers share the cache and events through Redis, so one without REDIS_HOST
+workers = int(os.environ.setdefault('WEB_CONCURRENCY', '3' if 'REDIS_HOST' in os.environ else '1'))
+
+if os.environ.get('DJANGO_SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'docuapp.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'docuapp.wsgi:application'
+
+
+def on_starting(server):
+    # Refuse to start with settings that only work in a single process (see apps/web/checks.py)
+    import django
+    from django.core.management import call_command
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docuapp.settings')
+    django.setup()
+    call_command('check')
+
+
+def child_exit(server, worker):
+    from apps.web.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -1,6 +1,9 @@
 import os
+import sys
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Try to load environment variables from .env file
 try:
     from dotenv import load_dotenv
@@ -94,7 +97,23 @@ TEMPLATES = [
     },
 ]
 
+# Production template mode: compiled templates are kept in memory by the cached
+# loader and every template under templates/ is compiled when the WSGI or ASGI app boots
+TEMPLATE_PRODUCTION_MODE = os.environ.get('DJANGO_TEMPLATE_PRODUCTION_MODE', str(not DEBUG)) == 'True'
+
+if TEMPLATE_PRODUCTION_MODE:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+TEMPLATE_WARMUP = os.environ.get('DJANGO_TEMPLATE_WARMUP', str(TEMPLATE_PRODUCTION_MODE)) == 'True'
+
 WSGI_APPLICATION = 'docuapp.wsgi.application'
+ASGI_APPLICATION = 'docuapp.asgi.application'
 
 # Database
 # Use SQLite for local development, PostgreSQL for Docker
@@ -117,6 +136,36 @@ else:
         }
     }
 
+# Read replica for the report, export and dashboard views, only defined when
+# one is configured: DJANGO_DATABASE_REPLICA_HOST on PostgreSQL, where it
+# mirrors the primary in tests, or DJANGO_DATABASE_REPLICA_NAME on SQLite.
+# manage.py test always gets a second SQLite database, so the routing tests
+# run against two separate databases
+TESTING = sys.argv[1:2] == ['test']
+DATABASE_REPLICA_HOST = os.environ.get('DJANGO_DATABASE_REPLICA_HOST', '')
+DATABASE_REPLICA_NAME = os.environ.get('DJANGO_DATABASE_REPLICA_NAME', '')
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if DATABASE_REPLICA_HOST:
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': DATABASE_REPLICA_HOST,
+            'PORT': os.environ.get('DJANGO_DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+elif DATABASE_REPLICA_NAME or TESTING:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_REPLICA_NAME or BASE_DIR / 'db.sqlite3',
+    }
+
+DATABASE_ROUTERS = ['apps.web.routers.ReplicaRouter']
+DATABASE_REPLICA_ENABLED = os.environ.get(
+    'DJANGO_DATABASE_REPLICA', str('replica' in DATABASES and not TESTING)
+) == 'True'
+# After a POST the client reads from the primary for this long, so it sees its own writes
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DJANGO_DATABASE_REPLICA_PIN_SECONDS', '15'))
+DATABASE_REPLICA_PIN_COOKIE = 'db_primary'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -146,6 +195,28 @@ STATICFILES_DIRS = [
     BASE_DIR / 'assets',
 ]
 
+# Static asset pipeline: collectstatic writes fingerprinted names plus
+# pre-compressed .gz/.br variants (brotli only when the package is installed)
+STATIC_PIPELINE = os.environ.get('DJANGO_STATIC_PIPELINE', str(not DEBUG)) == 'True'
+
+if STATIC_PIPELINE:
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'apps.web.staticfiles.CompressedManifestStaticFilesStorage',
+        },
+    }
+
+# Serve STATIC_ROOT from the app process for deployments without a CDN in front.
+# Fingerprinted files get far-future cache headers, others STATIC_CACHE_MAX_AGE seconds
+STATIC_SERVE_IN_PROCESS = os.environ.get('DJANGO_STATIC_SERVE', str(not DEBUG)) == 'True'
+STATIC_CACHE_MAX_AGE = int(os.environ.get('DJANGO_STATIC_CACHE_MAX_AGE', '60'))
+
+if STATIC_SERVE_IN_PROCESS:
+    MIDDLEWARE.insert(1, 'apps.web.middleware.StaticFilesMiddleware')
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -166,6 +237,9 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'admin@docuapp.com')
 SERVER_EMAIL = os.environ.get('SERVER_EMAIL', 'noreply@docuapp.com')
 
 # Redis configuration
+# Setting REDIS_HOST turns on everything that needs Redis: the shared cache, several
+# web workers and cross-worker events. Without it the app runs in a single process
+REDIS_CONFIGURED = 'REDIS_HOST' in os.environ
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
 REDIS_PORT = os.environ.get('REDIS_PORT', '6379')
 
@@ -177,6 +251,119 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Web server worker processes, as started by docuapp/gunicorn.conf.py. Several workers
+# need the Redis cache and events (see web.E001 and web.E002), so one without Redis
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '3' if REDIS_CONFIGURED else '1'))
+
+# Cache configuration
+# Redis when configured: invalidation and precomputed results must reach every
+# worker and the Celery processes. Local memory is only safe for a single process
+CACHE_REDIS = os.environ.get('DJANGO_CACHE_REDIS', str(REDIS_CONFIGURED)) == 'True'
+if CACHE_REDIS:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'docuapp',
+        }
+    }
+
+# Journal dashboard snapshot lifetime in seconds (snapshots are also invalidated on change)
+JOURNAL_DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('JOURNAL_DASHBOARD_CACHE_TIMEOUT', '300'))
+
+# Rendered journal card fragments lifetime in seconds (keys already change with updated_at
+# and with department and user renames)
+JOURNAL_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('JOURNAL_FRAGMENT_CACHE_TIMEOUT', '86400'))
+
+# Department analytics: ranges longer than ANALYTICS_SYNC_MAX_WEEKS are computed by a
+# Celery task, the ANALYTICS_PRECOMPUTE_WEEKS ranges every hour by Celery beat. The task
+# hands its results over through the cache, so this needs the Redis cache (see journal.E001)
+ANALYTICS_BACKGROUND = os.environ.get('DJANGO_ANALYTICS_BACKGROUND', str(CACHE_REDIS)) == 'True'
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', str(6 * 60 * 60)))
+ANALYTICS_PENDING_TIMEOUT = int(os.environ.get('ANALYTICS_PENDING_TIMEOUT', '600'))
+ANALYTICS_SYNC_MAX_WEEKS = int(os.environ.get('ANALYTICS_SYNC_MAX_WEEKS', '26'))
+ANALYTICS_PRECOMPUTE_WEEKS = [int(weeks) for weeks in os.environ.get('ANALYTICS_PRECOMPUTE_WEEKS', '12,52,156').split(',')]
+
+# Missing journal submissions: cached per week, refreshed every hour by Celery beat,
+# reminders sent on COMPLIANCE_REMINDER_DAY over one SMTP connection
+COMPLIANCE_CACHE_TIMEOUT = int(os.environ.get('COMPLIANCE_CACHE_TIMEOUT', str(2 * 60 * 60)))
+COMPLIANCE_REMINDER_BATCH_SIZE = int(os.environ.get('COMPLIANCE_REMINDER_BATCH_SIZE', '100'))
+COMPLIANCE_REMINDER_DAY = os.environ.get('COMPLIANCE_REMINDER_DAY', 'fri')
+COMPLIANCE_REMINDER_HOUR = int(os.environ.get('COMPLIANCE_REMINDER_HOUR', '15'))
+
+# Server-sent events for live pages, streamed by the ASGI app (docuapp.asgi). 'local' delivers
+# events within one process, so it is only the default for a single worker (see web.E001);
+# 'redis' delivers them to every process through Redis pub/sub
+EVENTS_BACKEND = os.environ.get('DJANGO_EVENTS_BACKEND', 'local' if WEB_CONCURRENCY == 1 else 'redis')
+EVENTS_REDIS_URL = os.environ.get('DJANGO_EVENTS_REDIS_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/0')
+EVENTS_KEEPALIVE = int(os.environ.get('DJANGO_EVENTS_KEEPALIVE', '15'))
+EVENTS_STREAM_TIMEOUT = int(os.environ.get('DJANGO_EVENTS_STREAM_TIMEOUT', '300'))
+EVENTS_RETRY_MS = int(os.environ.get('DJANGO_EVENTS_RETRY_MS', '2000'))
+
+CELERY_BEAT_SCHEDULE = {
+    'precompute-department-analytics': {
+        'task': 'apps.journal.tasks.precompute_department_analytics',
+        'schedule': 60 * 60,
+    },
+    'precompute-missing-submissions': {
+        'task': 'apps.journal.tasks.precompute_missing_submissions',
+        'schedule': 60 * 60,
+    },
+    'send-submission-reminders': {
+        'task': 'apps.journal.tasks.send_submission_reminders',
+        'schedule': crontab(minute=0, hour=COMPLIANCE_REMINDER_HOUR, day_of_week=COMPLIANCE_REMINDER_DAY),
+    },
+}
+
+# SQL query inspection for development and tests (query count headers, N+1 warnings, query budgets)
+QUERY_INSPECTOR_ENABLED = os.environ.get('DJANGO_QUERY_INSPECTOR', str(DEBUG)) == 'True'
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.environ.get('DJANGO_QUERY_N_PLUS_ONE_THRESHOLD', '5'))
+QUERY_BUDGET_RAISE = os.environ.get('DJANGO_QUERY_BUDGET_RAISE', 'False') == 'True'
+
+if QUERY_INSPECTOR_ENABLED:
+    MIDDLEWARE.insert(1, 'apps.web.middleware.QueryInspectorMiddleware')
+
+# Per-request instrumentation (timings logged as JSON lines for a sample of requests,
+# cProfile dumps for staff requests sending an X-Profile header)
+INSTRUMENTATION_ENABLED = os.environ.get('DJANGO_INSTRUMENTATION', 'False') == 'True'
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('DJANGO_INSTRUMENTATION_SAMPLE_RATE', '0.01'))
+INSTRUMENTATION_PROFILE_DIR = os.environ.get('DJANGO_INSTRUMENTATION_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+if INSTRUMENTATION_ENABLED:
+    MIDDLEWARE.insert(1, 'apps.web.middleware.InstrumentationMiddleware')
+
+# Prometheus metrics at /metrics (set PROMETHEUS_MULTIPROC_DIR when running several worker processes)
+METRICS_ENABLED = os.environ.get('DJANGO_METRICS', str(not DEBUG)) == 'True'
+METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN', '')
+# Trust requests from localhost without the token; never behind a reverse proxy on the same host
+METRICS_ALLOW_LOCALHOST = os.environ.get('DJANGO_METRICS_ALLOW_LOCALHOST', 'False') == 'True'
+METRICS_CELERY_QUEUES = os.environ.get('DJANGO_METRICS_CELERY_QUEUES', 'celery').split(',')
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(1, 'apps.web.middleware.MetricsMiddleware')
+
+# Slow query log (stored in the SlowQuery admin, on by default in debug only). Their EXPLAIN output
+# is added by a Celery task, or in the request process once the queries are stored in debug, where
+# no worker may be running. EXPLAIN ANALYZE of plain SELECTs on PostgreSQL in debug
+SLOW_QUERY_LOG_ENABLED = os.environ.get('DJANGO_SLOW_QUERY_LOG', str(DEBUG)) == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('DJANGO_SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_MAX_PER_REQUEST = int(os.environ.get('DJANGO_SLOW_QUERY_MAX_PER_REQUEST', '20'))
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('DJANGO_SLOW_QUERY_EXPLAIN_ANALYZE', str(DEBUG)) == 'True'
+SLOW_QUERY_EXPLAIN_INLINE = os.environ.get('DJANGO_SLOW_QUERY_EXPLAIN_INLINE', str(DEBUG)) == 'True'
+SLOW_QUERY_LOG_FILE = os.environ.get('DJANGO_SLOW_QUERY_LOG_FILE', '')
+
+if SLOW_QUERY_LOG_ENABLED:
+    MIDDLEWARE.insert(1, 'apps.web.middleware.SlowQueryMiddleware')
+
+if 'replica' in DATABASES:
+    MIDDLEWARE.insert(1, 'apps.web.middleware.ReplicaPinningMiddleware')
+
 # Vite configuration (commented out until django-vite is available)
 # DJANGO_VITE_DEV_MODE = os.environ.get('DJANGO_VITE_DEV_MODE', 'True') == 'True'
 # DJANGO_VITE_ASSETS_PATH = BASE_DIR / 'assets'
@@ -194,8 +381,30 @@ LOGGING = {
         'handlers': ['console'],
         'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO'),
     },
+    'loggers': {
+        # One JSON line per instrumented request
+        'apps.web.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
+# Also keep the slow query log in a rotating file when a path is given
+if SLOW_QUERY_LOG_FILE:
+    LOGGING['handlers']['slow_query_file'] = {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'filename': SLOW_QUERY_LOG_FILE,
+        'maxBytes': 10 * 1024 * 1024,
+        'backupCount': 5,
+    }
+    LOGGING['loggers']['apps.web.slowqueries'] = {
+        'handlers': ['console', 'slow_query_file'],
+        'level': 'WARNING',
+        'propagate': False,
+    }
+
 # Security settings
 USE_HTTPS_IN_ABSOLUTE_URLS = os.environ.get('USE_HTTPS_IN_ABSOLUTE_URLS', 'False') == 'True'
 SECURE_SSL_REDIRECT = USE_HTTPS_IN_ABSOLUTE_URLS
@@ -3,9 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
+from apps.web.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='account_login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='account_logout'),
     path('', include('apps.journal.urls')),  # Journal as main app
@@ -1,6 +1,12 @@
 import os
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docuapp.settings')
 
 application = get_wsgi_application()
+
+# Compile every template before the first request reaches this worker
+if settings.TEMPLATE_WARMUP:
+    from apps.web.templating import warm_template_cache
+    warm_template_cache()
@@ -22,5 +22,10 @@ else:
 # Collect static files
 python3 manage.py collectstatic --noinput
 
-# Start the server
-python3 manage.py runserver 0.0.0.0:$PORT
\ No newline at end of file
+# Several workers need Redis for the shared cache and live events (see RAILWAY_DEPLOY.md)
+if [ -z "$REDIS_HOST" ]; then
+    echo "ℹ️  REDIS_HOST is not set, starting a single worker with the local cache and events"
+fi
+
+# Start the server (ASGI, so the live pages can stream events; gunicorn binds to $PORT)
+DJANGO_SERVER_MODE=${DJANGO_SERVER_MODE:-asgi} exec python3 -m gunicorn -c docuapp/gunicorn.conf.py
\ No newline at end of file
@@ -92,6 +92,11 @@ def run_setup():
 if __name__ == '__main__':
     run_setup()
     
-    # Start the server
-    port = os.environ.get('PORT', '8000')
-    subprocess.run([sys.executable, 'manage.py', 'runserver', f'0.0.0.0:{port}'])
\ No newline at end of file
+    # Several workers need Redis for the shared cache and live events (see RAILWAY_DEPLOY.md)
+    if 'REDIS_HOST' not in os.environ:
+        print("ℹ️ REDIS_HOST is not set, starting a single worker with the local cache and events")
+
+    # Start the server (ASGI, so the live pages can stream events; gunicorn binds to $PORT)
+    os.environ.setdefault('DJANGO_SERVER_MODE', 'asgi')
+    # Exit with gunicorn's status, so a failed system check fails the deploy
+    sys.exit(subprocess.run([sys.executable, '-m', 'gunicorn', '-c', 'docuapp/gunicorn.conf.py']).returncode)
\ No newline at end of file